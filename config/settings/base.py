@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.instrumentacao.InstrumentacaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -109,6 +110,45 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache (organograma e demais dados pré-calculados)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'folha-pagamento',
+    }
+}
+
+# Validade (segundos) do payload do dashboard em cache
+DASHBOARD_CACHE_SEGUNDOS = config('DASHBOARD_CACHE_SEGUNDOS', default=60, cast=int)
+
+# Folha de Pagamento
+# Processos usados para renderizar holerites em lote (0 = nº de CPUs)
+FOLHA_HOLERITE_PROCESSOS = config('FOLHA_HOLERITE_PROCESSOS', default=0, cast=int)
+# Processos usados no cálculo dos itens na geração da folha (1 = no próprio
+# processo, 0 = nº de CPUs). Só o cálculo em memória é dividido; a gravação,
+# que domina o tempo, continua no processo principal. Com 1 CPU, o
+# benchmark_folha de 3000 funcionários levou 4,1s em 1 processo e 5,8s em 4:
+# meça com `benchmark_folha --processos N` no servidor antes de aumentar
+FOLHA_GERACAO_PROCESSOS = config('FOLHA_GERACAO_PROCESSOS', default=1, cast=int)
+# Segundos sem atualização de progresso após os quais uma tarefa em execução
+# é dada como abandonada (o processo que a executava morreu) e marcada como
+# falha; 0 desativa
+FOLHA_TAREFA_TEMPO_LIMITE = config('FOLHA_TAREFA_TEMPO_LIMITE', default=3600, cast=int)
+# Hooks que recebem o relatório de etapas de cada operação do FolhaService
+# (ver folha/instrumentacao.py), como caminhos pontuados separados por vírgula
+FOLHA_INSTRUMENTACAO_HOOKS = config(
+    'FOLHA_INSTRUMENTACAO_HOOKS',
+    default='folha.instrumentacao.registrar_no_log',
+    cast=lambda v: [caminho.strip() for caminho in v.split(',') if caminho.strip()]
+)
+
+# Instrumentação das requisições (ver core/instrumentacao.py): registra as
+# requisições lentas ou com o mesmo SQL repetido mais que o limite (N+1)
+INSTRUMENTACAO_ATIVA = config('INSTRUMENTACAO_ATIVA', default=True, cast=bool)
+INSTRUMENTACAO_LIMITE_MS = config('INSTRUMENTACAO_LIMITE_MS', default=500, cast=int)
+INSTRUMENTACAO_LIMITE_REPETICOES = config('INSTRUMENTACAO_LIMITE_REPETICOES', default=10, cast=int)
+INSTRUMENTACAO_AMOSTRAGEM = config('INSTRUMENTACAO_AMOSTRAGEM', default=1.0, cast=float)
+
 # Date and Number Formats
 DATE_FORMAT = 'd/m/Y'
 DATE_INPUT_FORMATS = ['%d/%m/%Y', '%Y-%m-%d']
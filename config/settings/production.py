@@ -38,6 +38,16 @@ if config('DB_ENGINE', default='') == 'django.db.backends.sqlite3':
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 
+# Cache compartilhado entre os workers do gunicorn e o worker da fila (a
+# invalidação feita por um processo precisa valer para todos). Em containers,
+# CACHE_DIR deve ser o mesmo volume em todos eles (ver docker-compose.yml)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / 'cache')),
+    }
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -74,6 +84,10 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'registro': {
+            'format': '{asctime} {message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'file': {
@@ -86,6 +100,13 @@ LOGGING = {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
         },
+        # Requisições lentas / com N+1, um JSON por linha
+        'requisicoes': {
+            'level': 'WARNING',
+            'class': 'logging.FileHandler',
+            'filename': LOGS_DIR / 'requisicoes.log',
+            'formatter': 'registro',
+        },
     },
     'loggers': {
         'django': {
@@ -93,5 +114,16 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'core.instrumentacao': {
+            'handlers': ['requisicoes'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        # Etapas da geração da folha e dos eventos (hook registrar_no_log)
+        'folha.instrumentacao': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
@@ -12,6 +12,7 @@ urlpatterns = [
     path('', include('core.urls')),
     path('funcionarios/', include('funcionarios.urls')),
     path('folha/', include('folha.urls')),
+    path('api/v1/', include('folha.api_urls')),
 ]
 
 # Configuração do Admin
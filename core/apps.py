@@ -5,3 +5,7 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Núcleo'
+    
+    def ready(self):
+        """Importa os signals quando o app estiver pronto"""
+        import core.signals
@@ -0,0 +1,90 @@
+"""
+Dados do dashboard, calculados em poucas consultas e guardados em cache
+
+O payload fica em cache por DASHBOARD_CACHE_SEGUNDOS e é descartado quando
+funcionários, férias ou folhas são gravados (ver core/signals.py). Da última
+folha só o ID vai ao cache: os totais dela mudam por UPDATE (sem post_save) e
+a linha é lida a cada requisição.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+
+CHAVE_CACHE_DASHBOARD = 'core:dashboard'
+
+
+def _chave(hoje):
+    # O dia faz parte da chave: as janelas de férias e admissões andam com a data
+    return f'{CHAVE_CACHE_DASHBOARD}:{hoje.isoformat()}'
+
+
+def dados_dashboard():
+    """
+    Payload do dashboard
+
+    Contagens por status e soma dos salários saem de uma única agregação
+    condicional; as listas já vêm materializadas para poderem ir ao cache.
+    """
+    from folha.models import FolhaPagamento
+
+    hoje = date.today()
+    chave = _chave(hoje)
+    dados = cache.get(chave)
+    if dados is None:
+        dados = _calcular_dados(hoje)
+        cache.set(chave, dados, getattr(settings, 'DASHBOARD_CACHE_SEGUNDOS', 60))
+
+    ultima_folha = None
+    if dados.get('ultima_folha_id') is not None:
+        ultima_folha = FolhaPagamento.objects.filter(pk=dados['ultima_folha_id']).first()
+    return {**dados, 'ultima_folha': ultima_folha}
+
+
+def _calcular_dados(hoje):
+    from funcionarios.models import Funcionario, Ferias
+    from folha.models import FolhaPagamento
+
+    # Estatísticas gerais (uma consulta)
+    totais = Funcionario.objects.aggregate(
+        total_funcionarios=Count('pk', filter=Q(status='A')),
+        total_inativos=Count('pk', filter=Q(status='I')),
+        total_ferias=Count('pk', filter=Q(status='F')),
+        total_salarios=Sum('salario_base', filter=Q(status='A')),
+    )
+    total_funcionarios = totais['total_funcionarios']
+    total_salarios = totais['total_salarios'] or 0
+
+    # Férias a vencer nos próximos 60 dias
+    ferias_a_vencer = list(Ferias.objects.filter(
+        periodo_aquisitivo_fim__lte=hoje + timedelta(days=60),
+        periodo_aquisitivo_fim__gte=hoje,
+        status='PR'
+    ).select_related('funcionario')[:10])
+
+    # Funcionários recém-admitidos (últimos 30 dias)
+    funcionarios_recentes = list(Funcionario.objects.filter(
+        data_admissao__gte=hoje - timedelta(days=30),
+        status='A'
+    ).select_related('funcao', 'setor').order_by('-data_admissao')[:5])
+
+    return {
+        'total_funcionarios': total_funcionarios,
+        'total_inativos': totais['total_inativos'],
+        'total_ferias': totais['total_ferias'],
+        'total_salarios': total_salarios,
+        # Salário médio dos funcionários ativos
+        'salario_medio': total_salarios / total_funcionarios if total_funcionarios > 0 else 0,
+        # Projeção anual de salários
+        'projecao_anual': total_salarios * 12,
+        'ferias_a_vencer': ferias_a_vencer,
+        'ultima_folha_id': FolhaPagamento.objects.order_by('-ano', '-mes').values_list('pk', flat=True).first(),
+        'funcionarios_recentes': funcionarios_recentes,
+    }
+
+
+def invalidar_dashboard():
+    """Descarta o payload do dashboard em cache"""
+    cache.delete(_chave(date.today()))
@@ -0,0 +1,108 @@
+"""
+Instrumentação das requisições: tempo total, consultas SQL e N+1
+
+InstrumentacaoMiddleware mede cada requisição com connection.execute_wrapper
+(tempo de parede, número de consultas e tempo gasto no banco) e grava no
+logger `core.instrumentacao` um registro JSON por requisição lenta ou com
+padrão N+1 (o mesmo SQL, a menos dos parâmetros, repetido mais que o limite).
+Os registros são amostrados para não inundar o log em produção.
+
+Configuração (settings):
+    INSTRUMENTACAO_ATIVA: liga/desliga o middleware (padrão: True)
+    INSTRUMENTACAO_LIMITE_MS: tempo a partir do qual a requisição é lenta (padrão: 500)
+    INSTRUMENTACAO_LIMITE_REPETICOES: repetições do mesmo SQL que caracterizam N+1 (padrão: 10)
+    INSTRUMENTACAO_AMOSTRAGEM: fração das requisições sinalizadas que é gravada (padrão: 1.0)
+
+Respostas em streaming (exportações) são medidas até a view devolver a
+resposta, sem o tempo de envio do conteúdo.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# Listas de parâmetros de tamanho variável (IN (%s, %s, ...)) e literais
+# numéricos viram um único marcador, para que consultas iguais a menos dos
+# parâmetros tenham o mesmo modelo
+_LISTA_PARAMETROS = re.compile(r'%s(?:\s*,\s*%s)+')
+_NUMERO = re.compile(r'\b\d+\b')
+
+
+def modelo_sql(sql: str) -> str:
+    """SQL sem os valores: o que se repete em um padrão N+1"""
+    return _NUMERO.sub('?', _LISTA_PARAMETROS.sub('%s...', sql))
+
+
+class ColetorConsultas:
+    """Execute wrapper que conta e cronometra as consultas de uma requisição"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.modelos = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+            self.modelos[modelo_sql(sql)] += 1
+
+    def repeticoes(self, limite: int) -> list:
+        """Modelos de SQL executados mais que `limite` vezes, do mais repetido ao menos"""
+        return [
+            {'sql': sql, 'vezes': vezes}
+            for sql, vezes in self.modelos.most_common()
+            if vezes > limite
+        ]
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição e registra as lentas ou com N+1"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        coletor = ColetorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(coletor):
+            response = self.get_response(request)
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        repeticoes = coletor.repeticoes(getattr(settings, 'INSTRUMENTACAO_LIMITE_REPETICOES', 10))
+        lenta = duracao_ms >= getattr(settings, 'INSTRUMENTACAO_LIMITE_MS', 500)
+        if (lenta or repeticoes) and random.random() < getattr(settings, 'INSTRUMENTACAO_AMOSTRAGEM', 1.0):
+            self._registrar(request, response, duracao_ms, coletor, repeticoes, lenta)
+
+        return response
+
+    def _registrar(self, request, response, duracao_ms, coletor, repeticoes, lenta):
+        rota = getattr(request, 'resolver_match', None)
+        usuario = getattr(request, 'user', None)
+        registro = {
+            'metodo': request.method,
+            'caminho': request.path,
+            'view': rota.view_name if rota else None,
+            'status': response.status_code,
+            'usuario': usuario.pk if usuario is not None and usuario.is_authenticated else None,
+            'duracao_ms': round(duracao_ms, 1),
+            'consultas': coletor.consultas,
+            'sql_ms': round(coletor.segundos * 1000, 1),
+            'lenta': lenta,
+            'n_mais_1': repeticoes,
+        }
+        logger.warning(json.dumps(registro, ensure_ascii=False))
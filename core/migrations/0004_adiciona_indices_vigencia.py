@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_lancamentofixogeral'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lancamentofixogeral',
+            index=models.Index(fields=['ativo', 'data_inicio', 'data_fim'], name='lancgeral_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentofixogeral',
+            index=models.Index(fields=['data_inicio', 'data_fim'], name='lancgeral_periodo_idx'),
+        ),
+    ]
@@ -4,6 +4,83 @@ Modelos base do sistema - Dados Mestres (Setores, Funções, Tipos de Contrato,
 from django.db import models
 from django.core.validators import MinValueValidator
 
+from .vigencia import VigenciaQuerySet, indices_vigencia
+
+
+class ValidacaoAoSalvarMixin:
+    """
+    Política de validação do save() dos modelos validados ao gravar
+
+    Gravações completas (criação e edição por formulários, views e admin)
+    passam por full_clean(). Gravações com update_fields são internas
+    (totais, status, caminhos) e validam só os campos gravados, sem clean()
+    nem checagens de unicidade, que custam consultas. validar=True ou
+    validar=False força um dos caminhos; com validar=False e sem
+    update_fields nada é validado.
+    """
+
+    def save(self, *args, validar=None, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if validar is None:
+            validar = update_fields is None
+        
+        if validar:
+            self.full_clean()
+        elif update_fields is not None:
+            gravados = set(update_fields)
+            self.clean_fields(exclude=[
+                campo.name for campo in self._meta.concrete_fields
+                if campo.name not in gravados and campo.attname not in gravados
+            ])
+        
+        super().save(*args, **kwargs)
+
+
+class RastreioAlteracoesMixin:
+    """
+    Guarda os valores gravados de `campos_rastreados` (attnames) ao carregar e
+    ao salvar, para que save() e signals saibam o que de fato mudou sem
+    consultar o banco. Durante o save (inclusive nos signals pre/post_save)
+    os valores guardados ainda são os anteriores à gravação.
+    """
+    campos_rastreados = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_valores_gravados()
+        return instancia
+
+    def _guardar_valores_gravados(self, campos=None):
+        gravados = self.__dict__.setdefault('_valores_gravados', {})
+        for campo in self.campos_rastreados:
+            if campo not in self.__dict__:
+                continue
+            if campos is None or campo in campos or campo.removesuffix('_id') in campos:
+                gravados[campo] = self.__dict__[campo]
+
+    def campos_alterados(self) -> set:
+        """Campos rastreados diferentes do valor gravado (todos, se a instância é nova)"""
+        if self._state.adding:
+            return set(self.campos_rastreados)
+        gravados = self.__dict__.get('_valores_gravados', {})
+        return {
+            campo for campo in self.campos_rastreados
+            if campo not in gravados or self.__dict__.get(campo) != gravados[campo]
+        }
+
+    def valor_gravado(self, campo):
+        """Valor do campo rastreado na última leitura/gravação (None se desconhecido)"""
+        return self.__dict__.get('_valores_gravados', {}).get(campo)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._guardar_valores_gravados(fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._guardar_valores_gravados(kwargs.get('update_fields'))
+
 
 class TimeStampedModel(models.Model):
     """Modelo abstrato com campos de auditoria"""
@@ -14,8 +91,10 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
-class Setor(TimeStampedModel):
+class Setor(RastreioAlteracoesMixin, TimeStampedModel):
     """Setores da empresa (Departamentos)"""
+    campos_rastreados = ('chefe_id',)
+
     nome = models.CharField('Nome', max_length=100, unique=True)
     descricao = models.TextField('Descrição', blank=True)
     chefe = models.OneToOneField(
@@ -115,7 +194,7 @@ class ProventoDesconto(TimeStampedModel):
         return f"{self.get_tipo_display()} - {self.nome}"
 
 
-class LancamentoFixoGeral(TimeStampedModel):
+class LancamentoFixoGeral(ValidacaoAoSalvarMixin, TimeStampedModel):
     """Lançamentos fixos gerais aplicados a todos os funcionários na folha"""
     
     provento_desconto = models.ForeignKey(
@@ -151,10 +230,13 @@ class LancamentoFixoGeral(TimeStampedModel):
     observacoes = models.TextField('Observações', blank=True)
     ativo = models.BooleanField('Ativo', default=True)
 
+    objects = VigenciaQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Lançamento Fixo Geral'
         verbose_name_plural = 'Lançamentos Fixos Gerais'
         ordering = ['-data_inicio']
+        indexes = indices_vigencia('lancgeral', 'ativo')
 
     def __str__(self):
         return f"Geral - {self.provento_desconto.nome}"
@@ -173,10 +255,6 @@ class LancamentoFixoGeral(TimeStampedModel):
         if self.valor and self.percentual:
             raise ValidationError('Informe apenas valor fixo OU percentual, não ambos')
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
     @property
     def esta_ativo(self):
         """Verifica se o lançamento está ativo"""
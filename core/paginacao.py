@@ -0,0 +1,138 @@
+"""
+Paginação por cursor (keyset) para as listagens
+
+Em vez de OFFSET, cada página é buscada a partir dos valores de ordenação do
+último (ou primeiro) registro exibido: "WHERE (nome, id) > (:nome, :id)
+ORDER BY nome, id LIMIT n". O custo de cada página não cresce com o histórico
+e, com um índice na ordenação, a consulta lê só as linhas da página.
+
+O cursor vai na query string (parâmetros `depois` e `antes`) como JSON em
+base64, com os valores dos campos de ordenação do registro de referência.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+
+TAMANHO_PAGINA = 50
+
+
+@dataclass
+class PaginaCursor:
+    """Página de uma listagem paginada por cursor"""
+    itens: list
+    proxima: str = None
+    anterior: str = None
+    params: dict = field(default_factory=dict)
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def tem_outras(self):
+        return bool(self.proxima or self.anterior)
+
+    def querystring(self, cursor_param, cursor):
+        """Query string da página vizinha, preservando os demais filtros"""
+        params = {chave: valor for chave, valor in self.params.items() if chave not in ('depois', 'antes')}
+        params[cursor_param] = cursor
+        return '?' + urlencode(params)
+
+    @property
+    def url_proxima(self):
+        return self.querystring('depois', self.proxima) if self.proxima else ''
+
+    @property
+    def url_anterior(self):
+        return self.querystring('antes', self.anterior) if self.anterior else ''
+
+
+def codificar_cursor(valores):
+    """Codifica os valores de ordenação de um registro"""
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, quantidade):
+    """
+    Decodifica um cursor recebido na query string
+
+    Returns:
+        list: Valores de ordenação, ou None se o cursor for inválido
+    """
+    if not cursor:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        return None
+    return valores
+
+
+def _filtro_keyset(ordenacao, valores, invertido=False):
+    """
+    Condição "registro vem depois de `valores`" na ordenação informada
+
+    Para (a, -b, id) gera: a > x OR (a = x AND b < y) OR (a = x AND b = y AND id > z)
+    """
+    filtro = Q()
+    anteriores = {}
+    for campo, valor in zip(ordenacao, valores):
+        nome = campo.lstrip('-')
+        decrescente = campo.startswith('-') != invertido
+        filtro |= Q(**anteriores, **{f'{nome}__{"lt" if decrescente else "gt"}': valor})
+        anteriores[nome] = valor
+    return filtro
+
+
+def paginar_por_cursor(queryset, ordenacao, params, tamanho=TAMANHO_PAGINA):
+    """
+    Página do queryset a partir do cursor informado nos parâmetros
+
+    Args:
+        queryset: QuerySet já filtrado (e anotado, se for o caso)
+        ordenacao: Campos de ordenação; o último deve ser único (ex.: 'pk')
+        params: Parâmetros da requisição (request.GET)
+        tamanho: Quantidade de registros por página
+
+    Returns:
+        PaginaCursor: Registros da página e cursores das páginas vizinhas
+    """
+    ordenacao = list(ordenacao)
+    nomes = [campo.lstrip('-') for campo in ordenacao]
+    depois = decodificar_cursor(params.get('depois', ''), len(ordenacao))
+    antes = decodificar_cursor(params.get('antes', ''), len(ordenacao))
+
+    if antes is not None:
+        # Página anterior: percorre a ordenação ao contrário e desinverte
+        invertida = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in ordenacao]
+        queryset = queryset.filter(_filtro_keyset(ordenacao, antes, invertido=True))
+        itens = list(queryset.order_by(*invertida)[:tamanho + 1])
+        tem_anterior = len(itens) > tamanho
+        itens = itens[:tamanho][::-1]
+        tem_proxima = True
+    else:
+        if depois is not None:
+            queryset = queryset.filter(_filtro_keyset(ordenacao, depois))
+        itens = list(queryset.order_by(*ordenacao)[:tamanho + 1])
+        tem_proxima = len(itens) > tamanho
+        itens = itens[:tamanho]
+        tem_anterior = depois is not None
+
+    def cursor(item):
+        return codificar_cursor([getattr(item, nome) for nome in nomes])
+
+    return PaginaCursor(
+        itens=itens,
+        proxima=cursor(itens[-1]) if itens and tem_proxima else None,
+        anterior=cursor(itens[0]) if itens and tem_anterior else None,
+        params=params.dict() if hasattr(params, 'dict') else dict(params),
+    )
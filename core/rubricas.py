@@ -0,0 +1,94 @@
+"""
+Registro das rubricas do sistema (proventos/descontos lançados automaticamente)
+
+Salário base, adiantamento e 13º são ProventoDesconto identificados pelo
+código de referência e criados sob demanda. O registro resolve cada código uma
+vez por processo: a instância só é guardada depois do commit da transação que
+a leu ou criou (uma rubrica criada em uma transação desfeita nunca fica no
+registro) e é descartada quando qualquer ProventoDesconto muda (ver
+core/signals.py). A versão gravada no cache compartilhado faz o descarte valer
+também para os demais processos.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ProventoDesconto
+
+
+CHAVE_VERSAO_RUBRICAS = 'core:rubricas:versao'
+
+RUBRICAS_SISTEMA = {
+    'SALARIO': {'nome': 'Salário Base', 'tipo': 'P', 'impacto': 'F'},
+    'ADIANTAMENTO': {'nome': 'Adiantamento Salarial', 'tipo': 'D', 'impacto': 'F'},
+    'SALARIO_13': {'nome': '13º Salário', 'tipo': 'P', 'impacto': 'F'},
+}
+
+_registro = {}
+_versao_registro = None
+_lock = threading.Lock()
+
+
+def _versao_atual():
+    """Versão das rubricas no cache compartilhado (criada se ainda não existir)"""
+    versao = cache.get(CHAVE_VERSAO_RUBRICAS)
+    if versao is None:
+        cache.add(CHAVE_VERSAO_RUBRICAS, uuid.uuid4().hex, None)
+        versao = cache.get(CHAVE_VERSAO_RUBRICAS)
+    return versao
+
+
+def _guardar(codigo, rubrica, versao):
+    with _lock:
+        if versao == _versao_registro:
+            _registro[codigo] = rubrica
+
+
+def obter_rubrica(codigo: str, criar: bool = True) -> ProventoDesconto:
+    """
+    Rubrica do sistema pelo código de referência, criada se não existir
+
+    Args:
+        codigo: Código de referência (SALARIO, ADIANTAMENTO, SALARIO_13)
+        criar: Com False, uma rubrica ainda inexistente não é gravada: volta
+            uma instância não salva (fora do registro), para cálculos sem escrita
+
+    Returns:
+        ProventoDesconto: Rubrica do registro ou do banco
+    """
+    global _versao_registro
+
+    versao = _versao_atual()
+    with _lock:
+        if versao != _versao_registro:
+            _registro.clear()
+            _versao_registro = versao
+        rubrica = _registro.get(codigo)
+    if rubrica is not None:
+        return rubrica
+
+    if criar:
+        # get_or_create trata a corrida entre duas criações simultâneas
+        # (codigo_referencia é único)
+        rubrica, _ = ProventoDesconto.objects.get_or_create(
+            codigo_referencia=codigo,
+            defaults=RUBRICAS_SISTEMA[codigo],
+        )
+    else:
+        rubrica = ProventoDesconto.objects.filter(codigo_referencia=codigo).first()
+        if rubrica is None:
+            return ProventoDesconto(codigo_referencia=codigo, **RUBRICAS_SISTEMA[codigo])
+    transaction.on_commit(lambda: _guardar(codigo, rubrica, versao))
+    return rubrica
+
+
+def invalidar_rubricas():
+    """Descarta o registro deste e dos demais processos"""
+    global _versao_registro
+
+    with _lock:
+        _registro.clear()
+        _versao_registro = None
+    cache.set(CHAVE_VERSAO_RUBRICAS, uuid.uuid4().hex, None)
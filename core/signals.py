@@ -0,0 +1,29 @@
+"""
+Signals para o app Core
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from folha.models import FolhaPagamento
+from funcionarios.models import Ferias, Funcionario
+from .dashboard import invalidar_dashboard
+from .models import ProventoDesconto
+from .rubricas import invalidar_rubricas
+
+
+@receiver(post_save, sender=Funcionario)
+@receiver(post_delete, sender=Funcionario)
+@receiver(post_save, sender=Ferias)
+@receiver(post_delete, sender=Ferias)
+@receiver(post_save, sender=FolhaPagamento)
+@receiver(post_delete, sender=FolhaPagamento)
+def invalidar_cache_dashboard(sender, **kwargs):
+    """Descarta o dashboard em cache quando muda algum dado exibido nele"""
+    invalidar_dashboard()
+
+
+@receiver(post_save, sender=ProventoDesconto)
+@receiver(post_delete, sender=ProventoDesconto)
+def invalidar_registro_rubricas(sender, **kwargs):
+    """Descarta as rubricas do sistema em memória quando algum provento/desconto muda"""
+    invalidar_rubricas()
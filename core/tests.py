@@ -1,8 +1,23 @@
 """
 Testes para o app Core
 """
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from core.dashboard import dados_dashboard
+from core.instrumentacao import ColetorConsultas, modelo_sql
+from core.rubricas import CHAVE_VERSAO_RUBRICAS, invalidar_rubricas, obter_rubrica
 from core.models import Setor, Funcao, TipoContrato, ProventoDesconto
+from folha.models import FolhaPagamento
+from funcionarios.models import Funcionario
 
 
 class SetorModelTest(TestCase):
@@ -76,3 +91,174 @@ class ProventoDescontoModelTest(TestCase):
         """Testa representação string"""
         self.assertIn('Provento', str(self.provento))
         self.assertIn('Salário Base', str(self.provento))
+
+
+class DashboardTest(TestCase):
+    """Testes do payload do dashboard"""
+
+    def setUp(self):
+        cache.clear()
+        setor = Setor.objects.create(nome='TI')
+        funcao = Funcao.objects.create(nome='Desenvolvedor')
+        dados = {'data_admissao': date(2023, 1, 1), 'funcao': funcao, 'setor': setor}
+        Funcionario.objects.create(nome_completo='Ana', cpf='12345678909',
+                                   salario_base=Decimal('3000.00'), **dados)
+        Funcionario.objects.create(nome_completo='Bruno', cpf='52998224725',
+                                   salario_base=Decimal('5000.00'), **dados)
+        Funcionario.objects.create(nome_completo='Carla', cpf='11144477735',
+                                   salario_base=Decimal('9000.00'), status='I', **dados)
+
+    def test_totais_em_uma_agregacao(self):
+        """Testa as contagens e somas calculadas"""
+        with self.assertNumQueries(4):
+            dados = dados_dashboard()
+
+        self.assertEqual(dados['total_funcionarios'], 2)
+        self.assertEqual(dados['total_inativos'], 1)
+        self.assertEqual(dados['total_ferias'], 0)
+        self.assertEqual(dados['total_salarios'], Decimal('8000.00'))
+        self.assertEqual(dados['salario_medio'], Decimal('4000.00'))
+
+    def test_cache_invalidado_ao_gravar(self):
+        """Testa que o payload vem do cache e é descartado ao gravar folha/funcionário"""
+        dados_dashboard()
+        with self.assertNumQueries(0):
+            dados_dashboard()
+
+        FolhaPagamento.objects.create(mes=1, ano=2024)
+        self.assertEqual(dados_dashboard()['ultima_folha'].periodo_referencia, '01/2024')
+
+        Funcionario.objects.filter(nome_completo='Ana').get().delete()
+        self.assertEqual(dados_dashboard()['total_funcionarios'], 1)
+
+    def test_totais_da_ultima_folha_atualizados(self):
+        """Testa que totais gravados por UPDATE (sem post_save) aparecem mesmo com o payload em cache"""
+        folha = FolhaPagamento.objects.create(mes=1, ano=2024)
+        dados_dashboard()
+
+        FolhaPagamento.objects.filter(pk=folha.pk).update(total_proventos=Decimal('1234.56'))
+        with self.assertNumQueries(1):
+            self.assertEqual(dados_dashboard()['ultima_folha'].total_proventos, Decimal('1234.56'))
+
+    def test_view_dashboard(self):
+        """Testa a renderização do dashboard"""
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        response = self.client.get(reverse('core:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '8.000,00')
+
+
+class RubricasSistemaTest(TestCase):
+    """Testes do registro das rubricas do sistema"""
+
+    def setUp(self):
+        cache.clear()
+        invalidar_rubricas()
+
+    def tearDown(self):
+        # As rubricas somem no rollback do teste; não podem ficar no registro
+        invalidar_rubricas()
+
+    def test_cria_e_reaproveita_apos_commit(self):
+        """Testa a criação sob demanda e o reaproveitamento sem consultas"""
+        with self.captureOnCommitCallbacks(execute=True):
+            salario = obter_rubrica('SALARIO')
+        self.assertEqual((salario.codigo_referencia, salario.tipo), ('SALARIO', 'P'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(obter_rubrica('SALARIO'), salario)
+        with self.assertNumQueries(0):
+            self.assertEqual(obter_rubrica('SALARIO'), salario)
+        self.assertEqual(ProventoDesconto.objects.filter(codigo_referencia='SALARIO').count(), 1)
+
+    def test_alteracao_descarta_registro(self):
+        """Testa que gravar um provento/desconto invalida o registro"""
+        with self.captureOnCommitCallbacks(execute=True):
+            obter_rubrica('ADIANTAMENTO')
+        with self.captureOnCommitCallbacks(execute=True):
+            adiantamento = obter_rubrica('ADIANTAMENTO')
+
+        adiantamento.nome = 'Adiantamento Quinzenal'
+        adiantamento.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(obter_rubrica('ADIANTAMENTO').nome, 'Adiantamento Quinzenal')
+
+    def test_transacao_nao_confirmada_nao_guarda(self):
+        """Testa que a rubrica só entra no registro após o commit"""
+        obter_rubrica('SALARIO_13')
+        with self.assertNumQueries(1):
+            obter_rubrica('SALARIO_13')
+
+    def test_versao_compartilhada_entre_processos(self):
+        """Testa que, no cache em arquivo de produção, a versão trocada por um processo vale para os outros"""
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': diretorio},
+        }):
+            with self.captureOnCommitCallbacks(execute=True):
+                obter_rubrica('SALARIO')
+
+            # Cliente novo no mesmo diretório, como o de outro processo
+            outro_processo = FileBasedCache(diretorio, {})
+            invalidar_rubricas()
+            self.assertEqual(outro_processo.get(CHAVE_VERSAO_RUBRICAS), cache.get(CHAVE_VERSAO_RUBRICAS))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                obter_rubrica('SALARIO')
+            outro_processo.set(CHAVE_VERSAO_RUBRICAS, 'alterada-por-outro-processo', None)
+            with self.assertNumQueries(1):
+                obter_rubrica('SALARIO')
+
+
+class InstrumentacaoTest(TestCase):
+    """Testes do middleware de instrumentação das requisições"""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+    def test_modelo_sql_ignora_parametros(self):
+        """Testa que consultas iguais a menos dos valores têm o mesmo modelo"""
+        self.assertEqual(
+            modelo_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            modelo_sql('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 1'),
+        )
+
+    def test_coletor_detecta_repeticoes(self):
+        """Testa a contagem de consultas e a detecção de N+1"""
+        coletor = ColetorConsultas()
+        with connection.execute_wrapper(coletor):
+            for pk in range(12):
+                Setor.objects.filter(pk=pk).exists()
+            Funcao.objects.count()
+
+        self.assertEqual(coletor.consultas, 13)
+        repeticoes = coletor.repeticoes(10)
+        self.assertEqual(len(repeticoes), 1)
+        self.assertEqual(repeticoes[0]['vezes'], 12)
+        self.assertIn('core_setor', repeticoes[0]['sql'])
+
+    @override_settings(INSTRUMENTACAO_LIMITE_MS=0)
+    def test_requisicao_lenta_registrada(self):
+        """Testa o registro estruturado das requisições acima do limite"""
+        with self.assertLogs('core.instrumentacao', 'WARNING') as logs:
+            self.client.get(reverse('core:dashboard'))
+
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['view'], 'core:dashboard')
+        self.assertEqual(registro['status'], 200)
+        self.assertTrue(registro['lenta'])
+        self.assertGreater(registro['consultas'], 0)
+        self.assertEqual(registro['n_mais_1'], [])
+
+    @override_settings(INSTRUMENTACAO_LIMITE_MS=60000)
+    def test_requisicao_rapida_nao_registrada(self):
+        """Testa que requisições rápidas e sem N+1 (ou fora da amostra) não são gravadas"""
+        with self.assertNoLogs('core.instrumentacao', 'WARNING'):
+            self.client.get(reverse('core:dashboard'))
+
+        with override_settings(INSTRUMENTACAO_LIMITE_MS=0, INSTRUMENTACAO_AMOSTRAGEM=0):
+            with self.assertNoLogs('core.instrumentacao', 'WARNING'):
+                self.client.get(reverse('core:dashboard'))
@@ -0,0 +1,78 @@
+"""
+Vigência de registros com data de início e fim (contratos, lançamentos fixos)
+
+Os modelos com `data_inicio`/`data_fim` (fim vazio = vigência indeterminada)
+usam `VigenciaQuerySet` como manager e declaram os índices de
+`indices_vigencia`, de modo que "vigente na competência" e "sobreposto a um
+período" viram consultas por intervalo apoiadas em índice composto.
+
+No PostgreSQL, a migração de Contrato acrescenta ainda uma exclusion
+constraint GiST sobre daterange(data_inicio, data_fim), que impede contratos
+sobrepostos do mesmo funcionário no próprio banco.
+"""
+import calendar
+from datetime import date
+
+from django.db import models
+
+
+def periodo_competencia(mes: int, ano: int):
+    """Retorna o primeiro e o último dia da competência"""
+    return date(ano, mes, 1), date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+
+def filtro_sobreposicao(inicio: date, fim: date = None) -> models.Q:
+    """
+    Condição de sobreposição com o período [inicio, fim] (fim vazio = em aberto)
+
+    Args:
+        inicio: Primeiro dia do período
+        fim: Último dia do período (inclusive); None = sem fim
+    """
+    filtro = models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=inicio)
+    if fim is not None:
+        filtro &= models.Q(data_inicio__lte=fim)
+    return filtro
+
+
+def vigente_no_periodo(registro, inicio: date, fim: date) -> bool:
+    """Mesma condição de `filtro_sobreposicao`, para um registro já carregado"""
+    return registro.data_inicio <= fim and (registro.data_fim is None or registro.data_fim >= inicio)
+
+
+class VigenciaQuerySet(models.QuerySet):
+    """QuerySet de registros com vigência (data_inicio/data_fim)"""
+
+    def vigentes_em(self, inicio: date, fim: date = None):
+        """
+        Registros vigentes em algum momento do período
+
+        Args:
+            inicio: Data (ou primeiro dia do período)
+            fim: Último dia do período, inclusive; se omitido, vale só `inicio`
+        """
+        return self.filter(filtro_sobreposicao(inicio, inicio if fim is None else fim))
+
+    def vigentes_na_competencia(self, mes: int, ano: int):
+        """Registros vigentes em algum dia do mês da competência"""
+        return self.vigentes_em(*periodo_competencia(mes, ano))
+
+    def sobrepostos(self, inicio: date, fim: date = None):
+        """Registros cuja vigência se sobrepõe a [inicio, fim] (fim vazio = em aberto)"""
+        return self.filter(filtro_sobreposicao(inicio, fim))
+
+
+def indices_vigencia(prefixo: str, *campos):
+    """
+    Índices compostos para as consultas de vigência
+
+    Args:
+        prefixo: Prefixo curto do nome dos índices
+        campos: Campos que antecedem as datas (ex.: 'funcionario'); quando
+                informados, também é criado o índice só das datas, usado na
+                busca de todos os registros vigentes na competência
+    """
+    indices = [models.Index(fields=[*campos, 'data_inicio', 'data_fim'], name=f'{prefixo}_vigencia_idx')]
+    if campos:
+        indices.append(models.Index(fields=['data_inicio', 'data_fim'], name=f'{prefixo}_periodo_idx'))
+    return indices
@@ -3,7 +3,7 @@ Configuração do Django Admin para o app Folha de Pagamento
 """
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import FolhaPagamento, EventoPagamento, ItemFolha, ResumoFolhaFuncionario
+from .models import FolhaPagamento, EventoPagamento, ItemFolha, ResumoFolhaFuncionario, TarefaFolha
 
 
 class EventoPagamentoInline(admin.TabularInline):
@@ -16,11 +16,21 @@ class EventoPagamentoInline(admin.TabularInline):
 
 
 class ItemFolhaInline(admin.TabularInline):
-    """Inline para itens da folha no evento de pagamento"""
+    """
+    Inline (somente leitura) para itens da folha no evento de pagamento
+
+    Os itens são lançados pelo FolhaService, que mantém os totais do evento,
+    da folha e os resumos por funcionário; gravá-los pelo admin os deixaria
+    desatualizados.
+    """
     model = ItemFolha
     extra = 0
+    can_delete = False
     fields = ['funcionario', 'provento_desconto', 'valor_lancado', 'base_calculo']
-    readonly_fields = ['funcionario', 'provento_desconto']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(FolhaPagamento)
@@ -42,7 +52,12 @@ class FolhaPagamentoAdmin(admin.ModelAdmin):
             'fields': ('observacoes',),
             'classes': ('collapse',)
         }),
+        ('Geração', {
+            'fields': ('relatorio_geracao',),
+            'classes': ('collapse',)
+        }),
     )
+    readonly_fields = ['relatorio_geracao']
     
     inlines = [EventoPagamentoInline]
     
@@ -130,6 +145,16 @@ class ItemFolhaAdmin(admin.ModelAdmin):
     ordering = ['evento_pagamento', 'funcionario']
     raw_id_fields = ['adiantamento_origem']
     
+    # Somente consulta: ver ItemFolhaInline
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
     def tipo_item(self, obj):
         colors = {
             'Provento': '#198754',
@@ -164,3 +189,12 @@ class ResumoFolhaFuncionarioAdmin(admin.ModelAdmin):
     list_filter = ['folha_pagamento__ano', 'folha_pagamento__mes']
     search_fields = ['funcionario__nome_completo']
     ordering = ['folha_pagamento', 'funcionario']
+
+
+@admin.register(TarefaFolha)
+class TarefaFolhaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'folha_pagamento', 'status', 'progresso', 'solicitado_por',
+                    'created_at', 'concluido_em']
+    list_filter = ['status', 'tipo']
+    ordering = ['-created_at']
+    readonly_fields = ['iniciado_em', 'concluido_em', 'created_at', 'updated_at']
@@ -0,0 +1,139 @@
+"""
+API REST da Folha de Pagamento (v1)
+
+- eventos/<id>/itens/: leitura paginada (GET) e gravação em lote (POST) de itens
+- folhas/<id>/itens/ e folhas/<id>/resumos/: leitura paginada
+- folhas/gerar/: enfileira a geração da folha e responde 202 com a tarefa
+- competencias/<ano>/<mes>/previa/: cálculo da competência sem gravar nada
+- folhas/<id>/diferencas/: compara a folha gravada com o cálculo atual
+- tarefas/<id>/: acompanhamento da tarefa
+
+As leituras são paginadas por cursor (`?cursor=`, `?tamanho=`) e aceitam
+sparse fieldsets (`?campos=funcionario,valor_lancado`).
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import generics, serializers, status
+from rest_framework.decorators import api_view
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .models import EventoPagamento, FolhaPagamento, ItemFolha, ResumoFolhaFuncionario
+from .serializers import (
+    GerarFolhaSerializer, ItemFolhaSerializer, ItemLoteSerializer,
+    ResumoFolhaSerializer, TarefaFolhaSerializer,
+)
+from .services import FolhaService
+from .tarefas import TarefaService
+
+
+class PaginacaoCursor(CursorPagination):
+    """Paginação por cursor (keyset) das leituras da API"""
+    ordering = 'pk'
+    page_size = 100
+    page_size_query_param = 'tamanho'
+    max_page_size = 1000
+
+
+class EventoItensAPI(generics.ListCreateAPIView):
+    """Itens de um evento: leitura paginada e gravação em lote (upsert)"""
+    pagination_class = PaginacaoCursor
+
+    def get_queryset(self):
+        evento = get_object_or_404(EventoPagamento, pk=self.kwargs['pk'])
+        return ItemFolha.objects.filter(
+            evento_pagamento=evento
+        ).select_related('funcionario', 'provento_desconto')
+
+    def get_serializer_class(self):
+        return ItemLoteSerializer if self.request.method == 'POST' else ItemFolhaSerializer
+
+    def create(self, request, *args, **kwargs):
+        evento = get_object_or_404(EventoPagamento.objects.select_related('folha_pagamento'), pk=self.kwargs['pk'])
+        serializer = ItemLoteSerializer(
+            data=request.data, many=True, context={**self.get_serializer_context(), 'evento': evento}
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            resultado = serializer.save()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+
+        evento.refresh_from_db(fields=['total_proventos', 'total_descontos', 'valor_total'])
+        return Response({
+            **resultado,
+            'evento': {
+                'id': evento.pk,
+                'total_proventos': evento.total_proventos,
+                'total_descontos': evento.total_descontos,
+                'valor_total': evento.valor_total,
+            },
+        })
+
+
+class FolhaItensAPI(generics.ListAPIView):
+    """Itens de todos os eventos de uma folha"""
+    serializer_class = ItemFolhaSerializer
+    pagination_class = PaginacaoCursor
+
+    def get_queryset(self):
+        folha = get_object_or_404(FolhaPagamento, pk=self.kwargs['pk'])
+        return ItemFolha.objects.filter(
+            folha_pagamento=folha
+        ).select_related('funcionario', 'provento_desconto')
+
+
+class FolhaResumosAPI(generics.ListAPIView):
+    """Resumos por funcionário de uma folha"""
+    serializer_class = ResumoFolhaSerializer
+    pagination_class = PaginacaoCursor
+
+    def get_queryset(self):
+        folha = get_object_or_404(FolhaPagamento, pk=self.kwargs['pk'])
+        return ResumoFolhaFuncionario.objects.filter(
+            folha_pagamento=folha
+        ).select_related('funcionario')
+
+
+@api_view(['POST'])
+def folha_gerar(request):
+    """Enfileira a geração da folha da competência (processada em segundo plano)"""
+    serializer = GerarFolhaSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    mes, ano = serializer.validated_data['mes'], serializer.validated_data['ano']
+
+    if FolhaPagamento.objects.filter(mes=mes, ano=ano).exists():
+        return Response(
+            {'detail': 'Já existe uma folha de pagamento para este período'},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    tarefa = TarefaService.enfileirar('GF', {'mes': mes, 'ano': ano}, usuario=request.user)
+    return Response(
+        TarefaFolhaSerializer(tarefa).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': reverse('api-v1:tarefa', args=[tarefa.pk])},
+    )
+
+
+@api_view(['GET'])
+def competencia_previa(request, ano, mes):
+    """Linhas e totais que a geração da competência produziria (sem gravar)"""
+    serializer = GerarFolhaSerializer(data={'mes': mes, 'ano': ano})
+    serializer.is_valid(raise_exception=True)
+    return Response(FolhaService.calcular_competencia(mes, ano))
+
+
+@api_view(['GET'])
+def folha_diferencas(request, pk):
+    """Diferenças entre a folha gravada e o cálculo atual da competência"""
+    folha = get_object_or_404(FolhaPagamento, pk=pk)
+    return Response(FolhaService.comparar_competencia(folha))
+
+
+@api_view(['GET'])
+def tarefa(request, pk):
+    """Status e resultado de uma tarefa (só de quem a solicitou, ou para a equipe)"""
+    return Response(TarefaFolhaSerializer(get_object_or_404(TarefaService.visiveis(request.user), pk=pk)).data)
+
@@ -0,0 +1,17 @@
+"""
+URLs da API da Folha de Pagamento (v1)
+"""
+from django.urls import path
+from . import api
+
+app_name = 'api-v1'
+
+urlpatterns = [
+    path('eventos/<int:pk>/itens/', api.EventoItensAPI.as_view(), name='evento_itens'),
+    path('folhas/<int:pk>/itens/', api.FolhaItensAPI.as_view(), name='folha_itens'),
+    path('folhas/<int:pk>/resumos/', api.FolhaResumosAPI.as_view(), name='folha_resumos'),
+    path('folhas/<int:pk>/diferencas/', api.folha_diferencas, name='folha_diferencas'),
+    path('folhas/gerar/', api.folha_gerar, name='folha_gerar'),
+    path('competencias/<int:ano>/<int:mes>/previa/', api.competencia_previa, name='competencia_previa'),
+    path('tarefas/<int:pk>/', api.tarefa, name='tarefa'),
+]
@@ -5,3 +5,7 @@ class FolhaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'folha'
     verbose_name = 'Folha de Pagamento'
+
+    def ready(self):
+        """Importa os signals quando o app estiver pronto"""
+        import folha.signals
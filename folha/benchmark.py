@@ -0,0 +1,323 @@
+"""
+Benchmark da folha de pagamento com uma empresa sintética
+
+gerar_empresa_sintetica cria em lote uma empresa com N funcionários
+distribuídos em setores e em uma hierarquia de profundidade configurável, com
+contratos, lançamentos fixos gerais e individuais e adiantamentos pendentes.
+executar_benchmark mede o tempo e o número de consultas de cada etapa
+(cadastro, geração, eventos, resumos, exportações e listagens) dentro de uma
+transação que é desfeita ao final. O comando benchmark_folha grava o
+resultado em JSON e o compara com uma execução de referência.
+"""
+import platform
+import random
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import date
+from decimal import Decimal
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from validate_docbr import CPF
+
+from core.dashboard import invalidar_dashboard
+from core.models import Funcao, LancamentoFixoGeral, ProventoDesconto, Setor, TipoContrato
+from core.rubricas import invalidar_rubricas
+from core.vigencia import periodo_competencia
+from funcionarios.busca import normalizar_texto, somente_digitos
+from funcionarios.hierarquia import invalidar_organograma
+from funcionarios.models import Adiantamento, Contrato, Funcionario, LancamentoFixo
+from .exports import FolhaPagamentoExporter, HoleritesLoteExporter
+from .services import FolhaService
+
+
+@dataclass
+class ParametrosBenchmark:
+    """Tamanho da empresa sintética e competência medida"""
+    funcionarios: int = 500
+    setores: int = 10
+    profundidade: int = 4
+    lancamentos_gerais: int = 2
+    lancamentos_fixos: int = 2
+    adiantamentos: float = 0.5  # fração dos funcionários com adiantamento pendente
+    mes: int = 1
+    ano: int = 2090
+    semente: int = 42
+    exportacoes: bool = True
+    processos: int = 1  # processos no cálculo da geração (FolhaService.gerar_folha)
+
+
+def _niveis_hierarquia(funcionarios, setores, profundidade):
+    """Quantidade de funcionários por nível: um chefe por setor no topo e o restante dividido entre os demais níveis"""
+    raizes = min(funcionarios, max(setores, 1))
+    if profundidade <= 1:
+        return [funcionarios]
+    restantes = funcionarios - raizes
+    base, sobra = divmod(restantes, profundidade - 1)
+    niveis = [raizes] + [base + (1 if i < sobra else 0) for i in range(profundidade - 1)]
+    return [quantidade for quantidade in niveis if quantidade]
+
+
+def _valores_lancamento(rubrica, aleatorio):
+    """Valor fixo ou percentual, conforme o impacto da rubrica"""
+    if rubrica.impacto == 'F':
+        return {'valor': Decimal(aleatorio.randrange(5000, 50000)).scaleb(-2)}
+    return {'percentual': Decimal(aleatorio.randrange(100, 1500)).scaleb(-2)}
+
+
+def gerar_empresa_sintetica(parametros: ParametrosBenchmark) -> dict:
+    """
+    Cria a empresa sintética com bulk_create (sem signals nem save())
+
+    As colunas mantidas pelo save() (busca e caminho hierárquico) são
+    preenchidas aqui; a hierarquia é gravada nível a nível para que os
+    caminhos usem os IDs já criados.
+
+    Args:
+        parametros: Tamanho da empresa e competência
+
+    Returns:
+        dict: Quantidade de registros criados por tipo
+    """
+    aleatorio = random.Random(parametros.semente)
+    lote = FolhaService.BATCH_SIZE
+    admissao = date(parametros.ano - 1, 1, 1)
+    primeiro_dia, _ = periodo_competencia(parametros.mes, parametros.ano)
+
+    setores = Setor.objects.bulk_create([
+        Setor(nome=f'Setor Sintético {i:03d}') for i in range(max(parametros.setores, 1))
+    ])
+    funcoes = Funcao.objects.bulk_create([
+        Funcao(nome=f'Função Sintética {i:02d}') for i in range(max(parametros.profundidade, 1))
+    ])
+    tipo_contrato = TipoContrato.objects.create(nome='Contrato Sintético')
+    rubricas = ProventoDesconto.objects.bulk_create([
+        ProventoDesconto(
+            nome=f'Rubrica Sintética {i:02d}',
+            codigo_referencia=f'SINT{i:02d}',
+            tipo='P' if i % 2 == 0 else 'D',
+            impacto='P' if i % 3 == 0 else 'F',
+        )
+        for i in range(max(parametros.lancamentos_gerais, parametros.lancamentos_fixos, 1))
+    ])
+
+    gerador_cpf = CPF()
+    cpfs = set()
+    while len(cpfs) < parametros.funcionarios:
+        cpfs.add(gerador_cpf.generate(mask=True))
+    cpfs = sorted(cpfs)
+
+    funcionarios = []
+    anteriores = []
+    niveis = _niveis_hierarquia(parametros.funcionarios, parametros.setores, parametros.profundidade)
+    for nivel, quantidade in enumerate(niveis):
+        novos = []
+        for posicao in range(quantidade):
+            superior = anteriores[posicao % len(anteriores)] if anteriores else None
+            indice = len(funcionarios) + posicao
+            nome = f'Funcionário Sintético {indice:06d}'
+            novos.append(Funcionario(
+                nome_completo=nome,
+                nome_busca=normalizar_texto(nome),
+                cpf=cpfs[indice],
+                cpf_numeros=somente_digitos(cpfs[indice]),
+                data_admissao=admissao,
+                funcao=funcoes[nivel],
+                setor=superior.setor if superior else setores[posicao % len(setores)],
+                salario_base=Decimal(aleatorio.randrange(150000, 2000000)).scaleb(-2),
+                superior=superior,
+                nivel_hierarquico=nivel,
+            ))
+        Funcionario.objects.bulk_create(novos, batch_size=lote)
+        for funcionario in novos:
+            caminho_superior = funcionario.superior.caminho_hierarquia if funcionario.superior else '/'
+            funcionario.caminho_hierarquia = f'{caminho_superior}{funcionario.pk}/'
+        Funcionario.objects.bulk_update(novos, ['caminho_hierarquia'], batch_size=lote)
+        funcionarios.extend(novos)
+        anteriores = novos
+
+    # O primeiro funcionário de cada setor no topo é o chefe
+    for setor, chefe in zip(setores, funcionarios[:niveis[0]] if niveis else []):
+        setor.chefe = chefe
+    Setor.objects.bulk_update(setores, ['chefe'])
+
+    Contrato.objects.bulk_create([
+        Contrato(funcionario=f, tipo_contrato=tipo_contrato, data_inicio=admissao, carga_horaria=40)
+        for f in funcionarios
+    ], batch_size=lote)
+
+    LancamentoFixoGeral.objects.bulk_create([
+        LancamentoFixoGeral(
+            provento_desconto=rubricas[i % len(rubricas)],
+            data_inicio=admissao,
+            observacoes=f'Lançamento geral sintético {i}',
+            **_valores_lancamento(rubricas[i % len(rubricas)], aleatorio),
+        )
+        for i in range(parametros.lancamentos_gerais)
+    ])
+
+    LancamentoFixo.objects.bulk_create([
+        LancamentoFixo(
+            funcionario=f,
+            provento_desconto=rubricas[i % len(rubricas)],
+            data_inicio=admissao,
+            observacoes=f'Lançamento sintético {i}',
+            **_valores_lancamento(rubricas[i % len(rubricas)], aleatorio),
+        )
+        for f in funcionarios
+        for i in range(parametros.lancamentos_fixos)
+    ], batch_size=lote)
+
+    com_adiantamento = aleatorio.sample(funcionarios, round(len(funcionarios) * parametros.adiantamentos))
+    Adiantamento.objects.bulk_create([
+        Adiantamento(funcionario=f, data_adiantamento=primeiro_dia, valor=Decimal('200.00'))
+        for f in com_adiantamento
+    ], batch_size=lote)
+
+    return {
+        'setores': len(setores),
+        'niveis': len(niveis),
+        'funcionarios': len(funcionarios),
+        'lancamentos_gerais': parametros.lancamentos_gerais,
+        'lancamentos_fixos': len(funcionarios) * parametros.lancamentos_fixos,
+        'adiantamentos': len(com_adiantamento),
+    }
+
+
+def _requisitar(usuario, nome_url, *args, **query):
+    """Executa a view (sem middleware) e devolve a resposta já renderizada"""
+    requisicao = RequestFactory().get(reverse(nome_url, args=args), query)
+    requisicao.user = usuario
+    rota = resolve(requisicao.path_info)
+    resposta = rota.func(requisicao, *rota.args, **rota.kwargs)
+    if resposta.status_code >= 400:
+        raise RuntimeError(f'{nome_url} respondeu {resposta.status_code}')
+    return resposta
+
+
+def executar_benchmark(parametros: ParametrosBenchmark) -> dict:
+    """
+    Cria a empresa sintética e mede cada etapa
+
+    Tudo roda em uma transação desfeita ao final; os caches preenchidos com
+    os dados sintéticos (organograma, dashboard e rubricas) são descartados.
+
+    Args:
+        parametros: Tamanho da empresa e competência
+
+    Returns:
+        dict: parametros, ambiente, cadastro (registros criados) e etapas
+        (nome, segundos e consultas de cada uma)
+    """
+    resultado = {
+        'parametros': asdict(parametros),
+        'ambiente': {
+            'banco': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'executado_em': timezone.now().isoformat(),
+        },
+        'etapas': [],
+    }
+
+    def medir(nome, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            retorno = funcao()
+            segundos = time.perf_counter() - inicio
+        resultado['etapas'].append({
+            'etapa': nome,
+            'segundos': round(segundos, 4),
+            'consultas': len(consultas),
+        })
+        return retorno
+
+    mes, ano = parametros.mes, parametros.ano
+    _, ultimo_dia = periodo_competencia(mes, ano)
+    try:
+        with transaction.atomic():
+            resultado['cadastro'] = medir('cadastro', lambda: gerar_empresa_sintetica(parametros))
+            usuario = User.objects.create(username='benchmark-folha', is_staff=True, is_superuser=True)
+
+            medir('previa_competencia', lambda: FolhaService.calcular_competencia(mes, ano))
+            folha = medir('gerar_folha', lambda: FolhaService.gerar_folha(mes, ano, processos=parametros.processos))
+            medir('comparar_competencia', lambda: FolhaService.comparar_competencia(folha))
+            medir('evento_adiantamento', lambda: FolhaService.criar_evento_adiantamento_massivo(
+                folha, 'Adiantamento sintético', ultimo_dia, percentual=Decimal('40.00')
+            ))
+            medir('evento_decimo_terceiro', lambda: FolhaService.criar_evento_decimo_terceiro(
+                folha, '13º sintético', ultimo_dia
+            ))
+            medir('recalcular_resumos', lambda: FolhaService.recalcular_resumos(folha))
+
+            if parametros.exportacoes:
+                with tempfile.TemporaryFile() as arquivo:
+                    medir('exportar_excel', lambda: FolhaPagamentoExporter(folha).export_excel(arquivo))
+                medir('exportar_pdf', lambda: FolhaPagamentoExporter(folha).export_pdf())
+                # Um único processo: a renderização em paralelo fecha as
+                # conexões antes do fork, o que desfaria a transação
+                medir('exportar_holerites', lambda: HoleritesLoteExporter(folha, processos=1).export_pdf())
+
+            medir('view_folha_list', lambda: _requisitar(usuario, 'folha:list'))
+            medir('view_folha_detail', lambda: _requisitar(usuario, 'folha:detail', folha.pk))
+            medir('view_funcionario_list', lambda: _requisitar(usuario, 'funcionarios:list'))
+            medir('view_funcionario_busca', lambda: _requisitar(
+                usuario, 'funcionarios:list', q='Funcionario Sintetico 0001'
+            ))
+            medir('view_adiantamento_list', lambda: _requisitar(usuario, 'funcionarios:adiantamento_list'))
+            invalidar_organograma()
+            medir('view_organograma', lambda: _requisitar(usuario, 'funcionarios:organograma'))
+            invalidar_dashboard()
+            medir('view_dashboard', lambda: _requisitar(usuario, 'core:dashboard'))
+
+            transaction.set_rollback(True)
+    finally:
+        invalidar_organograma()
+        invalidar_dashboard()
+        invalidar_rubricas()
+
+    return resultado
+
+
+def comparar_resultados(atual: dict, referencia: dict, tolerancia: float = 0.25,
+                        folga_segundos: float = 0.05) -> list:
+    """
+    Regressões de uma execução em relação à de referência
+
+    Qualquer consulta a mais é regressão. No tempo, a etapa precisa ficar
+    acima da referência pela tolerância relativa e pela folga absoluta (para
+    não acusar ruído em etapas de milissegundos).
+
+    Args:
+        atual: Resultado de executar_benchmark
+        referencia: Resultado anterior com os mesmos parâmetros
+        tolerancia: Aumento relativo de tempo aceito (0.25 = 25%)
+        folga_segundos: Aumento absoluto de tempo sempre aceito
+
+    Returns:
+        list: Um dict (etapa, medida, referencia, atual) por regressão
+    """
+    anteriores = {etapa['etapa']: etapa for etapa in referencia.get('etapas', [])}
+    regressoes = []
+    for etapa in atual['etapas']:
+        anterior = anteriores.get(etapa['etapa'])
+        if anterior is None:
+            continue
+        if etapa['consultas'] > anterior['consultas']:
+            regressoes.append({
+                'etapa': etapa['etapa'], 'medida': 'consultas',
+                'referencia': anterior['consultas'], 'atual': etapa['consultas'],
+            })
+        limite = max(anterior['segundos'] * (1 + tolerancia), anterior['segundos'] + folga_segundos)
+        if etapa['segundos'] > limite:
+            regressoes.append({
+                'etapa': etapa['etapa'], 'medida': 'segundos',
+                'referencia': anterior['segundos'], 'atual': etapa['segundos'],
+            })
+    return regressoes
@@ -2,25 +2,41 @@
 Módulo de exportação de folha de pagamento
 Suporta exportação para PDF e Excel
 """
+import os
+import tempfile
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
 from datetime import datetime
-from django.http import HttpResponse
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.http import FileResponse, HttpResponse
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
 
 class FolhaPagamentoExporter:
     """Classe para exportação de folha de pagamento"""
     
+    # Resumos lidos por vez ao percorrer a folha
+    CHUNK_SIZE = 2000
+    
     def __init__(self, folha):
         self.folha = folha
-        self.resumos = folha.resumos.select_related('funcionario').order_by('funcionario__nome_completo')
+        self.resumos = folha.resumos.select_related(
+            'funcionario__funcao'
+        ).order_by('funcionario__nome_completo')
     
     def export_pdf(self):
         """Exporta a folha para PDF"""
@@ -58,7 +74,9 @@ class FolhaPagamentoExporter:
             ['Funcionário', 'Função', 'Proventos', 'Descontos', 'Líquido']
         ]
         
-        for resumo in self.resumos:
+        # Totais acumulados na mesma passagem
+        total_proventos = total_descontos = total_liquido = 0
+        for resumo in self.resumos.iterator(chunk_size=self.CHUNK_SIZE):
             data.append([
                 resumo.funcionario.nome_completo,
                 resumo.funcionario.funcao.nome,
@@ -66,11 +84,9 @@ class FolhaPagamentoExporter:
                 f"R$ {resumo.total_descontos:,.2f}",
                 f"R$ {resumo.valor_liquido:,.2f}",
             ])
-        
-        # Totais
-        total_proventos = sum(r.total_proventos for r in self.resumos)
-        total_descontos = sum(r.total_descontos for r in self.resumos)
-        total_liquido = sum(r.valor_liquido for r in self.resumos)
+            total_proventos += resumo.total_proventos
+            total_descontos += resumo.total_descontos
+            total_liquido += resumo.valor_liquido
         
         data.append([
             'TOTAL',
@@ -129,11 +145,24 @@ class FolhaPagamentoExporter:
         
         return buffer
     
-    def export_excel(self):
-        """Exporta a folha para Excel"""
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = f"Folha {self.folha.mes:02d}-{self.folha.ano}"
+    def export_excel(self, destino=None):
+        """
+        Exporta a folha para Excel
+        
+        A planilha é escrita em modo write-only do openpyxl: cada linha vai
+        direto para o arquivo temporário da pasta de trabalho, sem manter as
+        células em memória. Os resumos são lidos uma única vez, em blocos, e os
+        totais são acumulados na mesma passagem.
+        
+        Args:
+            destino: Arquivo (ou objeto file-like) onde gravar a planilha;
+                     se omitido, a planilha é devolvida em um BytesIO
+        
+        Returns:
+            O próprio destino (ou o BytesIO criado), posicionado no início
+        """
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(title=f"Folha {self.folha.mes:02d}-{self.folha.ano}")
         
         # Estilos
         header_font = Font(bold=True, color="FFFFFF", size=11)
@@ -151,88 +180,63 @@ class FolhaPagamentoExporter:
             bottom=Side(style='thin')
         )
         
+        def celula(valor, moeda=False, **estilos):
+            cell = WriteOnlyCell(ws, value=valor)
+            cell.border = border
+            if moeda:
+                cell.number_format = 'R$ #,##0.00'
+                cell.alignment = currency_alignment
+            for atributo, estilo in estilos.items():
+                setattr(cell, atributo, estilo)
+            return cell
+        
+        # Larguras das colunas (precisam ser definidas antes das linhas)
+        ws.column_dimensions['A'].width = 35
+        ws.column_dimensions['B'].width = 25
+        ws.column_dimensions['C'].width = 15
+        ws.column_dimensions['D'].width = 15
+        ws.column_dimensions['E'].width = 15
+        
         # Título
-        ws.merge_cells('A1:E1')
-        title_cell = ws['A1']
-        title_cell.value = f"FOLHA DE PAGAMENTO - {self.folha.periodo_referencia}"
+        ws.merged_cells.add('A1:E1')
+        title_cell = WriteOnlyCell(ws, value=f"FOLHA DE PAGAMENTO - {self.folha.periodo_referencia}")
         title_cell.font = Font(bold=True, size=14, color="1e40af")
         title_cell.alignment = Alignment(horizontal="center")
+        ws.append([title_cell])
+        ws.append([])
         
         # Headers
         headers = ['Funcionário', 'Função', 'Proventos', 'Descontos', 'Líquido']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
+        ws.append([
+            celula(header, font=header_font, fill=header_fill, alignment=header_alignment)
+            for header in headers
+        ])
         
-        # Dados
-        row = 4
-        for resumo in self.resumos:
-            ws.cell(row=row, column=1, value=resumo.funcionario.nome_completo).border = border
-            ws.cell(row=row, column=2, value=resumo.funcionario.funcao.nome).border = border
-            
-            cell_prov = ws.cell(row=row, column=3, value=float(resumo.total_proventos))
-            cell_prov.number_format = 'R$ #,##0.00'
-            cell_prov.alignment = currency_alignment
-            cell_prov.border = border
-            
-            cell_desc = ws.cell(row=row, column=4, value=float(resumo.total_descontos))
-            cell_desc.number_format = 'R$ #,##0.00'
-            cell_desc.alignment = currency_alignment
-            cell_desc.border = border
-            
-            cell_liq = ws.cell(row=row, column=5, value=float(resumo.valor_liquido))
-            cell_liq.number_format = 'R$ #,##0.00'
-            cell_liq.alignment = currency_alignment
-            cell_liq.border = border
-            
-            row += 1
+        # Dados (totais acumulados na mesma passagem)
+        total_proventos = total_descontos = total_liquido = 0
+        for resumo in self.resumos.iterator(chunk_size=self.CHUNK_SIZE):
+            ws.append([
+                celula(resumo.funcionario.nome_completo),
+                celula(resumo.funcionario.funcao.nome),
+                celula(float(resumo.total_proventos), moeda=True),
+                celula(float(resumo.total_descontos), moeda=True),
+                celula(float(resumo.valor_liquido), moeda=True),
+            ])
+            total_proventos += resumo.total_proventos
+            total_descontos += resumo.total_descontos
+            total_liquido += resumo.valor_liquido
         
         # Totais
-        total_row = row
-        ws.cell(row=total_row, column=1, value="TOTAL").font = total_font
-        ws.cell(row=total_row, column=1).fill = total_fill
-        ws.cell(row=total_row, column=1).border = border
-        ws.cell(row=total_row, column=2).fill = total_fill
-        ws.cell(row=total_row, column=2).border = border
-        
-        total_proventos = sum(r.total_proventos for r in self.resumos)
-        total_descontos = sum(r.total_descontos for r in self.resumos)
-        total_liquido = sum(r.valor_liquido for r in self.resumos)
-        
-        cell_total_prov = ws.cell(row=total_row, column=3, value=float(total_proventos))
-        cell_total_prov.font = total_font
-        cell_total_prov.fill = total_fill
-        cell_total_prov.number_format = 'R$ #,##0.00'
-        cell_total_prov.alignment = currency_alignment
-        cell_total_prov.border = border
-        
-        cell_total_desc = ws.cell(row=total_row, column=4, value=float(total_descontos))
-        cell_total_desc.font = total_font
-        cell_total_desc.fill = total_fill
-        cell_total_desc.number_format = 'R$ #,##0.00'
-        cell_total_desc.alignment = currency_alignment
-        cell_total_desc.border = border
-        
-        cell_total_liq = ws.cell(row=total_row, column=5, value=float(total_liquido))
-        cell_total_liq.font = total_font
-        cell_total_liq.fill = total_fill
-        cell_total_liq.number_format = 'R$ #,##0.00'
-        cell_total_liq.alignment = currency_alignment
-        cell_total_liq.border = border
-        
-        # Ajusta largura das colunas
-        ws.column_dimensions['A'].width = 35
-        ws.column_dimensions['B'].width = 25
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 15
+        ws.append([
+            celula("TOTAL", font=total_font, fill=total_fill),
+            celula(None, fill=total_fill),
+            celula(float(total_proventos), moeda=True, font=total_font, fill=total_fill),
+            celula(float(total_descontos), moeda=True, font=total_font, fill=total_fill),
+            celula(float(total_liquido), moeda=True, font=total_font, fill=total_fill),
+        ])
         
-        # Salva em buffer
-        buffer = BytesIO()
+        # Salva no destino
+        buffer = destino if destino is not None else BytesIO()
         wb.save(buffer)
         buffer.seek(0)
         
@@ -252,46 +256,32 @@ def export_folha_pdf(folha):
 
 
 def export_folha_excel(folha):
-    """Helper function para exportar folha em Excel"""
+    """Helper function para exportar folha em Excel (enviada em blocos a partir de arquivo temporário)"""
     exporter = FolhaPagamentoExporter(folha)
-    buffer = exporter.export_excel()
+    arquivo = exporter.export_excel(tempfile.TemporaryFile())
     
-    response = HttpResponse(
-        buffer.getvalue(),
+    filename = f'folha_pagamento_{folha.ano}_{folha.mes:02d}.xlsx'
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=filename,
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
-    filename = f'folha_pagamento_{folha.ano}_{folha.mes:02d}.xlsx'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
 
 
-class HoleriteExporter:
-    """Classe para exportação de holerite individual"""
+@lru_cache(maxsize=None)
+def _estilos_holerite():
+    """
+    Estilos do holerite
     
-    def __init__(self, folha, funcionario):
-        self.folha = folha
-        self.funcionario = funcionario
-        self.resumo = folha.resumos.filter(funcionario=funcionario).first()
-        self.itens = folha.itens.filter(funcionario=funcionario).select_related('provento_desconto')
+    Construídos uma única vez por processo e reaproveitados por todos os
+    holerites gerados nele.
+    """
+    styles = getSampleStyleSheet()
     
-    def export_pdf(self):
-        """Exporta o holerite para PDF"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
-        )
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        
+    return {
         # Estilo customizado para título
-        title_style = ParagraphStyle(
+        'title': ParagraphStyle(
             'CustomTitle',
             parent=styles['Heading1'],
             fontSize=18,
@@ -299,44 +289,162 @@ class HoleriteExporter:
             spaceAfter=10,
             alignment=TA_CENTER,
             fontName='Helvetica-Bold'
-        )
-        
+        ),
         # Estilo para subtítulo
-        subtitle_style = ParagraphStyle(
+        'subtitle': ParagraphStyle(
             'Subtitle',
             parent=styles['Normal'],
             fontSize=12,
             textColor=colors.HexColor('#4b5563'),
             spaceAfter=20,
             alignment=TA_CENTER
-        )
-        
+        ),
         # Estilo para labels
-        label_style = ParagraphStyle(
+        'label': ParagraphStyle(
             'Label',
             parent=styles['Normal'],
             fontSize=9,
             textColor=colors.grey,
             spaceAfter=2
-        )
-        
+        ),
         # Estilo para valores
-        value_style = ParagraphStyle(
+        'value': ParagraphStyle(
             'Value',
             parent=styles['Normal'],
             fontSize=10,
             textColor=colors.black,
             spaceAfter=10,
             fontName='Helvetica-Bold'
-        )
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=TA_CENTER
+        ),
+        'aviso': ParagraphStyle(
+            'Aviso',
+            parent=styles['Normal'],
+            fontSize=7,
+            textColor=colors.grey,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Oblique'
+        ),
+        'header_table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('TOPPADDING', (0, 0), (-1, 0), 8),
+        ]),
+        'info_table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9fafb')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]),
+        'proventos_table': _estilo_tabela_itens('#10b981', '#ecfdf5'),
+        'descontos_table': _estilo_tabela_itens('#ef4444', '#fee2e2'),
+        'total_table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 1), colors.HexColor('#e0e7ff')),
+            ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#1e40af')),
+            ('TEXTCOLOR', (0, 2), (-1, 2), colors.whitesmoke),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica'),
+            ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 1), 10),
+            ('FONTSIZE', (0, 2), (-1, 2), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('LEFTPADDING', (0, 0), (-1, -1), 8),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ]),
+    }
+
+
+def _estilo_tabela_itens(cor_cabecalho, cor_linhas):
+    """Estilo das tabelas de proventos e descontos"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(cor_cabecalho)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('TOPPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor(cor_linhas)),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 1), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
+    ])
+
+
+def _documento_holerite(buffer):
+    """Documento A4 usado pelos holerites"""
+    return SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+
+
+def nome_arquivo_holerite(folha, funcionario):
+    """Nome de arquivo sanitizado do holerite de um funcionário"""
+    nome_limpo = ''.join(c for c in funcionario.nome_completo if c.isalnum() or c in (' ', '-', '_')).strip()
+    nome_limpo = nome_limpo.replace(' ', '_')
+    
+    return f'holerite_{nome_limpo}_{folha.ano}_{folha.mes:02d}.pdf'
+
+
+class HoleriteExporter:
+    """Classe para exportação de holerite individual"""
+    
+    def __init__(self, folha, funcionario, resumo=None, itens=None):
+        """
+        Args:
+            folha: Folha de pagamento
+            funcionario: Funcionário do holerite
+            resumo: Resumo já carregado (evita a consulta)
+            itens: Itens do funcionário já carregados, com provento_desconto
+                   (evita a consulta)
+        """
+        self.folha = folha
+        self.funcionario = funcionario
+        if itens is None:
+            self.resumo = folha.resumos.filter(funcionario=funcionario).first()
+            itens = folha.itens.filter(funcionario=funcionario).select_related('provento_desconto')
+        else:
+            self.resumo = resumo
+        self.itens = sorted(itens, key=lambda item: item.provento_desconto.nome)
+    
+    def elementos(self):
+        """Monta os elementos (flowables) do holerite"""
+        estilos = _estilos_holerite()
+        label_style = estilos['label']
+        value_style = estilos['value']
+        elements = []
         
         # Cabeçalho
-        title = Paragraph("CONTRACHEQUE / HOLERITE", title_style)
+        title = Paragraph("CONTRACHEQUE / HOLERITE", estilos['title'])
         elements.append(title)
         
         subtitle = Paragraph(
             f"Competência: {self.folha.periodo_referencia}",
-            subtitle_style
+            estilos['subtitle']
         )
         elements.append(subtitle)
         elements.append(Spacer(1, 0.5*cm))
@@ -356,96 +464,42 @@ class HoleriteExporter:
         
         # Tabela de cabeçalho
         header_table = Table(dados_funcionario, colWidths=[17*cm])
-        header_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-        ]))
+        header_table.setStyle(estilos['header_table'])
         elements.append(header_table)
         
         # Tabela de informações
         info_table = Table(info_table_data, colWidths=[3*cm, 14*cm])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9fafb')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        info_table.setStyle(estilos['info_table'])
         elements.append(info_table)
         elements.append(Spacer(1, 0.5*cm))
         
         # Proventos
-        proventos_data = [
-            ['PROVENTOS', 'VALOR']
-        ]
-        
-        proventos = self.itens.filter(provento_desconto__tipo='P').order_by('provento_desconto__nome')
-        for item in proventos:
-            proventos_data.append([
-                item.provento_desconto.nome,
-                f"R$ {item.valor_lancado:,.2f}"
-            ])
-        
-        if len(proventos_data) > 1:
+        proventos = [item for item in self.itens if item.provento_desconto.tipo == 'P']
+        if proventos:
+            proventos_data = [['PROVENTOS', 'VALOR']]
+            for item in proventos:
+                proventos_data.append([
+                    item.provento_desconto.nome,
+                    f"R$ {item.valor_lancado:,.2f}"
+                ])
+            
             proventos_table = Table(proventos_data, colWidths=[12*cm, 5*cm])
-            proventos_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('TOPPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#ecfdf5')),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 1), (-1, -1), 4),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
-            ]))
+            proventos_table.setStyle(estilos['proventos_table'])
             elements.append(proventos_table)
             elements.append(Spacer(1, 0.3*cm))
         
         # Descontos
-        descontos_data = [
-            ['DESCONTOS', 'VALOR']
-        ]
-        
-        descontos = self.itens.filter(provento_desconto__tipo='D').order_by('provento_desconto__nome')
-        for item in descontos:
-            descontos_data.append([
-                item.provento_desconto.nome,
-                f"R$ {item.valor_lancado:,.2f}"
-            ])
-        
-        if len(descontos_data) > 1:
+        descontos = [item for item in self.itens if item.provento_desconto.tipo == 'D']
+        if descontos:
+            descontos_data = [['DESCONTOS', 'VALOR']]
+            for item in descontos:
+                descontos_data.append([
+                    item.provento_desconto.nome,
+                    f"R$ {item.valor_lancado:,.2f}"
+                ])
+            
             descontos_table = Table(descontos_data, colWidths=[12*cm, 5*cm])
-            descontos_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#ef4444')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('TOPPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fee2e2')),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('LEFTPADDING', (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 1), (-1, -1), 4),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
-            ]))
+            descontos_table.setStyle(estilos['descontos_table'])
             elements.append(descontos_table)
             elements.append(Spacer(1, 0.5*cm))
         
@@ -468,59 +522,154 @@ class HoleriteExporter:
             ]
         
         total_table = Table(total_data, colWidths=[12*cm, 5*cm])
-        total_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 1), colors.HexColor('#e0e7ff')),
-            ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#1e40af')),
-            ('TEXTCOLOR', (0, 2), (-1, 2), colors.whitesmoke),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica'),
-            ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 1), 10),
-            ('FONTSIZE', (0, 2), (-1, 2), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
+        total_table.setStyle(estilos['total_table'])
         elements.append(total_table)
         
         # Rodapé
         elements.append(Spacer(1, 1*cm))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=8,
-            textColor=colors.grey,
-            alignment=TA_CENTER
-        )
         footer = Paragraph(
             f"Documento gerado em {datetime.now().strftime('%d/%m/%Y às %H:%M')} - Sistema de Folha de Pagamento Sonet 4.5",
-            footer_style
+            estilos['footer']
         )
         elements.append(footer)
         
         # Aviso legal
         elements.append(Spacer(1, 0.3*cm))
-        aviso_style = ParagraphStyle(
-            'Aviso',
-            parent=styles['Normal'],
-            fontSize=7,
-            textColor=colors.grey,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Oblique'
-        )
         aviso = Paragraph(
             "Este documento é apenas informativo e não substitui o contracheque oficial.",
-            aviso_style
+            estilos['aviso']
         )
         elements.append(aviso)
         
-        # Build PDF
-        doc.build(elements)
+        return elements
+    
+    def export_pdf(self):
+        """Exporta o holerite para PDF"""
+        buffer = BytesIO()
+        _documento_holerite(buffer).build(self.elementos())
+        buffer.seek(0)
+        
+        return buffer
+
+
+def _renderizar_holerite(dados):
+    """Renderiza um holerite (executado nos processos do pool)"""
+    folha, funcionario, resumo, itens = dados
+    exporter = HoleriteExporter(folha, funcionario, resumo=resumo, itens=itens)
+    return nome_arquivo_holerite(folha, funcionario), exporter.export_pdf().getvalue()
+
+
+class HoleritesLoteExporter:
+    """
+    Exportação de todos os holerites de uma folha de uma só vez
+    
+    Resumos e itens da folha inteira são carregados em duas consultas e
+    agrupados por funcionário em memória. No ZIP, cada holerite é um PDF
+    renderizado em um pool de processos; no PDF único, todos os holerites
+    entram em um mesmo documento, um por página.
+    """
+    
+    def __init__(self, folha, processos=None, progresso=None):
+        """
+        Args:
+            folha: Folha de pagamento
+            processos: Processos usados na renderização do ZIP
+                       (padrão: settings.FOLHA_HOLERITE_PROCESSOS ou nº de CPUs)
+            progresso: Função chamada com (prontos, total) a cada holerite
+        """
+        self.folha = folha
+        self.processos = processos or getattr(settings, 'FOLHA_HOLERITE_PROCESSOS', 0) or os.cpu_count() or 1
+        self.progresso = progresso
+    
+    def holerites(self):
+        """Lista de (folha, funcionario, resumo, itens) ordenada pelo nome do funcionário"""
+        resumos = self.folha.resumos.select_related(
+            'funcionario__funcao', 'funcionario__setor'
+        ).order_by('funcionario__nome_completo')
+        
+        itens_por_funcionario = defaultdict(list)
+        for item in self.folha.itens.select_related('provento_desconto'):
+            itens_por_funcionario[item.funcionario_id].append(item)
+        
+        return [
+            (self.folha, resumo.funcionario, resumo, itens_por_funcionario[resumo.funcionario_id])
+            for resumo in resumos
+        ]
+    
+    def export_zip(self, destino=None):
+        """
+        Exporta um ZIP com um PDF por funcionário
+        
+        Args:
+            destino: Arquivo onde gravar o ZIP; se omitido, devolve um BytesIO
+        
+        Returns:
+            O próprio destino (ou o BytesIO criado), posicionado no início
+        """
+        holerites = self.holerites()
+        buffer = destino if destino is not None else BytesIO()
+        
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+            nomes = set()
+            renderizados = zip(holerites, self._renderizar(holerites))
+            for prontos, ((_, funcionario, _, _), (filename, conteudo)) in enumerate(renderizados, 1):
+                # Homônimos recebem o ID do funcionário no nome do arquivo
+                if filename in nomes:
+                    filename = filename.replace('.pdf', f'_{funcionario.pk}.pdf')
+                nomes.add(filename)
+                arquivo_zip.writestr(filename, conteudo)
+                self._avisar_progresso(prontos, len(holerites))
+        
+        buffer.seek(0)
+        return buffer
+    
+    def export_pdf(self, destino=None):
+        """
+        Exporta um único PDF com todos os holerites, um por página
+        
+        Args:
+            destino: Arquivo onde gravar o PDF; se omitido, devolve um BytesIO
+        
+        Returns:
+            O próprio destino (ou o BytesIO criado), posicionado no início
+        """
+        elements = []
+        holerites = self.holerites()
+        for prontos, (folha, funcionario, resumo, itens) in enumerate(holerites, 1):
+            if elements:
+                elements.append(PageBreak())
+            elements.extend(HoleriteExporter(folha, funcionario, resumo=resumo, itens=itens).elementos())
+            self._avisar_progresso(prontos, len(holerites))
+        
+        buffer = destino if destino is not None else BytesIO()
+        _documento_holerite(buffer).build(elements)
         buffer.seek(0)
         
         return buffer
+    
+    def _avisar_progresso(self, prontos, total):
+        if self.progresso is not None:
+            self.progresso(prontos, total)
+    
+    def _renderizar(self, holerites):
+        """
+        Renderiza os holerites, em paralelo quando houver mais de um processo
+        
+        Os resultados são entregues na ordem e à medida que ficam prontos.
+        """
+        if self.processos <= 1 or len(holerites) <= 1:
+            yield from map(_renderizar_holerite, holerites)
+            return
+        
+        # Os processos filhos não usam o banco; fora de uma transação, as
+        # conexões são fechadas antes do fork para que nenhum deles herde (e
+        # encerre) o socket do pai. Dentro de uma, fechar a conexão desfaria a
+        # transação de quem chamou
+        if not connection.in_atomic_block:
+            connections.close_all()
+        chunksize = max(1, len(holerites) // (self.processos * 4))
+        with ProcessPoolExecutor(max_workers=self.processos, initializer=django.setup) as pool:
+            yield from pool.map(_renderizar_holerite, holerites, chunksize=chunksize)
 
 
 def export_holerite_pdf(folha, funcionario):
@@ -529,12 +678,7 @@ def export_holerite_pdf(folha, funcionario):
     buffer = exporter.export_pdf()
     
     response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    
-    # Nome do arquivo sanitizado
-    nome_limpo = ''.join(c for c in funcionario.nome_completo if c.isalnum() or c in (' ', '-', '_')).strip()
-    nome_limpo = nome_limpo.replace(' ', '_')
-    
-    filename = f'holerite_{nome_limpo}_{folha.ano}_{folha.mes:02d}.pdf'
+    filename = nome_arquivo_holerite(folha, funcionario)
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
     return response
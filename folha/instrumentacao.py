@@ -0,0 +1,267 @@
+"""
+Instrumentação das operações do FolhaService por etapa
+
+Cada operação instrumentada (geração da folha, criação de eventos, item
+manual) produz um relatório com a duração, as consultas, as linhas gravadas
+no banco e os registros lidos ou calculados em memória de cada etapa:
+
+    with operacao('gerar_folha', mes=mes, ano=ano) as relatorio:
+        with etapa('publicacao') as medicao:
+            with etapa('gravacao_itens') as gravacao:
+                ...
+                gravacao.linhas += len(itens)
+
+Uma etapa aberta dentro de outra fica em `etapas` da etapa externa, cujas
+linhas incluem as das internas; as linhas da operação são a soma das etapas
+de primeiro nível, sem contar nada duas vezes.
+
+A operação em andamento fica em uma ContextVar, de modo que os métodos
+auxiliares abrem etapas sem receber o relatório; fora de uma operação,
+etapa() não mede nada. Ao final, o relatório (um dict serializável em JSON) é
+entregue aos hooks: os configurados em FOLHA_INSTRUMENTACAO_HOOKS (caminhos
+pontuados, ex.: um exportador de métricas) e os registrados com
+registrar_hook (ex.: ColetorRelatorios nos testes). O relatório da geração
+também fica gravado na folha (FolhaPagamento.relatorio_geracao).
+
+Quem precisa acompanhar a operação enquanto ela roda (ex.: o progresso de
+uma tarefa) usa acompanhar_etapas, chamado ao fim de cada etapa.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+_operacao_atual = ContextVar('folha_operacao_atual', default=None)
+_observador_etapas = ContextVar('folha_observador_etapas', default=None)
+_hooks = []
+
+
+class _ContadorConsultas:
+    """Execute wrapper que só conta as consultas"""
+
+    def __init__(self):
+        self.consultas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas += 1
+        return execute(sql, params, many, context)
+
+
+class Medicao:
+    """Etapa em andamento: o código medido soma as linhas que gravou e os registros que leu ou calculou"""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.linhas = 0
+        self.registros = 0
+
+
+class Relatorio:
+    """Relatório de uma operação: etapas na ordem em que foram iniciadas"""
+
+    def __init__(self, nome, contexto):
+        self.nome = nome
+        self.contexto = contexto
+        self.etapas = []
+        # Listas onde entram as etapas iniciadas agora (a da etapa aberta mais interna no topo)
+        self.abertas = [self.etapas]
+        self.inicio = timezone.now()
+        self.segundos = 0.0
+        self.consultas = 0
+        self.sucesso = None
+
+    def como_dict(self) -> dict:
+        return {
+            'operacao': self.nome,
+            'contexto': self.contexto,
+            'inicio': self.inicio.isoformat(),
+            'segundos': round(self.segundos, 4),
+            'consultas': self.consultas,
+            'linhas': sum(etapa['linhas'] for etapa in self.etapas),
+            'sucesso': self.sucesso,
+            'etapas': self.etapas,
+        }
+
+
+def registrar_hook(hook):
+    """Registra uma função que recebe o dict de cada relatório concluído"""
+    _hooks.append(hook)
+
+
+def remover_hook(hook):
+    """Remove um hook registrado com registrar_hook"""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _resumo_etapas(etapas: list) -> str:
+    return ', '.join(
+        f'{e["nome"]}={e["segundos"]:.3f}s/{e["linhas"]}l/{e["consultas"]}q'
+        + (f' [{_resumo_etapas(e["etapas"])}]' if e.get('etapas') else '')
+        for e in etapas
+    )
+
+
+def registrar_no_log(relatorio: dict):
+    """Hook que escreve um resumo do relatório no logger `folha.instrumentacao` (INFO)"""
+    etapas = _resumo_etapas(relatorio['etapas'])
+    logger.info(
+        '%s %s: %.3fs, %d consultas, %d linhas [%s]',
+        relatorio['operacao'], relatorio['contexto'], relatorio['segundos'],
+        relatorio['consultas'], relatorio['linhas'], etapas,
+    )
+
+
+def _emitir(relatorio: dict):
+    hooks = [import_string(caminho) for caminho in getattr(settings, 'FOLHA_INSTRUMENTACAO_HOOKS', [])]
+    for hook in hooks + list(_hooks):
+        try:
+            hook(relatorio)
+        except Exception:
+            # A instrumentação nunca pode derrubar a operação medida
+            logger.exception('Falha no hook de instrumentação %r', hook)
+
+
+@contextmanager
+def operacao(nome: str, **contexto):
+    """
+    Mede uma operação e entrega o relatório aos hooks ao final
+
+    Uma operação iniciada dentro de outra (ex.: adicionar_item_manual chamado
+    por um método que também é instrumentado) tem o próprio relatório e
+    aparece como uma etapa da operação externa.
+
+    Args:
+        nome: Nome da operação (ex.: gerar_folha)
+        **contexto: Dados que identificam a execução (IDs, competência)
+
+    Yields:
+        Relatorio: Relatório em construção (o contexto pode ser completado)
+    """
+    with etapa(nome) as medicao:
+        relatorio = Relatorio(nome, contexto)
+        token = _operacao_atual.set(relatorio)
+        contador = _ContadorConsultas()
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(contador):
+                yield relatorio
+            relatorio.sucesso = True
+        except BaseException:
+            relatorio.sucesso = False
+            raise
+        finally:
+            _operacao_atual.reset(token)
+            relatorio.segundos = time.perf_counter() - inicio
+            relatorio.consultas = contador.consultas
+            dados = relatorio.como_dict()
+            medicao.linhas = dados['linhas']
+            _emitir(dados)
+
+
+@contextmanager
+def etapa(nome: str):
+    """
+    Mede uma etapa da operação em andamento (sem operação, não mede nada)
+
+    Yields:
+        Medicao: Onde somar as linhas gravadas e os registros lidos ou
+        calculados pela etapa
+    """
+    medicao = Medicao(nome)
+    relatorio = _operacao_atual.get()
+    if relatorio is None:
+        yield medicao
+        return
+
+    registro = {'nome': nome, 'segundos': 0.0, 'linhas': 0, 'registros': 0, 'consultas': 0}
+    internas = []
+    relatorio.abertas[-1].append(registro)
+    relatorio.abertas.append(internas)
+    contador = _ContadorConsultas()
+    inicio = time.perf_counter()
+    try:
+        with connection.execute_wrapper(contador):
+            yield medicao
+    finally:
+        relatorio.abertas.pop()
+        registro.update({
+            'segundos': round(time.perf_counter() - inicio, 4),
+            'linhas': medicao.linhas + sum(interna['linhas'] for interna in internas),
+            'registros': medicao.registros,
+            'consultas': contador.consultas,
+        })
+        if internas:
+            registro['etapas'] = internas
+        observador = _observador_etapas.get()
+        if observador is not None:
+            observador(relatorio.nome, registro)
+
+
+@contextmanager
+def acompanhar_etapas(observador):
+    """
+    Chama observador(operacao, etapa) ao fim de cada etapa medida no bloco
+
+    O observador recebe o dict da etapa já concluída; exceções dele não são
+    capturadas.
+    """
+    token = _observador_etapas.set(observador)
+    try:
+        yield
+    finally:
+        _observador_etapas.reset(token)
+
+
+class ColetorRelatorios:
+    """
+    Hook em memória (para testes e diagnóstico)
+
+        with ColetorRelatorios() as coletor:
+            FolhaService.gerar_folha(1, 2024)
+        coletor.ultimo['etapas']
+    """
+
+    def __init__(self):
+        self.relatorios = []
+
+    def __call__(self, relatorio: dict):
+        self.relatorios.append(relatorio)
+
+    def __enter__(self):
+        registrar_hook(self)
+        return self
+
+    def __exit__(self, *exc):
+        remover_hook(self)
+
+    @property
+    def ultimo(self):
+        return self.relatorios[-1] if self.relatorios else None
+
+    def etapas(self, operacao: str = None) -> dict:
+        """
+        Etapas do último relatório (da operação, se informada) por caminho
+
+        As etapas internas aparecem como 'externa/interna'.
+        """
+        relatorios = [r for r in self.relatorios if operacao is None or r['operacao'] == operacao]
+        etapas = {}
+
+        def percorrer(lista, prefixo):
+            for etapa_ in lista:
+                caminho = prefixo + etapa_['nome']
+                etapas[caminho] = etapa_
+                percorrer(etapa_.get('etapas', []), caminho + '/')
+
+        if relatorios:
+            percorrer(relatorios[-1]['etapas'], '')
+        return etapas
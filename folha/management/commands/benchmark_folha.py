@@ -0,0 +1,111 @@
+"""
+Management command para medir a folha de pagamento com uma empresa sintética
+
+Por padrão roda em um banco de testes criado (e destruído) para a execução, de
+modo que os números não dependem dos dados cadastrados. Com --banco-atual, usa
+o banco configurado dentro de uma transação desfeita ao final.
+
+Exemplos:
+    python manage.py benchmark_folha --funcionarios 2000 --saida bench.json
+    python manage.py benchmark_folha --funcionarios 2000 --comparar bench.json
+"""
+import json
+from dataclasses import asdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from folha.benchmark import ParametrosBenchmark, comparar_resultados, executar_benchmark
+from folha.models import FolhaPagamento
+
+
+class Command(BaseCommand):
+    help = 'Mede tempo e consultas da geração, eventos, exportações e listagens com dados sintéticos'
+
+    def add_arguments(self, parser):
+        padrao = ParametrosBenchmark()
+        parser.add_argument('--funcionarios', type=int, default=padrao.funcionarios)
+        parser.add_argument('--setores', type=int, default=padrao.setores)
+        parser.add_argument('--profundidade', type=int, default=padrao.profundidade,
+                            help='Níveis da hierarquia')
+        parser.add_argument('--lancamentos-gerais', type=int, default=padrao.lancamentos_gerais)
+        parser.add_argument('--lancamentos-fixos', type=int, default=padrao.lancamentos_fixos,
+                            help='Lançamentos fixos por funcionário')
+        parser.add_argument('--adiantamentos', type=float, default=padrao.adiantamentos,
+                            help='Fração dos funcionários com adiantamento pendente (0 a 1)')
+        parser.add_argument('--mes', type=int, default=padrao.mes)
+        parser.add_argument('--ano', type=int, default=padrao.ano)
+        parser.add_argument('--semente', type=int, default=padrao.semente)
+        parser.add_argument('--processos', type=int, default=padrao.processos,
+                            help='Processos no cálculo da geração da folha (0 = nº de CPUs)')
+        parser.add_argument('--sem-exportacoes', action='store_true',
+                            help='Não mede as exportações (PDF/Excel/holerites)')
+        parser.add_argument('--banco-atual', action='store_true',
+                            help='Usa o banco configurado (transação desfeita ao final)')
+        parser.add_argument('--saida', help='Arquivo JSON onde gravar o resultado')
+        parser.add_argument('--comparar', help='JSON de referência; regressões encerram com erro')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo de tempo aceito na comparação (padrão: 0.25)')
+
+    def handle(self, *args, **options):
+        if options['funcionarios'] < 1 or options['profundidade'] < 1:
+            raise CommandError('Informe ao menos 1 funcionário e 1 nível de hierarquia')
+        if not 0 <= options['adiantamentos'] <= 1:
+            raise CommandError('--adiantamentos deve estar entre 0 e 1')
+
+        parametros = ParametrosBenchmark(
+            funcionarios=options['funcionarios'],
+            setores=options['setores'],
+            profundidade=options['profundidade'],
+            lancamentos_gerais=options['lancamentos_gerais'],
+            lancamentos_fixos=options['lancamentos_fixos'],
+            adiantamentos=options['adiantamentos'],
+            mes=options['mes'],
+            ano=options['ano'],
+            semente=options['semente'],
+            exportacoes=not options['sem_exportacoes'],
+            processos=options['processos'],
+        )
+
+        referencia = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                referencia = json.load(arquivo)
+            # As etapas de exportação só são comparadas se existirem nas duas execuções
+            ignorados = {'exportacoes'}
+            if ({k: v for k, v in referencia['parametros'].items() if k not in ignorados}
+                    != {k: v for k, v in asdict(parametros).items() if k not in ignorados}):
+                raise CommandError('A referência foi medida com outros parâmetros')
+
+        if options['banco_atual']:
+            if FolhaPagamento.objects.filter(mes=parametros.mes, ano=parametros.ano).exists():
+                raise CommandError(f'Já existe folha em {parametros.mes:02d}/{parametros.ano}; use --mes/--ano')
+            resultado = executar_benchmark(parametros)
+        else:
+            nome_original = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                resultado = executar_benchmark(parametros)
+            finally:
+                connection.creation.destroy_test_db(nome_original, verbosity=0)
+
+        self.stdout.write(f'{"Etapa":<26} {"Segundos":>10} {"Consultas":>10}')
+        for etapa in resultado['etapas']:
+            self.stdout.write(f'{etapa["etapa"]:<26} {etapa["segundos"]:>10.4f} {etapa["consultas"]:>10}')
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(resultado, arquivo, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'✓ Resultado gravado em {options["saida"]}'))
+
+        if referencia is not None:
+            regressoes = comparar_resultados(resultado, referencia, options['tolerancia'])
+            for regressao in regressoes:
+                self.stdout.write(self.style.WARNING(
+                    f'  ✗ {regressao["etapa"]}: {regressao["medida"]} '
+                    f'{regressao["referencia"]} → {regressao["atual"]}'
+                ))
+            if regressoes:
+                raise CommandError(f'{len(regressoes)} regressão(ões) em relação a {options["comparar"]}')
+            self.stdout.write(self.style.SUCCESS('✓ Sem regressões em relação à referência'))
@@ -0,0 +1,87 @@
+"""
+Management command para calcular uma competência sem gravar nada
+
+Mostra os totais (e, com --detalhar, as linhas) que gerar_folha produziria.
+Se a folha da competência já existe, mostra as diferenças entre ela e o
+cálculo atual. Com --json, a saída é o resultado completo em JSON.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from folha.models import FolhaPagamento
+from folha.services import FolhaService
+
+
+class Command(BaseCommand):
+    help = 'Calcula a folha de uma competência em memória e compara com a folha gravada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('mes', type=int, help='Mês da competência (1-12)')
+        parser.add_argument('ano', type=int, help='Ano da competência')
+        parser.add_argument(
+            '--detalhar',
+            action='store_true',
+            help='Lista as linhas calculadas (competência ainda sem folha)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Imprime o resultado completo em JSON',
+        )
+
+    def handle(self, *args, **options):
+        mes, ano = options['mes'], options['ano']
+        if not 1 <= mes <= 12:
+            raise CommandError('Mês deve estar entre 1 e 12')
+
+        folha = FolhaPagamento.objects.filter(mes=mes, ano=ano).first()
+        if folha:
+            resultado = FolhaService.comparar_competencia(folha)
+        else:
+            resultado = FolhaService.calcular_competencia(mes, ano)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+            return
+
+        totais = resultado['totais']['previsto'] if folha else resultado['totais']
+        self.stdout.write(
+            f'Competência {mes:02d}/{ano}: {totais["funcionarios"]} funcionário(s), '
+            f'{totais["itens"]} item(ns), proventos {totais["total_proventos"]}, '
+            f'descontos {totais["total_descontos"]}, líquido {totais["total_liquido"]}'
+        )
+
+        if options['detalhar'] and not folha:
+            for linha in resultado['linhas']:
+                self.stdout.write(
+                    f'  {linha["funcionario_nome"]} | {linha["codigo"]} ({linha["tipo"]}) | '
+                    f'{linha["valor_lancado"]} | {linha["justificativa"]}'
+                )
+
+        if not folha:
+            return
+
+        if resultado['confere']:
+            self.stdout.write(self.style.SUCCESS(f'✓ A folha {folha.periodo_referencia} confere com o cálculo'))
+            return
+
+        for linha in resultado['somente_na_previa']:
+            self.stdout.write(self.style.WARNING(
+                f'  + {linha["funcionario_nome"]} | {linha["codigo"]} | {linha["valor_lancado"]} (não está na folha)'
+            ))
+        for linha in resultado['somente_na_folha']:
+            self.stdout.write(self.style.WARNING(
+                f'  - {linha["funcionario_nome"]} | {linha["codigo"]} | {linha["valor_lancado"]} (não está no cálculo)'
+            ))
+        for linha in resultado['divergentes']:
+            self.stdout.write(self.style.WARNING(
+                f'  ≠ {linha["funcionario_nome"]} | {linha["codigo"]} | '
+                f'calculado {linha["valor_lancado"]}, gravado {linha["valor_gravado"]}'
+            ))
+        diferencas = (
+            len(resultado['somente_na_previa']) + len(resultado['somente_na_folha'])
+            + len(resultado['divergentes'])
+        )
+        self.stdout.write(self.style.WARNING(f'⚠ {diferencas} diferença(s) na folha {folha.periodo_referencia}'))
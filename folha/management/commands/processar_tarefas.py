@@ -0,0 +1,52 @@
+"""
+Management command que consome a fila de tarefas da folha de pagamento
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from folha.tarefas import TarefaService
+
+
+class Command(BaseCommand):
+    help = 'Processa as tarefas pendentes (geração de folha, eventos e exportações)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Processa as tarefas pendentes e encerra, em vez de aguardar novas tarefas',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre verificações da fila (padrão: 2)',
+        )
+
+    def handle(self, *args, **options):
+        uma_vez = options['uma_vez']
+        intervalo = options['intervalo']
+
+        self.stdout.write('Aguardando tarefas...' if not uma_vez else 'Processando tarefas pendentes...')
+
+        while True:
+            close_old_connections()
+            tarefa = TarefaService.reservar_proxima()
+
+            if tarefa is None:
+                if uma_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+
+            self.stdout.write(f'  → {tarefa}')
+            TarefaService.executar(tarefa)
+
+            if tarefa.status == 'C':
+                self.stdout.write(self.style.SUCCESS(f'  ✓ {tarefa}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'  ✗ {tarefa}: {tarefa.erro}'))
+
+        self.stdout.write(self.style.SUCCESS('Fila vazia.'))
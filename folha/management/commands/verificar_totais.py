@@ -0,0 +1,113 @@
+"""
+Management command para verificar (e opcionalmente reconstruir) os totais
+armazenados em FolhaPagamento e EventoPagamento
+
+Nos eventos, o valor_total (líquido) também é conferido, exceto nos de
+adiantamento (AD), cujo valor_total é a soma dos adiantamentos lançados e não
+dos itens. Com --corrigir, os resumos por funcionário das folhas verificadas
+também são reconstruídos.
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from folha.models import FolhaPagamento, EventoPagamento, ItemFolha
+from folha.services import FolhaService
+
+
+class Command(BaseCommand):
+    help = 'Compara os totais armazenados das folhas e eventos com a soma dos itens'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--folha',
+            type=int,
+            help='ID da folha a verificar (padrão: todas)',
+        )
+        parser.add_argument(
+            '--corrigir',
+            action='store_true',
+            help='Reconstrói os totais divergentes a partir dos itens',
+        )
+
+    def handle(self, *args, **options):
+        corrigir = options['corrigir']
+
+        folhas = FolhaPagamento.objects.all()
+        eventos = EventoPagamento.objects.select_related('folha_pagamento')
+        itens = ItemFolha.objects.all()
+        if options['folha']:
+            folhas = folhas.filter(pk=options['folha'])
+            eventos = eventos.filter(folha_pagamento_id=options['folha'])
+            itens = itens.filter(folha_pagamento_id=options['folha'])
+
+        somas = {
+            'proventos': Sum('valor_lancado', filter=Q(provento_desconto__tipo='P')),
+            'descontos': Sum('valor_lancado', filter=Q(provento_desconto__tipo='D')),
+        }
+        zero = (Decimal('0.00'), Decimal('0.00'))
+
+        # Uma consulta agrupada por folha e outra por evento
+        por_folha = {
+            linha['folha_pagamento']: (linha['proventos'] or zero[0], linha['descontos'] or zero[1])
+            for linha in itens.values('folha_pagamento').annotate(**somas)
+        }
+        por_evento = {
+            linha['evento_pagamento']: (linha['proventos'] or zero[0], linha['descontos'] or zero[1])
+            for linha in itens.values('evento_pagamento').annotate(**somas)
+        }
+
+        divergentes = 0
+
+        with transaction.atomic():
+            for folha in folhas:
+                proventos, descontos = por_folha.get(folha.pk, zero)
+                armazenado = (folha.total_proventos, folha.total_descontos, folha.total_liquido)
+                esperado = (proventos, descontos, proventos - descontos)
+                if armazenado == esperado:
+                    continue
+
+                divergentes += 1
+                self.stdout.write(self.style.WARNING(
+                    f'  ✗ Folha {folha.periodo_referencia}: armazenado {armazenado} ≠ itens {esperado}'
+                ))
+                if corrigir:
+                    FolhaPagamento.objects.filter(pk=folha.pk).update(
+                        total_proventos=proventos,
+                        total_descontos=descontos,
+                        total_liquido=proventos - descontos,
+                    )
+
+            for evento in eventos:
+                proventos, descontos = por_evento.get(evento.pk, zero)
+                valor_total = evento.valor_total if evento.tipo_evento == 'AD' else proventos - descontos
+                armazenado = (evento.total_proventos, evento.total_descontos, evento.valor_total)
+                esperado = (proventos, descontos, valor_total)
+                if armazenado == esperado:
+                    continue
+
+                divergentes += 1
+                self.stdout.write(self.style.WARNING(
+                    f'  ✗ Evento {evento}: armazenado {armazenado} ≠ itens {esperado}'
+                ))
+                if corrigir:
+                    EventoPagamento.objects.filter(pk=evento.pk).update(
+                        total_proventos=proventos,
+                        total_descontos=descontos,
+                        valor_total=valor_total,
+                    )
+
+            if corrigir:
+                for folha in folhas:
+                    FolhaService.recalcular_resumos(folha)
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS('✓ Todos os totais estão consistentes'))
+        elif corrigir:
+            self.stdout.write(self.style.SUCCESS(f'✓ {divergentes} total(is) reconstruído(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'⚠ {divergentes} total(is) divergente(s). Use --corrigir para reconstruir.'
+            ))
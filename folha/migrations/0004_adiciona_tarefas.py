@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('folha', '0003_adiciona_rastreabilidade_adiantamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaFolha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('tipo', models.CharField(choices=[('GF', 'Geração de Folha'), ('AD', 'Evento de Adiantamento'), ('13', 'Evento de 13º Salário'), ('XP', 'Exportação PDF'), ('XE', 'Exportação Excel')], max_length=2, verbose_name='Tipo')),
+                ('status', models.CharField(choices=[('P', 'Pendente'), ('E', 'Em Execução'), ('C', 'Concluída'), ('F', 'Falhou')], default='P', max_length=1, verbose_name='Status')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('progresso', models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)')),
+                ('mensagem', models.CharField(blank=True, max_length=200, verbose_name='Mensagem')),
+                ('resultado', models.JSONField(blank=True, default=dict, verbose_name='Resultado')),
+                ('arquivo', models.FileField(blank=True, upload_to='tarefas/', verbose_name='Arquivo')),
+                ('erro', models.TextField(blank=True, verbose_name='Erro')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('folha_pagamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas', to='folha.folhapagamento', verbose_name='Folha de Pagamento')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas_folha', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Processamento',
+                'verbose_name_plural': 'Tarefas de Processamento',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='folha_taref_status_377bed_idx')],
+            },
+        ),
+    ]
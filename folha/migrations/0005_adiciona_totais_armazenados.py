@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:28
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def preencher_totais(apps, schema_editor):
+    """Calcula os totais armazenados das folhas e eventos já existentes"""
+    FolhaPagamento = apps.get_model('folha', 'FolhaPagamento')
+    EventoPagamento = apps.get_model('folha', 'EventoPagamento')
+    ItemFolha = apps.get_model('folha', 'ItemFolha')
+    
+    somas = {
+        'proventos': Sum('valor_lancado', filter=Q(provento_desconto__tipo='P')),
+        'descontos': Sum('valor_lancado', filter=Q(provento_desconto__tipo='D')),
+    }
+    
+    for linha in ItemFolha.objects.values('folha_pagamento').annotate(**somas):
+        proventos = linha['proventos'] or Decimal('0.00')
+        descontos = linha['descontos'] or Decimal('0.00')
+        FolhaPagamento.objects.filter(pk=linha['folha_pagamento']).update(
+            total_proventos=proventos,
+            total_descontos=descontos,
+            total_liquido=proventos - descontos,
+        )
+    
+    for linha in ItemFolha.objects.values('evento_pagamento').annotate(**somas):
+        EventoPagamento.objects.filter(pk=linha['evento_pagamento']).update(
+            total_proventos=linha['proventos'] or Decimal('0.00'),
+            total_descontos=linha['descontos'] or Decimal('0.00'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folha', '0004_adiciona_tarefas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventopagamento',
+            name='total_descontos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total de Descontos'),
+        ),
+        migrations.AddField(
+            model_name='eventopagamento',
+            name='total_proventos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total de Proventos'),
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='total_descontos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total de Descontos'),
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='total_liquido',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total Líquido'),
+        ),
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='total_proventos',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total de Proventos'),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
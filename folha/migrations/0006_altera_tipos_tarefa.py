@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folha', '0005_adiciona_totais_armazenados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefafolha',
+            name='tipo',
+            field=models.CharField(choices=[('GF', 'Geração de Folha'), ('AD', 'Evento de Adiantamento'), ('13', 'Evento de 13º Salário'), ('XP', 'Exportação PDF'), ('XE', 'Exportação Excel'), ('XH', 'Exportação de Holerites')], max_length=2, verbose_name='Tipo'),
+        ),
+    ]
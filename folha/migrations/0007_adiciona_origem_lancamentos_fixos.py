@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def vincular_itens_existentes(apps, schema_editor):
+    """
+    Registra a origem dos itens já gerados nas folhas em rascunho
+
+    O item é do lançamento com a mesma rubrica, a mesma justificativa (e, no
+    lançamento do funcionário, o mesmo funcionário). Lançamentos que não se
+    distinguem por esses campos ficam sem vínculo; a sincronização não
+    altera eventos com esses itens.
+    """
+    ItemFolha = apps.get_model('folha', 'ItemFolha')
+    LancamentoFixo = apps.get_model('funcionarios', 'LancamentoFixo')
+    LancamentoFixoGeral = apps.get_model('core', 'LancamentoFixoGeral')
+
+    sem_origem = ItemFolha.objects.filter(
+        folha_pagamento__status='R',
+        lancamento_fixo_origem__isnull=True,
+        lancamento_geral_origem__isnull=True,
+    )
+
+    chaves = {}
+    for lancamento in LancamentoFixoGeral.objects.all():
+        chave = (lancamento.provento_desconto_id, f'Lançamento fixo geral - {lancamento.observacoes}')
+        chaves.setdefault(chave, []).append(lancamento)
+    for (provento_id, justificativa), lancamentos in chaves.items():
+        if len(lancamentos) == 1:
+            sem_origem.filter(provento_desconto_id=provento_id, justificativa=justificativa).update(
+                lancamento_geral_origem=lancamentos[0]
+            )
+
+    chaves = {}
+    for lancamento in LancamentoFixo.objects.all():
+        chave = (
+            lancamento.funcionario_id, lancamento.provento_desconto_id,
+            f'Lançamento fixo - {lancamento.observacoes}',
+        )
+        chaves.setdefault(chave, []).append(lancamento)
+    for (funcionario_id, provento_id, justificativa), lancamentos in chaves.items():
+        if len(lancamentos) == 1:
+            sem_origem.filter(
+                funcionario_id=funcionario_id, provento_desconto_id=provento_id, justificativa=justificativa
+            ).update(lancamento_fixo_origem=lancamentos[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_adiciona_indices_vigencia'),
+        ('funcionarios', '0008_adiciona_colunas_busca'),
+        ('folha', '0006_altera_tipos_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itemfolha',
+            name='lancamento_fixo_origem',
+            field=models.ForeignKey(blank=True, help_text='Lançamento fixo do funcionário que gerou o item (quando aplicável)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='itens_folha', to='funcionarios.lancamentofixo', verbose_name='Lançamento Fixo Origem'),
+        ),
+        migrations.AddField(
+            model_name='itemfolha',
+            name='lancamento_geral_origem',
+            field=models.ForeignKey(blank=True, help_text='Lançamento fixo geral que gerou o item (quando aplicável)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='itens_folha', to='core.lancamentofixogeral', verbose_name='Lançamento Fixo Geral Origem'),
+        ),
+        migrations.RunPython(vincular_itens_existentes, migrations.RunPython.noop),
+    ]
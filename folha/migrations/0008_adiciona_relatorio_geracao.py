@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folha', '0007_adiciona_origem_lancamentos_fixos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folhapagamento',
+            name='relatorio_geracao',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Relatório da Geração'),
+        ),
+    ]
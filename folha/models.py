@@ -1,18 +1,36 @@
 """
 Modelos relacionados à Folha de Pagamento
 """
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, Q
 from decimal import Decimal
 
-from core.models import TimeStampedModel, ProventoDesconto
+from core.models import TimeStampedModel, ValidacaoAoSalvarMixin, ProventoDesconto, LancamentoFixoGeral
 from funcionarios.models import Funcionario, Contrato, LancamentoFixo, Adiantamento
 
 
-class FolhaPagamento(TimeStampedModel):
+def totalizar_itens(itens) -> dict:
+    """
+    Soma proventos e descontos de um QuerySet de ItemFolha em uma única consulta
+    
+    Returns:
+        dict: {'total_proventos': Decimal, 'total_descontos': Decimal}
+    """
+    totais = itens.aggregate(
+        total_proventos=Sum('valor_lancado', filter=Q(provento_desconto__tipo='P')),
+        total_descontos=Sum('valor_lancado', filter=Q(provento_desconto__tipo='D')),
+    )
+    return {
+        chave: valor or Decimal('0.00')
+        for chave, valor in totais.items()
+    }
+
+
+class FolhaPagamento(ValidacaoAoSalvarMixin, TimeStampedModel):
     """Folha de pagamento mensal (Competência)"""
     
     STATUS_CHOICES = [
@@ -33,6 +51,38 @@ class FolhaPagamento(TimeStampedModel):
         blank=True
     )
     observacoes = models.TextField('Observações', blank=True)
+    
+    # Totais desnormalizados, mantidos pelo FolhaService a cada item lançado/removido
+    total_proventos = models.DecimalField(
+        'Total de Proventos',
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    total_descontos = models.DecimalField(
+        'Total de Descontos',
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    total_liquido = models.DecimalField(
+        'Total Líquido',
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    
+    # Etapas da geração (duração, linhas gravadas e consultas), gravadas por
+    # FolhaService.gerar_folha; ver folha.instrumentacao
+    relatorio_geracao = models.JSONField(
+        'Relatório da Geração',
+        default=dict,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Folha de Pagamento'
@@ -57,35 +107,18 @@ class FolhaPagamento(TimeStampedModel):
         if folhas_existentes.exists():
             raise ValidationError('Já existe uma folha de pagamento para este período')
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
     @property
     def periodo_referencia(self):
         """Retorna o período de referência formatado"""
         return f"{self.mes:02d}/{self.ano}"
 
-    @property
-    def total_proventos(self):
-        """Calcula o total de proventos da folha"""
-        total = self.itens.filter(
-            provento_desconto__tipo='P'
-        ).aggregate(total=Sum('valor_lancado'))['total'] or Decimal('0.00')
-        return total
-
-    @property
-    def total_descontos(self):
-        """Calcula o total de descontos da folha"""
-        total = self.itens.filter(
-            provento_desconto__tipo='D'
-        ).aggregate(total=Sum('valor_lancado'))['total'] or Decimal('0.00')
-        return total
-
-    @property
-    def total_liquido(self):
-        """Calcula o total líquido da folha"""
-        return self.total_proventos - self.total_descontos
+    def recalcular_totais(self):
+        """Recalcula os totais armazenados a partir dos itens (uma única consulta)"""
+        totais = totalizar_itens(self.itens.all())
+        self.total_proventos = totais['total_proventos']
+        self.total_descontos = totais['total_descontos']
+        self.total_liquido = self.total_proventos - self.total_descontos
+        self.save(update_fields=['total_proventos', 'total_descontos', 'total_liquido'])
 
     def fechar_folha(self):
         """Fecha a folha de pagamento"""
@@ -94,7 +127,7 @@ class FolhaPagamento(TimeStampedModel):
         
         self.status = 'F'
         self.data_fechamento = timezone.now()
-        self.save()
+        self.save(update_fields=['status', 'data_fechamento', 'updated_at'])
 
     def reabrir_folha(self):
         """Reabre a folha de pagamento para edição"""
@@ -103,7 +136,7 @@ class FolhaPagamento(TimeStampedModel):
         
         self.status = 'R'
         self.data_fechamento = None
-        self.save()
+        self.save(update_fields=['status', 'data_fechamento', 'updated_at'])
 
     def marcar_como_paga(self):
         """Marca a folha como paga"""
@@ -111,7 +144,7 @@ class FolhaPagamento(TimeStampedModel):
             raise ValidationError('Apenas folhas fechadas podem ser marcadas como pagas')
         
         self.status = 'P'
-        self.save()
+        self.save(update_fields=['status', 'updated_at'])
 
     def get_eventos_pagamento(self):
         """Retorna todos os eventos de pagamento desta folha"""
@@ -130,7 +163,7 @@ class FolhaPagamento(TimeStampedModel):
         )['total'] or Decimal('0.00')
 
 
-class EventoPagamento(TimeStampedModel):
+class EventoPagamento(ValidacaoAoSalvarMixin, TimeStampedModel):
     """Eventos de pagamento dentro de uma competência (ex: adiantamento quinzenal, pagamento final)"""
     
     TIPO_EVENTO_CHOICES = [
@@ -189,6 +222,20 @@ class EventoPagamento(TimeStampedModel):
         default=Decimal('0.00'),
         help_text='Calculado automaticamente a partir dos itens'
     )
+    total_proventos = models.DecimalField(
+        'Total de Proventos',
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    total_descontos = models.DecimalField(
+        'Total de Descontos',
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
     observacoes = models.TextField('Observações', blank=True)
 
     class Meta:
@@ -210,35 +257,24 @@ class EventoPagamento(TimeStampedModel):
                     'A data do evento deve estar dentro da competência da folha de pagamento'
                 )
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
-    @property
-    def total_proventos(self):
-        """Calcula o total de proventos do evento"""
-        total = self.itens.filter(
-            provento_desconto__tipo='P'
-        ).aggregate(total=Sum('valor_lancado'))['total'] or Decimal('0.00')
-        return total
-
-    @property
-    def total_descontos(self):
-        """Calcula o total de descontos do evento"""
-        total = self.itens.filter(
-            provento_desconto__tipo='D'
-        ).aggregate(total=Sum('valor_lancado'))['total'] or Decimal('0.00')
-        return total
-
     @property
     def total_liquido(self):
-        """Calcula o total líquido do evento"""
+        """Total líquido do evento (a partir dos totais armazenados)"""
         return self.total_proventos - self.total_descontos
 
     def calcular_valor_total(self):
-        """Recalcula o valor total do evento"""
+        """
+        Recalcula os totais do evento a partir dos itens
+        
+        Também atualiza os totais da folha, mantendo-os consistentes quando
+        itens são gravados fora do FolhaService.
+        """
+        totais = totalizar_itens(self.itens.all())
+        self.total_proventos = totais['total_proventos']
+        self.total_descontos = totais['total_descontos']
         self.valor_total = self.total_liquido
-        self.save(update_fields=['valor_total'])
+        self.save(update_fields=['total_proventos', 'total_descontos', 'valor_total'])
+        self.folha_pagamento.recalcular_totais()
 
     def fechar_evento(self):
         """Fecha o evento de pagamento"""
@@ -247,7 +283,7 @@ class EventoPagamento(TimeStampedModel):
         
         self.status = 'F'
         self.calcular_valor_total()
-        self.save()
+        self.save(update_fields=['status', 'updated_at'])
 
     def marcar_como_pago(self, data_pagamento=None):
         """Marca o evento como pago"""
@@ -256,7 +292,7 @@ class EventoPagamento(TimeStampedModel):
         
         self.status = 'P'
         self.data_pagamento = data_pagamento or timezone.now().date()
-        self.save()
+        self.save(update_fields=['status', 'data_pagamento', 'updated_at'])
 
     def reabrir_evento(self):
         """Reabre o evento para edição"""
@@ -264,7 +300,7 @@ class EventoPagamento(TimeStampedModel):
             raise ValidationError('Apenas eventos fechados podem ser reabertos')
         
         self.status = 'R'
-        self.save()
+        self.save(update_fields=['status', 'updated_at'])
 
 
 class ItemFolha(TimeStampedModel):
@@ -320,6 +356,27 @@ class ItemFolha(TimeStampedModel):
         related_name='itens_desconto',
         help_text='Referência ao adiantamento original (quando aplicável)'
     )
+    
+    # Rastreabilidade dos lançamentos fixos: permite reaplicar às folhas em
+    # rascunho apenas os itens de um lançamento alterado
+    lancamento_fixo_origem = models.ForeignKey(
+        LancamentoFixo,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Lançamento Fixo Origem',
+        related_name='itens_folha',
+        help_text='Lançamento fixo do funcionário que gerou o item (quando aplicável)'
+    )
+    lancamento_geral_origem = models.ForeignKey(
+        LancamentoFixoGeral,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Lançamento Fixo Geral Origem',
+        related_name='itens_folha',
+        help_text='Lançamento fixo geral que gerou o item (quando aplicável)'
+    )
 
     class Meta:
         verbose_name = 'Item da Folha'
@@ -379,19 +436,92 @@ class ResumoFolhaFuncionario(models.Model):
 
     def calcular_totais(self):
         """Calcula os totais de proventos, descontos e líquido"""
-        itens = ItemFolha.objects.filter(
+        totais = totalizar_itens(ItemFolha.objects.filter(
             folha_pagamento=self.folha_pagamento,
             funcionario=self.funcionario
-        )
-        
-        self.total_proventos = itens.filter(
-            provento_desconto__tipo='P'
-        ).aggregate(total=Sum('valor_lancado'))['total'] or Decimal('0.00')
-        
-        self.total_descontos = itens.filter(
-            provento_desconto__tipo='D'
-        ).aggregate(total=Sum('valor_lancado'))['total'] or Decimal('0.00')
+        ))
         
+        self.total_proventos = totais['total_proventos']
+        self.total_descontos = totais['total_descontos']
         self.valor_liquido = self.total_proventos - self.total_descontos
         
         self.save()
+
+
+class TarefaFolha(TimeStampedModel):
+    """
+    Tarefa de processamento em segundo plano (fila apoiada no banco de dados)
+    
+    Operações pesadas (geração de folha, eventos em massa e exportações) são
+    enfileiradas pelas views e executadas pelo comando `processar_tarefas`,
+    liberando o worker HTTP imediatamente.
+    """
+    
+    TIPO_CHOICES = [
+        ('GF', 'Geração de Folha'),
+        ('AD', 'Evento de Adiantamento'),
+        ('13', 'Evento de 13º Salário'),
+        ('XP', 'Exportação PDF'),
+        ('XE', 'Exportação Excel'),
+        ('XH', 'Exportação de Holerites'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('P', 'Pendente'),
+        ('E', 'Em Execução'),
+        ('C', 'Concluída'),
+        ('F', 'Falhou'),
+    ]
+    
+    tipo = models.CharField('Tipo', max_length=2, choices=TIPO_CHOICES)
+    status = models.CharField('Status', max_length=1, choices=STATUS_CHOICES, default='P')
+    folha_pagamento = models.ForeignKey(
+        FolhaPagamento,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Folha de Pagamento',
+        related_name='tarefas'
+    )
+    parametros = models.JSONField('Parâmetros', default=dict, blank=True)
+    progresso = models.PositiveSmallIntegerField('Progresso (%)', default=0)
+    mensagem = models.CharField('Mensagem', max_length=200, blank=True)
+    resultado = models.JSONField('Resultado', default=dict, blank=True)
+    arquivo = models.FileField('Arquivo', upload_to='tarefas/', blank=True)
+    erro = models.TextField('Erro', blank=True)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Solicitado por',
+        related_name='tarefas_folha'
+    )
+    iniciado_em = models.DateTimeField('Iniciado em', null=True, blank=True)
+    concluido_em = models.DateTimeField('Concluído em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Tarefa de Processamento'
+        verbose_name_plural = 'Tarefas de Processamento'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def finalizada(self):
+        """Indica se a tarefa já terminou (com sucesso ou falha)"""
+        return self.status in ('C', 'F')
+
+    def atualizar_progresso(self, progresso: int, mensagem: str = ''):
+        """Registra o progresso da tarefa sem disparar validações do modelo"""
+        self.progresso = max(0, min(100, progresso))
+        self.mensagem = mensagem[:200]
+        TarefaFolha.objects.filter(pk=self.pk).update(
+            progresso=self.progresso,
+            mensagem=self.mensagem,
+            updated_at=timezone.now(),
+        )
@@ -0,0 +1,144 @@
+"""
+Serializers da API da Folha de Pagamento
+"""
+from rest_framework import serializers
+
+from core.models import ProventoDesconto
+from funcionarios.models import Funcionario
+from .models import ItemFolha, ResumoFolhaFuncionario, TarefaFolha
+from .services import FolhaService
+
+
+# Máximo de linhas aceitas em uma chamada de gravação em lote
+LIMITE_LINHAS_LOTE = 5000
+
+
+class CamposDinamicosMixin:
+    """
+    Sparse fieldsets: `?campos=a,b` restringe a resposta a esses campos
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        campos = request.query_params.get('campos') if request else None
+        if campos:
+            pedidos = {campo.strip() for campo in campos.split(',')}
+            for nome in set(self.fields) - pedidos:
+                self.fields.pop(nome)
+
+
+class ItemFolhaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Leitura de itens da folha"""
+    evento = serializers.IntegerField(source='evento_pagamento_id')
+    funcionario = serializers.IntegerField(source='funcionario_id')
+    funcionario_nome = serializers.CharField(source='funcionario.nome_completo')
+    provento_desconto = serializers.CharField(source='provento_desconto.codigo_referencia')
+    tipo = serializers.CharField(source='provento_desconto.tipo')
+
+    class Meta:
+        model = ItemFolha
+        fields = [
+            'id', 'evento', 'funcionario', 'funcionario_nome', 'provento_desconto',
+            'tipo', 'valor_lancado', 'base_calculo', 'justificativa',
+        ]
+        read_only_fields = fields
+
+
+class ResumoFolhaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Leitura dos resumos por funcionário"""
+    funcionario = serializers.IntegerField(source='funcionario_id')
+    funcionario_nome = serializers.CharField(source='funcionario.nome_completo')
+    cpf = serializers.CharField(source='funcionario.cpf')
+
+    class Meta:
+        model = ResumoFolhaFuncionario
+        fields = [
+            'id', 'funcionario', 'funcionario_nome', 'cpf',
+            'total_proventos', 'total_descontos', 'valor_liquido',
+        ]
+        read_only_fields = fields
+
+
+class ItemLoteListSerializer(serializers.ListSerializer):
+    """
+    Gravação de itens em lote
+
+    Funcionários e proventos/descontos de todas as linhas são resolvidos em
+    duas consultas (em vez de uma por linha) e a gravação é delegada a
+    FolhaService.gravar_itens_em_lote, que escreve em lotes.
+    """
+
+    def to_internal_value(self, data):
+        # Os erros de cada linha saem na mesma posição da linha enviada, como
+        # nos erros de campo do ListSerializer
+        if isinstance(data, list) and not data:
+            raise serializers.ValidationError({'non_field_errors': ['Nenhum item informado.']})
+        if isinstance(data, list) and len(data) > LIMITE_LINHAS_LOTE:
+            raise serializers.ValidationError({
+                'non_field_errors': [f'Envie no máximo {LIMITE_LINHAS_LOTE} itens por chamada.']
+            })
+        attrs = super().to_internal_value(data)
+
+        funcionarios = set(Funcionario.objects.filter(
+            pk__in={linha['funcionario'] for linha in attrs}
+        ).values_list('pk', flat=True))
+        proventos = ProventoDesconto.objects.in_bulk(
+            {linha['provento_desconto'] for linha in attrs}, field_name='codigo_referencia'
+        )
+
+        erros = []
+        for linha in attrs:
+            erro = {}
+            if linha['funcionario'] not in funcionarios:
+                erro['funcionario'] = [f'Funcionário {linha["funcionario"]} não encontrado.']
+            if linha['provento_desconto'] not in proventos:
+                erro['provento_desconto'] = [f'Provento/desconto "{linha["provento_desconto"]}" não encontrado.']
+            erros.append(erro)
+        if any(erros):
+            raise serializers.ValidationError(erros)
+
+        return [
+            {
+                'funcionario_id': linha['funcionario'],
+                'provento_desconto': proventos[linha['provento_desconto']],
+                'valor_lancado': linha['valor_lancado'],
+                'base_calculo': linha.get('base_calculo'),
+                'justificativa': linha.get('justificativa', ''),
+            }
+            for linha in attrs
+        ]
+
+    def create(self, validated_data):
+        return FolhaService.gravar_itens_em_lote(self.context['evento'], validated_data)
+
+
+class ItemLoteSerializer(serializers.Serializer):
+    """Linha da gravação de itens em lote"""
+    funcionario = serializers.IntegerField()
+    provento_desconto = serializers.CharField(help_text='Código de referência')
+    valor_lancado = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    base_calculo = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    justificativa = serializers.CharField(required=False, allow_blank=True, default='')
+
+    class Meta:
+        list_serializer_class = ItemLoteListSerializer
+
+
+class GerarFolhaSerializer(serializers.Serializer):
+    """Parâmetros da geração de folha"""
+    mes = serializers.IntegerField(min_value=1, max_value=12)
+    ano = serializers.IntegerField(min_value=2000, max_value=2100)
+
+
+class TarefaFolhaSerializer(serializers.ModelSerializer):
+    """Acompanhamento de tarefas em segundo plano"""
+    folha = serializers.IntegerField(source='folha_pagamento_id', allow_null=True)
+
+    class Meta:
+        model = TarefaFolha
+        fields = [
+            'id', 'tipo', 'status', 'progresso', 'mensagem', 'erro',
+            'resultado', 'folha', 'finalizada', 'created_at', 'concluido_em',
+        ]
+        read_only_fields = fields
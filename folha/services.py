@@ -1,89 +1,647 @@
 """
 Services - Lógica de negócio para geração e manipulação de folhas de pagamento
 """
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from decimal import Decimal
 from datetime import date
-from django.db import transaction
+
+import django
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 from .models import FolhaPagamento, EventoPagamento, ItemFolha, ResumoFolhaFuncionario
 from funcionarios.models import Funcionario, Contrato, LancamentoFixo, Adiantamento
 from core.models import ProventoDesconto, LancamentoFixoGeral
+from core.rubricas import obter_rubrica
+from core.vigencia import periodo_competencia, vigente_no_periodo
+from .instrumentacao import etapa, operacao
+
+
+logger = logging.getLogger(__name__)
+
+
+def _decimal(valor):
+    """
+    Converte um valor recebido (Decimal, int, float ou texto) em Decimal
+
+    O float passa pelo texto: Decimal(0.1) carregaria o erro da representação
+    binária (0.1000000000000000055...).
+    """
+    if valor is None or isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor))
 
 
 class FolhaService:
     """Service para gerenciamento de folhas de pagamento"""
     
+    # Tamanho dos lotes usados em bulk_create/update para não estourar o limite
+    # de parâmetros por statement (SQLite) e manter os INSERTs razoáveis
+    BATCH_SIZE = 500
+    
+    # Vezes que um lote da geração em paralelo é calculado antes de a geração
+    # ser abandonada
+    TENTATIVAS_LOTE = 3
+    
+    # Categorias dos itens gerados (etapa medida, método que calcula os itens
+    # de um funcionário), na ordem em que entram na folha
+    _CATEGORIAS_ITENS = (
+        ('salario_base', '_itens_salario_base'),
+        ('lancamentos_gerais', '_itens_lancamentos_gerais'),
+        ('lancamentos_fixos', '_itens_lancamentos_fixos'),
+        ('adiantamentos', '_itens_adiantamentos'),
+    )
+
     @staticmethod
-    def gerar_folha(mes: int, ano: int, criar_evento_padrao: bool = True) -> FolhaPagamento:
+    def gerar_folha(mes: int, ano: int, criar_evento_padrao: bool = True,
+                    processos: int = None) -> FolhaPagamento:
         """
         Gera uma nova folha de pagamento para o mês/ano especificado
         
+        Os dados da competência (proventos, lançamentos fixos e adiantamentos)
+        são carregados de uma só vez e os itens são calculados em memória,
+        antes de abrir a transação; a folha, o evento, os itens e os resumos
+        são então gravados em lote em uma única transação, de modo que a folha
+        aparece por inteiro ou não aparece e o número de consultas não cresce
+        com a quantidade de funcionários. Com mais de um processo, o cálculo é
+        dividido em lotes (ver _calcular_itens_em_lotes).
+        
         Args:
             mes: Mês da folha (1-12)
             ano: Ano da folha
+            processos: Processos usados no cálculo dos itens
+                       (padrão: settings.FOLHA_GERACAO_PROCESSOS; 0 = nº de CPUs)
             
         Returns:
             FolhaPagamento: Instância da folha criada
         """
-        with transaction.atomic():
-            # Cria a folha
-            folha = FolhaPagamento.objects.create(mes=mes, ano=ano)
+        if processos is None:
+            processos = getattr(settings, 'FOLHA_GERACAO_PROCESSOS', 1)
+        processos = processos or os.cpu_count() or 1
+        
+        with operacao('gerar_folha', mes=mes, ano=ano) as relatorio:
+            # Falha antes de calcular, e não só na gravação
+            if FolhaPagamento.objects.filter(mes=mes, ano=ano).exists():
+                raise ValidationError('Já existe uma folha de pagamento para este período')
             
             # Busca todos os contratos ativos no período
-            primeiro_dia = date(ano, mes, 1)
-            if mes == 12:
-                ultimo_dia = date(ano + 1, 1, 1)
-            else:
-                ultimo_dia = date(ano, mes + 1, 1)
+            primeiro_dia, ultimo_dia = periodo_competencia(mes, ano)
+            with etapa('contratos') as medicao:
+                contratos_ativos = FolhaService._contratos_competencia(primeiro_dia, ultimo_dia)
+                contratos = list(contratos_ativos)
+                medicao.registros = len(contratos)
             
-            contratos_ativos = Contrato.objects.filter(
-                data_inicio__lte=ultimo_dia,
-                funcionario__participa_folha=True  # Apenas funcionários que participam da folha
-            ).filter(
-                models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=primeiro_dia)
-            ).select_related('funcionario', 'tipo_contrato')
+            # Um funcionário com dois contratos no mês (troca de contrato)
+            # recebe uma única linha de salário
+            funcionarios = list({c.funcionario_id: c.funcionario for c in contratos}.values())
             
-            # Adiciona contratos ativos à folha
-            folha.contratos_ativos.set(contratos_ativos)
-            
-            # Cria evento padrão se solicitado (para compatibilidade)
+            itens = []
             if criar_evento_padrao:
-                import calendar
-                ultimo_dia_mes = calendar.monthrange(ano, mes)[1]
-                data_evento = date(ano, mes, ultimo_dia_mes)
+                with etapa('carga_competencia'):
+                    dados = FolhaService._carregar_dados_competencia(
+                        contratos_ativos, primeiro_dia, ultimo_dia
+                    )
                 
-                evento = EventoPagamento.objects.create(
-                    folha_pagamento=folha,
-                    tipo_evento='PF',
-                    descricao=f'Pagamento Final {mes:02d}/{ano}',
-                    data_evento=data_evento,
-                    status='R'
-                )
+                if processos > 1:
+                    relatorio.contexto['processos'] = processos
+                    with etapa('calculo_lotes') as medicao:
+                        itens = FolhaService._calcular_itens_em_lotes(funcionarios, dados, processos)
+                        medicao.registros = len(itens)
+                else:
+                    with etapa('calculo_itens') as medicao:
+                        itens = FolhaService._calcular_itens(funcionarios, dados)
+                        medicao.registros = len(itens)
+            
+            with etapa('publicacao') as medicao, transaction.atomic():
+                folha = FolhaPagamento.objects.create(mes=mes, ano=ano)
+                folha.contratos_ativos.set(contratos)
+                medicao.linhas = 1 + len(contratos)
                 
-                # Processa cada funcionário no evento padrão
-                for contrato in contratos_ativos:
-                    funcionario = contrato.funcionario
+                # Cria evento padrão se solicitado (para compatibilidade)
+                if criar_evento_padrao:
+                    evento = EventoPagamento.objects.create(
+                        folha_pagamento=folha,
+                        tipo_evento='PF',
+                        descricao=f'Pagamento Final {mes:02d}/{ano}',
+                        data_evento=ultimo_dia,
+                        status='R'
+                    )
+                    medicao.linhas += 1
+                    for item in itens:
+                        item.folha_pagamento = folha
+                        item.evento_pagamento = evento
                     
-                    # 1. Lança o salário base
-                    FolhaService._lancar_salario_base(folha, evento, funcionario)
-                    
-                    # 2. Lança os lançamentos fixos gerais
-                    FolhaService._lancar_lancamentos_fixos_gerais(folha, evento, funcionario, primeiro_dia, ultimo_dia)
-                    
-                    # 3. Lança os lançamentos fixos do funcionário
-                    FolhaService._lancar_lancamentos_fixos(folha, evento, funcionario, primeiro_dia, ultimo_dia)
-                    
-                    # 4. Lança adiantamentos pendentes
-                    FolhaService._lancar_adiantamentos(folha, evento, funcionario)
-                    
-                    # 5. Cria o resumo do funcionário
-                    FolhaService._criar_resumo_funcionario(folha, funcionario)
-                
-                # Recalcula o valor total do evento
-                evento.calcular_valor_total()
+                    # Um adiantamento descontado por outra operação depois da
+                    # carga seria descontado duas vezes: a geração é desfeita
+                    adiantamentos = sum(1 for item in itens if item.adiantamento_origem_id)
+                    if FolhaService._gravar_itens_gerados(folha, evento, funcionarios, itens) != adiantamentos:
+                        raise ValidationError(
+                            'Os adiantamentos da competência foram alterados durante o cálculo; '
+                            'gere a folha novamente'
+                        )
+            relatorio.contexto['folha'] = folha.pk
+        
+        # Fora da transação: o relatório só é gravado se a geração foi concluída
+        folha.relatorio_geracao = relatorio.como_dict()
+        folha.save(update_fields=['relatorio_geracao'])
+        return folha
+    
+    @staticmethod
+    def _contratos_competencia(data_inicio: date, data_fim: date):
+        """Contratos vigentes na competência de funcionários que participam da folha"""
+        return Contrato.objects.vigentes_em(data_inicio, data_fim).filter(
+            funcionario__participa_folha=True
+        ).select_related('funcionario', 'tipo_contrato')
+    
+    @staticmethod
+    def _carregar_dados_competencia(contratos_ativos, data_inicio: date, data_fim: date,
+                                    somente_leitura: bool = False,
+                                    descontados_em: FolhaPagamento = None) -> dict:
+        """
+        Carrega em poucas consultas tudo o que a geração da competência precisa
+        
+        Args:
+            contratos_ativos: QuerySet dos contratos da competência (usado como subquery)
+            data_inicio: Primeiro dia da competência
+            data_fim: Último dia da competência
+            somente_leitura: Não cria as rubricas do sistema que ainda não existem
+            descontados_em: Considera também os adiantamentos já descontados
+                            nesta folha (como estavam pendentes na geração)
             
-            return folha
+        Returns:
+            dict: Proventos do sistema, lançamentos gerais e lançamentos fixos e
+            adiantamentos pendentes agrupados por funcionário
+        """
+        funcionarios_ids = contratos_ativos.values('funcionario_id')
+        
+        with etapa('lancamentos_gerais') as medicao:
+            lancamentos_gerais = list(LancamentoFixoGeral.objects.filter(
+                ativo=True
+            ).vigentes_em(data_inicio, data_fim).select_related('provento_desconto'))
+            medicao.registros = len(lancamentos_gerais)
+        
+        with etapa('lancamentos_fixos') as medicao:
+            lancamentos_fixos = defaultdict(list)
+            for lancamento in LancamentoFixo.objects.filter(
+                funcionario_id__in=funcionarios_ids
+            ).vigentes_em(data_inicio, data_fim).select_related('provento_desconto'):
+                lancamentos_fixos[lancamento.funcionario_id].append(lancamento)
+                medicao.registros += 1
+        
+        pendentes = Q(status='P')
+        if descontados_em is not None:
+            pendentes |= Q(pk__in=ItemFolha.objects.filter(
+                folha_pagamento=descontados_em, adiantamento_origem__isnull=False
+            ).values('adiantamento_origem_id'))
+        
+        with etapa('adiantamentos') as medicao:
+            adiantamentos = defaultdict(list)
+            for adiantamento in Adiantamento.objects.filter(
+                pendentes,
+                funcionario_id__in=funcionarios_ids,
+            ):
+                adiantamentos[adiantamento.funcionario_id].append(adiantamento)
+                medicao.registros += 1
+        
+        criar = not somente_leitura
+        with etapa('rubricas'):
+            provento_salario = obter_rubrica('SALARIO', criar=criar)
+            desconto_adiantamento = obter_rubrica('ADIANTAMENTO', criar=criar) if adiantamentos else None
+        
+        return {
+            'provento_salario': provento_salario,
+            'desconto_adiantamento': desconto_adiantamento,
+            'lancamentos_gerais': lancamentos_gerais,
+            'lancamentos_fixos': lancamentos_fixos,
+            'adiantamentos': adiantamentos,
+        }
+    
+    @staticmethod
+    def _calcular_itens(funcionarios: list, dados: dict) -> list:
+        """
+        Calcula, sem acessar o banco, os itens dos funcionários na competência
+        
+        Cada categoria (salário base, lançamentos fixos gerais, lançamentos
+        fixos do funcionário e adiantamentos pendentes) é uma etapa medida; os
+        itens saem agrupados por funcionário, na ordem de _calcular_itens_funcionario.
+        
+        Returns:
+            list: Instâncias de ItemFolha ainda não salvas, sem folha e evento
+        """
+        por_funcionario = [[] for _ in funcionarios]
+        for nome, metodo in FolhaService._CATEGORIAS_ITENS:
+            calcular = getattr(FolhaService, metodo)
+            with etapa(nome) as medicao:
+                for itens, funcionario in zip(por_funcionario, funcionarios):
+                    novos = calcular(funcionario, dados)
+                    itens.extend(novos)
+                    medicao.registros += len(novos)
+        return [item for itens in por_funcionario for item in itens]
+    
+    @staticmethod
+    def _calcular_itens_funcionario(funcionario: Funcionario, dados: dict) -> list:
+        """
+        Calcula, sem acessar o banco, os itens do funcionário na competência
+        
+        A ordem segue a geração original: salário base, lançamentos fixos gerais,
+        lançamentos fixos do funcionário e adiantamentos pendentes.
+        
+        Returns:
+            list: Instâncias de ItemFolha ainda não salvas, sem folha e evento
+        """
+        return [
+            item
+            for _, metodo in FolhaService._CATEGORIAS_ITENS
+            for item in getattr(FolhaService, metodo)(funcionario, dados)
+        ]
+    
+    @staticmethod
+    def _calcular_itens_em_lotes(funcionarios: list, dados: dict, processos: int) -> list:
+        """
+        Calcula os itens dividindo os funcionários em lotes, um processo por lote
+        
+        Cada lote leva só os lançamentos fixos e os adiantamentos dos seus
+        funcionários (e, destes, apenas o que o cálculo usa); os processos não
+        acessam o banco e devolvem os campos dos itens, com que as instâncias
+        são remontadas aqui. As etapas por categoria não são medidas nos
+        processos: o relatório mostra só o total do cálculo.
+        
+        Returns:
+            list: Instâncias de ItemFolha ainda não salvas, sem folha e evento,
+            na mesma ordem do cálculo no próprio processo
+        """
+        # Alguns lotes por processo, para que um lote lento ou refeito não
+        # deixe os demais processos ociosos
+        tamanho = max(1, -(-len(funcionarios) // (processos * 4)))
+        lotes = []
+        for inicio in range(0, len(funcionarios), tamanho):
+            lote = [
+                Funcionario(pk=funcionario.pk, salario_base=funcionario.salario_base)
+                for funcionario in funcionarios[inicio:inicio + tamanho]
+            ]
+            lotes.append((lote, {
+                'provento_salario': dados['provento_salario'],
+                'desconto_adiantamento': dados['desconto_adiantamento'],
+                'lancamentos_gerais': dados['lancamentos_gerais'],
+                'lancamentos_fixos': {
+                    f.pk: dados['lancamentos_fixos'][f.pk] for f in lote if f.pk in dados['lancamentos_fixos']
+                },
+                'adiantamentos': {
+                    f.pk: dados['adiantamentos'][f.pk] for f in lote if f.pk in dados['adiantamentos']
+                },
+            }))
+        
+        rubricas = {dados['provento_salario'].pk: dados['provento_salario']}
+        if dados['desconto_adiantamento'] is not None:
+            rubricas[dados['desconto_adiantamento'].pk] = dados['desconto_adiantamento']
+        for lancamento in dados['lancamentos_gerais']:
+            rubricas[lancamento.provento_desconto_id] = lancamento.provento_desconto
+        for lancamentos in dados['lancamentos_fixos'].values():
+            for lancamento in lancamentos:
+                rubricas[lancamento.provento_desconto_id] = lancamento.provento_desconto
+        
+        itens = []
+        for calculados in (_calcular_lotes(lotes, processos) if lotes else []):
+            for campos in calculados:
+                item = ItemFolha(**campos)
+                item.provento_desconto = rubricas[item.provento_desconto_id]
+                itens.append(item)
+        return itens
+    
+    @staticmethod
+    def _itens_salario_base(funcionario: Funcionario, dados: dict) -> list:
+        return [ItemFolha(
+            funcionario=funcionario,
+            provento_desconto=dados['provento_salario'],
+            valor_lancado=funcionario.salario_base,
+            justificativa='Salário base mensal'
+        )]
+    
+    @staticmethod
+    def _itens_lancamentos(funcionario: Funcionario, lancamentos: list, origem: str) -> list:
+        itens = []
+        for lancamento in lancamentos:
+            valor, base = FolhaService._calcular_valor_lancamento(lancamento, funcionario)
+            if valor <= 0:
+                continue
+            itens.append(ItemFolha(
+                funcionario=funcionario,
+                provento_desconto=lancamento.provento_desconto,
+                valor_lancado=valor,
+                base_calculo=base,
+                justificativa=FolhaService._justificativa_lancamento(lancamento),
+                **{origem: lancamento}
+            ))
+        return itens
+    
+    @staticmethod
+    def _itens_lancamentos_gerais(funcionario: Funcionario, dados: dict) -> list:
+        return FolhaService._itens_lancamentos(
+            funcionario, dados['lancamentos_gerais'], 'lancamento_geral_origem'
+        )
+    
+    @staticmethod
+    def _itens_lancamentos_fixos(funcionario: Funcionario, dados: dict) -> list:
+        return FolhaService._itens_lancamentos(
+            funcionario, dados['lancamentos_fixos'].get(funcionario.pk, []), 'lancamento_fixo_origem'
+        )
+    
+    @staticmethod
+    def _itens_adiantamentos(funcionario: Funcionario, dados: dict) -> list:
+        return [
+            ItemFolha(
+                funcionario=funcionario,
+                provento_desconto=dados['desconto_adiantamento'],
+                valor_lancado=adiantamento.valor,
+                justificativa=f'Adiantamento de {adiantamento.data_adiantamento}',
+                adiantamento_origem=adiantamento
+            )
+            for adiantamento in dados['adiantamentos'].get(funcionario.pk, [])
+        ]
+    
+    @staticmethod
+    def _calcular_valor_lancamento(lancamento, funcionario: Funcionario):
+        """
+        Calcula o valor de um lançamento fixo (geral ou do funcionário)
+        
+        Returns:
+            tuple: (valor, base_calculo) - base é None para valores fixos
+        """
+        if lancamento.provento_desconto.impacto == 'F':
+            return lancamento.valor or Decimal('0'), None
+        
+        base = funcionario.salario_base
+        percentual = lancamento.percentual or Decimal('0')
+        valor = ((base * percentual) / Decimal('100')).quantize(Decimal('0.01'))
+        return valor, base
+    
+    @staticmethod
+    def _justificativa_lancamento(lancamento) -> str:
+        """Justificativa dos itens gerados por um lançamento fixo (geral ou do funcionário)"""
+        if isinstance(lancamento, LancamentoFixoGeral):
+            return f'Lançamento fixo geral - {lancamento.observacoes}'
+        return f'Lançamento fixo - {lancamento.observacoes}'
+    
+    @staticmethod
+    def _gravar_itens_gerados(folha: FolhaPagamento, evento: EventoPagamento,
+                              funcionarios: list, itens: list):
+        """
+        Persiste em lote os itens calculados na geração da folha
+        
+        Grava os itens, marca os adiantamentos como descontados, cria os
+        resumos por funcionário e atualiza o valor total do evento, tudo a
+        partir dos valores já calculados em memória.
+        
+        Returns:
+            int: Adiantamentos pendentes marcados como descontados
+        """
+        batch_size = FolhaService.BATCH_SIZE
+        with etapa('gravacao_itens') as medicao:
+            ItemFolha.objects.bulk_create(itens, batch_size=batch_size)
+            medicao.linhas = len(itens)
+        
+        # Marca os adiantamentos descontados
+        with etapa('baixa_adiantamentos') as baixa:
+            adiantamentos_ids = [i.adiantamento_origem_id for i in itens if i.adiantamento_origem_id]
+            agora = timezone.now()
+            for inicio in range(0, len(adiantamentos_ids), batch_size):
+                baixa.linhas += Adiantamento.objects.filter(
+                    pk__in=adiantamentos_ids[inicio:inicio + batch_size], status='P'
+                ).update(status='D', updated_at=agora)
+        
+        # Totais por funcionário e do evento
+        totais = {f.pk: [Decimal('0.00'), Decimal('0.00')] for f in funcionarios}
+        for item in itens:
+            indice = 0 if item.provento_desconto.tipo == 'P' else 1
+            totais[item.funcionario_id][indice] += item.valor_lancado
+        
+        with etapa('resumos') as medicao:
+            resumos = [
+                ResumoFolhaFuncionario(
+                    folha_pagamento=folha,
+                    funcionario_id=funcionario_id,
+                    total_proventos=proventos,
+                    total_descontos=descontos,
+                    valor_liquido=proventos - descontos,
+                )
+                for funcionario_id, (proventos, descontos) in totais.items()
+            ]
+            ResumoFolhaFuncionario.objects.bulk_create(resumos, batch_size=batch_size)
+            medicao.linhas = len(resumos)
+        
+        with etapa('totais'):
+            FolhaService._ajustar_totais(
+                evento,
+                sum((r.total_proventos for r in resumos), Decimal('0.00')),
+                sum((r.total_descontos for r in resumos), Decimal('0.00')),
+            )
+        
+        return baixa.linhas
+    
+    @staticmethod
+    def _ajustar_totais(evento: EventoPagamento, proventos: Decimal, descontos: Decimal):
+        """
+        Aplica uma variação aos totais armazenados do evento e da folha
+        
+        Usa UPDATE com expressões F(), sem reagregar os itens, e mantém as
+        instâncias em memória coerentes com o banco.
+        
+        Args:
+            evento: Evento que recebeu (ou perdeu) itens
+            proventos: Variação do total de proventos (negativa em remoções)
+            descontos: Variação do total de descontos (negativa em remoções)
+        """
+        if not proventos and not descontos:
+            return
+        
+        liquido = proventos - descontos
+        
+        EventoPagamento.objects.filter(pk=evento.pk).update(
+            total_proventos=F('total_proventos') + proventos,
+            total_descontos=F('total_descontos') + descontos,
+            valor_total=F('valor_total') + liquido,
+        )
+        FolhaPagamento.objects.filter(pk=evento.folha_pagamento_id).update(
+            total_proventos=F('total_proventos') + proventos,
+            total_descontos=F('total_descontos') + descontos,
+            total_liquido=F('total_liquido') + liquido,
+        )
+        
+        evento.total_proventos += proventos
+        evento.total_descontos += descontos
+        evento.valor_total += liquido
+        if EventoPagamento.folha_pagamento.is_cached(evento):
+            folha = evento.folha_pagamento
+            folha.total_proventos += proventos
+            folha.total_descontos += descontos
+            folha.total_liquido += liquido
+    
+    @staticmethod
+    def calcular_competencia(mes: int, ano: int, folha: FolhaPagamento = None) -> dict:
+        """
+        Calcula em memória o que gerar_folha produziria para a competência
+        
+        Usa a mesma carga e o mesmo cálculo da geração, mas não grava nada:
+        nenhuma folha, item, resumo ou rubrica é criado e nenhum adiantamento
+        muda de status. São poucas consultas, independentemente da quantidade
+        de funcionários.
+        
+        Args:
+            mes: Mês da competência (1-12)
+            ano: Ano da competência
+            folha: Folha já gerada da competência; os adiantamentos que ela
+                   descontou entram no cálculo como se ainda estivessem pendentes
+            
+        Returns:
+            dict: mes, ano, linhas (um dict por item), resumos (um dict por
+            funcionário) e totais da competência
+        """
+        primeiro_dia, ultimo_dia = periodo_competencia(mes, ano)
+        contratos_ativos = FolhaService._contratos_competencia(primeiro_dia, ultimo_dia)
+        funcionarios = list({c.funcionario_id: c.funcionario for c in contratos_ativos}.values())
+        
+        linhas = []
+        resumos = []
+        if funcionarios:
+            dados = FolhaService._carregar_dados_competencia(
+                contratos_ativos, primeiro_dia, ultimo_dia,
+                somente_leitura=True, descontados_em=folha
+            )
+            for funcionario in funcionarios:
+                itens = FolhaService._calcular_itens_funcionario(funcionario, dados)
+                linhas.extend(FolhaService._linha_item(item) for item in itens)
+                proventos, descontos = FolhaService._somar_linhas(linhas[-len(itens):])
+                resumos.append({
+                    'funcionario': funcionario.pk,
+                    'funcionario_nome': funcionario.nome_completo,
+                    'total_proventos': proventos,
+                    'total_descontos': descontos,
+                    'valor_liquido': proventos - descontos,
+                })
+        
+        return {
+            'mes': mes,
+            'ano': ano,
+            'linhas': linhas,
+            'resumos': resumos,
+            'totais': FolhaService._totais_linhas(linhas),
+        }
+    
+    @staticmethod
+    def comparar_competencia(folha: FolhaPagamento) -> dict:
+        """
+        Compara uma folha já gerada com o cálculo atual da sua competência
+        
+        Só entram na comparação os itens dos eventos de pagamento final (os que
+        a geração produz). Itens são casados por funcionário, provento/desconto
+        e origem (lançamento fixo geral, lançamento fixo ou adiantamento);
+        itens manuais sem origem aparecem em somente_na_folha.
+        
+        Args:
+            folha: Folha de pagamento
+            
+        Returns:
+            dict: somente_na_previa, somente_na_folha e divergentes (linhas como
+            em calcular_competencia), totais previsto/gravado e confere (True
+            quando não há diferenças)
+        """
+        previa = FolhaService.calcular_competencia(folha.mes, folha.ano, folha=folha)
+        gravadas = [
+            FolhaService._linha_item(item)
+            for item in ItemFolha.objects.filter(
+                folha_pagamento=folha, evento_pagamento__tipo_evento='PF'
+            ).select_related('funcionario', 'provento_desconto').order_by('pk')
+        ]
+        
+        previstos = FolhaService._agrupar_linhas(previa['linhas'])
+        gravados = FolhaService._agrupar_linhas(gravadas)
+        
+        somente_na_previa, somente_na_folha, divergentes = [], [], []
+        for chave, linha in previstos.items():
+            gravada = gravados.get(chave)
+            if gravada is None:
+                somente_na_previa.append(linha)
+            elif gravada['valor_lancado'] != linha['valor_lancado']:
+                divergentes.append({
+                    **linha,
+                    'valor_gravado': gravada['valor_lancado'],
+                    'diferenca': linha['valor_lancado'] - gravada['valor_lancado'],
+                })
+        somente_na_folha = [linha for chave, linha in gravados.items() if chave not in previstos]
+        
+        return {
+            'mes': folha.mes,
+            'ano': folha.ano,
+            'folha': folha.pk,
+            'somente_na_previa': somente_na_previa,
+            'somente_na_folha': somente_na_folha,
+            'divergentes': divergentes,
+            'totais': {
+                'previsto': previa['totais'],
+                'gravado': FolhaService._totais_linhas(gravadas),
+            },
+            'confere': not (somente_na_previa or somente_na_folha or divergentes),
+        }
+    
+    @staticmethod
+    def _linha_item(item: ItemFolha) -> dict:
+        """Representação em dados simples de um item (salvo ou não)"""
+        rubrica = item.provento_desconto
+        return {
+            'funcionario': item.funcionario_id,
+            'funcionario_nome': item.funcionario.nome_completo,
+            'provento_desconto': rubrica.pk,
+            'codigo': rubrica.codigo_referencia,
+            'provento_desconto_nome': rubrica.nome,
+            'tipo': rubrica.tipo,
+            'valor_lancado': item.valor_lancado,
+            'base_calculo': item.base_calculo,
+            'justificativa': item.justificativa,
+            'lancamento_geral': item.lancamento_geral_origem_id,
+            'lancamento_fixo': item.lancamento_fixo_origem_id,
+            'adiantamento': item.adiantamento_origem_id,
+        }
+    
+    @staticmethod
+    def _agrupar_linhas(linhas: list) -> dict:
+        """Linhas por (funcionário, rubrica, origem), somando as repetidas"""
+        agrupadas = {}
+        for linha in linhas:
+            chave = (
+                linha['funcionario'], linha['provento_desconto'], linha['lancamento_geral'],
+                linha['lancamento_fixo'], linha['adiantamento'],
+            )
+            if chave in agrupadas:
+                agrupadas[chave]['valor_lancado'] += linha['valor_lancado']
+            else:
+                agrupadas[chave] = dict(linha)
+        return agrupadas
+    
+    @staticmethod
+    def _somar_linhas(linhas: list) -> tuple:
+        """(proventos, descontos) de uma lista de linhas"""
+        proventos = sum((l['valor_lancado'] for l in linhas if l['tipo'] == 'P'), Decimal('0.00'))
+        descontos = sum((l['valor_lancado'] for l in linhas if l['tipo'] == 'D'), Decimal('0.00'))
+        return proventos, descontos
+    
+    @staticmethod
+    def _totais_linhas(linhas: list) -> dict:
+        """Totais de uma lista de linhas"""
+        proventos, descontos = FolhaService._somar_linhas(linhas)
+        return {
+            'funcionarios': len({l['funcionario'] for l in linhas}),
+            'itens': len(linhas),
+            'total_proventos': proventos,
+            'total_descontos': descontos,
+            'total_liquido': proventos - descontos,
+        }
     
     @staticmethod
     def criar_evento_pagamento(folha: FolhaPagamento, tipo_evento: str, descricao: str,
@@ -104,7 +662,8 @@ class FolhaService:
         if folha.status != 'R':
             raise ValidationError('Apenas folhas em rascunho podem ter novos eventos')
         
-        with transaction.atomic():
+        with operacao('criar_evento_pagamento', folha=folha.pk, tipo_evento=tipo_evento) as relatorio, \
+                transaction.atomic():
             evento = EventoPagamento.objects.create(
                 folha_pagamento=folha,
                 tipo_evento=tipo_evento,
@@ -112,16 +671,20 @@ class FolhaService:
                 data_evento=data_evento,
                 status='R'
             )
+            relatorio.contexto['evento'] = evento.pk
             
             if processar_funcionarios:
                 # Processa todos os funcionários da folha
-                for contrato in folha.contratos_ativos.all():
-                    funcionario = contrato.funcionario
-                    
-                    # Lança apenas o salário base (outros lançamentos devem ser manuais)
-                    FolhaService._lancar_salario_base(folha, evento, funcionario)
+                with etapa('salario_base') as medicao:
+                    for contrato in folha.contratos_ativos.all():
+                        funcionario = contrato.funcionario
+                        
+                        # Lança apenas o salário base (outros lançamentos devem ser manuais)
+                        FolhaService._lancar_salario_base(folha, evento, funcionario)
+                        medicao.linhas += 1
                 
-                evento.calcular_valor_total()
+                with etapa('totais'):
+                    evento.calcular_valor_total()
             
             return evento
 
@@ -156,7 +719,8 @@ class FolhaService:
 
         filtros = filtros or {}
 
-        with transaction.atomic():
+        with operacao('criar_evento_adiantamento_massivo', folha=folha.pk) as relatorio, \
+                transaction.atomic():
             evento = EventoPagamento.objects.create(
                 folha_pagamento=folha,
                 tipo_evento='AD',
@@ -164,37 +728,21 @@ class FolhaService:
                 data_evento=data_evento,
                 status='R',
             )
+            relatorio.contexto['evento'] = evento.pk
 
-            # Seleciona funcionários da competência
-            funcionarios = [c.funcionario for c in folha.contratos_ativos.all()]
-            if filtros:
-                from funcionarios.models import Funcionario as FuncModel
-                qs = FuncModel.objects.filter(pk__in=[f.pk for f in funcionarios])
-                qs = qs.filter(**filtros)
-                funcionarios = list(qs)
-
-            total_evento = Decimal('0')
-            for funcionario in funcionarios:
-                if valor:
-                    valor_adiantamento = valor
-                else:
-                    valor_adiantamento = (funcionario.salario_base * percentual) / Decimal('100')
-                
-                # Arredondar para 2 casas decimais
-                valor_adiantamento = valor_adiantamento.quantize(Decimal('0.01'))
-
-                from funcionarios.models import Adiantamento as AdModel
-                AdModel.objects.create(
-                    funcionario=funcionario,
-                    data_adiantamento=data_evento,
-                    valor=valor_adiantamento,
-                    status='P',
-                    observacoes=descricao,
+            # Funcionários da competência (filtrados) em uma única consulta
+            with etapa('adiantamentos') as medicao:
+                funcionarios = Funcionario.objects.filter(
+                    pk__in=folha.contratos_ativos.values('funcionario_id'), **filtros
                 )
-                total_evento += valor_adiantamento
+                resumo = AdiantamentoService.lancar_em_lote(
+                    funcionarios, data_evento, valor=valor, percentual=percentual, observacoes=descricao
+                )
+                medicao.linhas = resumo['quantidade']
 
-            evento.valor_total = total_evento.quantize(Decimal('0.01'))
-            evento.save(update_fields=['valor_total'])
+            with etapa('totais'):
+                evento.valor_total = resumo['valor_total']
+                evento.save(update_fields=['valor_total'])
 
             return evento
 
@@ -219,7 +767,8 @@ class FolhaService:
         if parcela not in (1, 2):
             raise ValidationError('Parcela deve ser 1 ou 2')
 
-        with transaction.atomic():
+        with operacao('criar_evento_decimo_terceiro', folha=folha.pk, parcela=parcela) as relatorio, \
+                transaction.atomic():
             evento = EventoPagamento.objects.create(
                 folha_pagamento=folha,
                 tipo_evento='13',
@@ -227,59 +776,50 @@ class FolhaService:
                 data_evento=data_evento,
                 status='R',
             )
+            relatorio.contexto['evento'] = evento.pk
 
             # Provento específico para 13º
-            try:
-                provento_13 = ProventoDesconto.objects.get(
-                    codigo_referencia='SALARIO_13',
-                    tipo='P',
-                )
-            except ProventoDesconto.DoesNotExist:
-                provento_13 = ProventoDesconto.objects.create(
-                    nome='13º Salário',
-                    codigo_referencia='SALARIO_13',
-                    tipo='P',
-                    impacto='F',
-                )
+            provento_13 = obter_rubrica('SALARIO_13')
 
             fator = Decimal('0.50') if parcela == 1 else Decimal('0.50')
 
-            total_evento = Decimal('0')
-            for contrato in folha.contratos_ativos.all():
-                funcionario = contrato.funcionario
-                valor = (funcionario.salario_base * fator).quantize(Decimal('0.01'))
+            with etapa('calculo_itens'):
+                itens = []
+                for contrato in folha.contratos_ativos.select_related('funcionario'):
+                    funcionario = contrato.funcionario
+                    itens.append(ItemFolha(
+                        folha_pagamento=folha,
+                        evento_pagamento=evento,
+                        funcionario=funcionario,
+                        provento_desconto=provento_13,
+                        valor_lancado=(funcionario.salario_base * fator).quantize(Decimal('0.01')),
+                        justificativa=f'13º salário - {parcela}ª parcela',
+                    ))
 
-                ItemFolha.objects.create(
-                    folha_pagamento=folha,
-                    evento_pagamento=evento,
-                    funcionario=funcionario,
-                    provento_desconto=provento_13,
-                    valor_lancado=valor,
-                    justificativa=f'13º salário - {parcela}ª parcela',
-                )
-                total_evento += valor
+            with etapa('gravacao_itens') as medicao:
+                ItemFolha.objects.bulk_create(itens, batch_size=FolhaService.BATCH_SIZE)
+                medicao.linhas = len(itens)
 
-            evento.valor_total = total_evento.quantize(Decimal('0.01'))
-            evento.save(update_fields=['valor_total'])
+            with etapa('totais'):
+                total_evento = sum((item.valor_lancado for item in itens), Decimal('0'))
+                FolhaService._ajustar_totais(evento, total_evento, Decimal('0.00'))
 
             return evento
     
+    @staticmethod
+    def _obter_provento_salario() -> ProventoDesconto:
+        """Busca ou cria o provento de salário base"""
+        return obter_rubrica('SALARIO')
+    
+    @staticmethod
+    def _obter_desconto_adiantamento() -> ProventoDesconto:
+        """Busca ou cria o desconto de adiantamento salarial"""
+        return obter_rubrica('ADIANTAMENTO')
+    
     @staticmethod
     def _lancar_salario_base(folha: FolhaPagamento, evento: EventoPagamento, funcionario: Funcionario):
         """Lança o salário base do funcionário na folha"""
-        try:
-            provento_salario = ProventoDesconto.objects.get(
-                codigo_referencia='SALARIO',
-                tipo='P'
-            )
-        except ProventoDesconto.DoesNotExist:
-            # Cria o provento de salário se não existir
-            provento_salario = ProventoDesconto.objects.create(
-                nome='Salário Base',
-                codigo_referencia='SALARIO',
-                tipo='P',
-                impacto='F'
-            )
+        provento_salario = FolhaService._obter_provento_salario()
         
         ItemFolha.objects.create(
             folha_pagamento=folha,
@@ -291,131 +831,283 @@ class FolhaService:
         )
     
     @staticmethod
-    def _lancar_lancamentos_fixos_gerais(folha: FolhaPagamento, evento: EventoPagamento,
-                                         funcionario: Funcionario, data_inicio: date, data_fim: date):
-        """Lança todos os lançamentos fixos gerais ativos para o funcionário"""
-        from django.db.models import Q
-        
-        # Para comparação correta: data_fim é o primeiro dia do mês seguinte,
-        # então usamos < ao invés de <= para excluir lançamentos que começam no mês seguinte
-        lancamentos_gerais = LancamentoFixoGeral.objects.filter(
-            ativo=True,
-            data_inicio__lt=data_fim  # Alterado de __lte para __lt
-        ).filter(
-            Q(data_fim__isnull=True) | Q(data_fim__gte=data_inicio)
-        ).select_related('provento_desconto')
-        
-        for lancamento in lancamentos_gerais:
-            # Calcula o valor baseado no tipo de impacto
-            if lancamento.provento_desconto.impacto == 'F':
-                valor = lancamento.valor or Decimal('0')
-                base = None
-            else:  # Percentual
-                base = funcionario.salario_base
-                percentual = lancamento.percentual or Decimal('0')
-                valor = (base * percentual) / Decimal('100')
+    def sincronizar_lancamento_fixo(lancamento, removido: bool = False) -> int:
+        """
+        Reaplica um lançamento fixo às folhas em rascunho
+        
+        Só os itens gerados pelo lançamento (rastreados em
+        lancamento_fixo_origem/lancamento_geral_origem) são recalculados, e
+        só no evento PF padrão de cada folha em rascunho (o mesmo de
+        _obter_evento_padrao; os demais PF não recebem lançamentos fixos),
+        quando ele também está em rascunho: itens são criados,
+        alterados ou removidos em lote e os totais e resumos afetados são
+        atualizados, sem regerar a competência. Um evento com itens gerados
+        da mesma rubrica sem a origem registrada (gerados antes do
+        rastreamento e não vinculados pela migração) não é sincronizado, para
+        não lançar o valor em dobro.
+        
+        Args:
+            lancamento: LancamentoFixo ou LancamentoFixoGeral alterado
+            removido: True quando o lançamento está sendo excluído
             
-            # Ignora lançamentos com valor zero
+        Returns:
+            int: Quantidade de itens criados, alterados ou removidos
+        """
+        afetados = 0
+        with transaction.atomic():
+            for folha in FolhaPagamento.objects.filter(status='R'):
+                evento = FolhaService._evento_padrao(folha)
+                if evento is None or evento.status != 'R':
+                    continue
+                evento.folha_pagamento = folha
+                afetados += FolhaService._sincronizar_lancamento_evento(evento, lancamento, removido)
+        return afetados
+    
+    @staticmethod
+    def _sincronizar_lancamento_evento(evento: EventoPagamento, lancamento, removido: bool) -> int:
+        """Recalcula, em um evento, os itens gerados por um lançamento fixo"""
+        folha = evento.folha_pagamento
+        geral = isinstance(lancamento, LancamentoFixoGeral)
+        origem = {'lancamento_geral_origem' if geral else 'lancamento_fixo_origem': lancamento}
+        
+        sem_origem = ItemFolha.objects.filter(
+            evento_pagamento=evento,
+            provento_desconto_id=lancamento.provento_desconto_id,
+            lancamento_fixo_origem__isnull=True,
+            lancamento_geral_origem__isnull=True,
+            justificativa__startswith='Lançamento fixo geral - ' if geral else 'Lançamento fixo - ',
+        )
+        if not geral:
+            sem_origem = sem_origem.filter(funcionario_id=lancamento.funcionario_id)
+        if sem_origem.exists():
+            logger.warning(
+                'Lançamento fixo %s não reaplicado à folha %s: há itens gerados sem origem registrada',
+                lancamento.pk, folha.periodo_referencia,
+            )
+            return 0
+        
+        # Funcionários da folha que devem ter o item
+        funcionarios = {}
+        aplicavel = not removido and getattr(lancamento, 'ativo', True) and vigente_no_periodo(
+            lancamento, *periodo_competencia(folha.mes, folha.ano)
+        )
+        if aplicavel:
+            funcionarios_folha = Funcionario.objects.filter(
+                pk__in=folha.contratos_ativos.values('funcionario_id')
+            ).only('pk', 'salario_base')
+            if not geral:
+                funcionarios_folha = funcionarios_folha.filter(pk=lancamento.funcionario_id)
+            funcionarios = {funcionario.pk: funcionario for funcionario in funcionarios_folha}
+        
+        existentes = {}
+        remover = []
+        for item in ItemFolha.objects.filter(evento_pagamento=evento, **origem).select_related('provento_desconto'):
+            if item.funcionario_id in existentes:
+                remover.append(item)
+            else:
+                existentes[item.funcionario_id] = item
+        
+        provento_desconto = lancamento.provento_desconto
+        justificativa = FolhaService._justificativa_lancamento(lancamento)
+        variacao = {'P': Decimal('0.00'), 'D': Decimal('0.00')}
+        novos, alterados = [], []
+        for funcionario_id, funcionario in funcionarios.items():
+            valor, base = FolhaService._calcular_valor_lancamento(lancamento, funcionario)
+            item = existentes.pop(funcionario_id, None)
             if valor <= 0:
+                if item:
+                    remover.append(item)
                 continue
             
-            ItemFolha.objects.create(
-                folha_pagamento=folha,
-                evento_pagamento=evento,
-                funcionario=funcionario,
-                provento_desconto=lancamento.provento_desconto,
-                valor_lancado=valor,
-                base_calculo=base,
-                justificativa=f'Lançamento fixo geral - {lancamento.observacoes}'
-            )
+            if item is None:
+                item = ItemFolha(
+                    folha_pagamento=folha,
+                    evento_pagamento=evento,
+                    funcionario_id=funcionario_id,
+                    **origem
+                )
+                novos.append(item)
+            elif (item.valor_lancado, item.base_calculo, item.provento_desconto_id, item.justificativa) == (
+                valor, base, provento_desconto.pk, justificativa
+            ):
+                continue
+            else:
+                variacao[item.provento_desconto.tipo] -= item.valor_lancado
+                alterados.append(item)
+            
+            item.provento_desconto = provento_desconto
+            item.valor_lancado = valor
+            item.base_calculo = base
+            item.justificativa = justificativa
+            variacao[provento_desconto.tipo] += valor
+        
+        remover.extend(existentes.values())
+        for item in remover:
+            variacao[item.provento_desconto.tipo] -= item.valor_lancado
+        
+        if not (novos or alterados or remover):
+            return 0
+        
+        agora = timezone.now()
+        for item in alterados:
+            item.updated_at = agora
+        ItemFolha.objects.bulk_create(novos, batch_size=FolhaService.BATCH_SIZE)
+        ItemFolha.objects.bulk_update(
+            alterados,
+            ['provento_desconto', 'valor_lancado', 'base_calculo', 'justificativa', 'updated_at'],
+            batch_size=FolhaService.BATCH_SIZE,
+        )
+        ItemFolha.objects.filter(pk__in=[item.pk for item in remover]).delete()
+        
+        FolhaService._ajustar_totais(evento, variacao['P'], variacao['D'])
+        FolhaService.recalcular_resumos(
+            folha, {item.funcionario_id for item in [*novos, *alterados, *remover]}
+        )
+        return len(novos) + len(alterados) + len(remover)
     
     @staticmethod
-    def _lancar_lancamentos_fixos(folha: FolhaPagamento, evento: EventoPagamento,
-                                   funcionario: Funcionario, data_inicio: date, data_fim: date):
-        """Lança todos os lançamentos fixos ativos do funcionário"""
-        from django.db.models import Q
+    def descontar_adiantamentos(evento: EventoPagamento) -> int:
+        """
+        Lança como desconto no evento os adiantamentos pendentes dos
+        funcionários da folha
         
-        # Para comparação correta: data_fim é o primeiro dia do mês seguinte,
-        # então usamos < ao invés de <= para excluir lançamentos que começam no mês seguinte
-        lancamentos = LancamentoFixo.objects.filter(
-            funcionario=funcionario,
-            data_inicio__lt=data_fim  # Alterado de __lte para __lt
-        ).filter(
-            Q(data_fim__isnull=True) | Q(data_fim__gte=data_inicio)
-        ).select_related('provento_desconto')
+        Os adiantamentos são buscados em uma consulta, os itens de desconto
+        gravados com bulk_create e os adiantamentos marcados como descontados
+        com UPDATE em lote; totais e resumos afetados são atualizados ao final.
         
-        for lancamento in lancamentos:
-            # Calcula o valor baseado no tipo de impacto
-            if lancamento.provento_desconto.impacto == 'F':
-                valor = lancamento.valor or Decimal('0')
-                base = None
-            else:  # Percentual
-                base = funcionario.salario_base
-                percentual = lancamento.percentual or Decimal('0')
-                valor = (base * percentual) / Decimal('100')
+        Args:
+            evento: Evento em rascunho que recebe os descontos
             
-            # Ignora lançamentos com valor zero
-            if valor <= 0:
-                continue
+        Returns:
+            int: Quantidade de adiantamentos descontados
+        """
+        if evento.status != 'R':
+            raise ValidationError('Apenas eventos em rascunho podem ser editados')
+        
+        folha = evento.folha_pagamento
+        batch_size = FolhaService.BATCH_SIZE
+        
+        with transaction.atomic():
+            adiantamentos = list(Adiantamento.objects.select_for_update().filter(
+                funcionario_id__in=folha.contratos_ativos.values('funcionario_id'),
+                status='P'
+            ).only('pk', 'funcionario_id', 'valor', 'data_adiantamento').order_by('pk'))
+            if not adiantamentos:
+                return 0
             
-            ItemFolha.objects.create(
-                folha_pagamento=folha,
-                evento_pagamento=evento,
-                funcionario=funcionario,
-                provento_desconto=lancamento.provento_desconto,
-                valor_lancado=valor,
-                base_calculo=base,
-                justificativa=f'Lançamento fixo - {lancamento.observacoes}'
+            desconto_adiantamento = FolhaService._obter_desconto_adiantamento()
+            itens = [
+                ItemFolha(
+                    folha_pagamento=folha,
+                    evento_pagamento=evento,
+                    funcionario_id=adiantamento.funcionario_id,
+                    provento_desconto=desconto_adiantamento,
+                    valor_lancado=adiantamento.valor,
+                    justificativa=f'Adiantamento de {adiantamento.data_adiantamento}',
+                    adiantamento_origem=adiantamento  # Link direto para rastreabilidade
+                )
+                for adiantamento in adiantamentos
+            ]
+            ItemFolha.objects.bulk_create(itens, batch_size=batch_size)
+            
+            ids = [adiantamento.pk for adiantamento in adiantamentos]
+            agora = timezone.now()
+            for inicio in range(0, len(ids), batch_size):
+                Adiantamento.objects.filter(pk__in=ids[inicio:inicio + batch_size]).update(
+                    status='D', updated_at=agora
+                )
+            
+            FolhaService._ajustar_totais(
+                evento,
+                Decimal('0.00'),
+                sum((item.valor_lancado for item in itens), Decimal('0.00'))
             )
+            FolhaService.recalcular_resumos(folha, {item.funcionario_id for item in itens})
+        
+        return len(adiantamentos)
     
     @staticmethod
-    def _lancar_adiantamentos(folha: FolhaPagamento, evento: EventoPagamento, funcionario: Funcionario):
-        """Lança adiantamentos pendentes como descontos na folha"""
-        adiantamentos_pendentes = Adiantamento.objects.filter(
-            funcionario=funcionario,
-            status='P'
-        )
+    def recalcular_resumos(folha: FolhaPagamento, funcionarios=None) -> int:
+        """
+        Reconstrói os resumos por funcionário da folha a partir dos itens
         
-        if not adiantamentos_pendentes.exists():
-            return
+        Os totais de todos os funcionários saem de uma única agregação
+        condicional agrupada por funcionário e são gravados com um upsert em
+        lote. Resumos de funcionários que ficaram sem itens são zerados.
         
-        # Busca ou cria o desconto de adiantamento
-        try:
-            desconto_adiantamento = ProventoDesconto.objects.get(
-                codigo_referencia='ADIANTAMENTO',
-                tipo='D'
-            )
-        except ProventoDesconto.DoesNotExist:
-            desconto_adiantamento = ProventoDesconto.objects.create(
-                nome='Adiantamento Salarial',
-                codigo_referencia='ADIANTAMENTO',
-                tipo='D',
-                impacto='F'
-            )
+        Args:
+            folha: Folha de pagamento
+            funcionarios: Restringe a reconstrução a estes funcionários
+                          (lista de instâncias/IDs ou QuerySet); None = todos
+            
+        Returns:
+            int: Quantidade de resumos gravados
+        """
+        itens = ItemFolha.objects.filter(folha_pagamento=folha)
+        resumos_existentes = ResumoFolhaFuncionario.objects.filter(folha_pagamento=folha)
+        if funcionarios is not None:
+            itens = itens.filter(funcionario__in=funcionarios)
+            resumos_existentes = resumos_existentes.filter(funcionario__in=funcionarios)
+        
+        totais = itens.values('funcionario_id').annotate(
+            proventos=Sum('valor_lancado', filter=Q(provento_desconto__tipo='P')),
+            descontos=Sum('valor_lancado', filter=Q(provento_desconto__tipo='D')),
+        ).order_by()
         
-        for adiantamento in adiantamentos_pendentes:
-            ItemFolha.objects.create(
+        resumos = []
+        for linha in totais:
+            proventos = linha['proventos'] or Decimal('0.00')
+            descontos = linha['descontos'] or Decimal('0.00')
+            resumos.append(ResumoFolhaFuncionario(
                 folha_pagamento=folha,
-                evento_pagamento=evento,
-                funcionario=funcionario,
-                provento_desconto=desconto_adiantamento,
-                valor_lancado=adiantamento.valor,
-                justificativa=f'Adiantamento de {adiantamento.data_adiantamento}',
-                adiantamento_origem=adiantamento  # Link direto para rastreabilidade
+                funcionario_id=linha['funcionario_id'],
+                total_proventos=proventos,
+                total_descontos=descontos,
+                valor_liquido=proventos - descontos,
+            ))
+        
+        with transaction.atomic():
+            ResumoFolhaFuncionario.objects.bulk_create(
+                resumos,
+                batch_size=FolhaService.BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['folha_pagamento', 'funcionario'],
+                update_fields=['total_proventos', 'total_descontos', 'valor_liquido'],
             )
-            
-            # Marca o adiantamento como descontado
-            adiantamento.status = 'D'
-            adiantamento.save()
+            resumos_existentes.exclude(
+                funcionario_id__in=itens.values('funcionario_id')
+            ).update(
+                total_proventos=Decimal('0.00'),
+                total_descontos=Decimal('0.00'),
+                valor_liquido=Decimal('0.00'),
+            )
+        
+        return len(resumos)
     
     @staticmethod
-    def _criar_resumo_funcionario(folha: FolhaPagamento, funcionario: Funcionario):
-        """Cria o resumo da folha para o funcionário"""
-        resumo, created = ResumoFolhaFuncionario.objects.get_or_create(
+    def _ajustar_resumo(folha: FolhaPagamento, funcionario: Funcionario,
+                        proventos: Decimal, descontos: Decimal):
+        """
+        Aplica a variação de um item ao resumo do funcionário, sem reagregar
+        
+        Se o funcionário ainda não tem resumo nesta folha, ele é criado a
+        partir dos itens existentes.
+        """
+        atualizados = ResumoFolhaFuncionario.objects.filter(
             folha_pagamento=folha,
             funcionario=funcionario
+        ).update(
+            total_proventos=F('total_proventos') + proventos,
+            total_descontos=F('total_descontos') + descontos,
+            valor_liquido=F('valor_liquido') + (proventos - descontos),
         )
-        resumo.calcular_totais()
+        
+        if not atualizados:
+            resumo, created = ResumoFolhaFuncionario.objects.get_or_create(
+                folha_pagamento=folha,
+                funcionario=funcionario
+            )
+            resumo.calcular_totais()
     
     @staticmethod
     def adicionar_item_manual(evento: EventoPagamento = None, folha: FolhaPagamento = None,
@@ -441,22 +1133,7 @@ class FolhaService:
         """
         # Compatibilidade: se folha foi passada mas evento não, busca/cria evento padrão
         if folha and not evento:
-            # Busca evento padrão existente
-            evento = folha.eventos.filter(tipo_evento='PF').first()
-            
-            # Se não existe, cria um evento padrão
-            if not evento:
-                import calendar
-                ultimo_dia = calendar.monthrange(folha.ano, folha.mes)[1]
-                data_evento = date(folha.ano, folha.mes, ultimo_dia)
-                
-                evento = EventoPagamento.objects.create(
-                    folha_pagamento=folha,
-                    tipo_evento='PF',
-                    descricao=f'Pagamento Final {folha.mes:02d}/{folha.ano}',
-                    data_evento=data_evento,
-                    status='R'
-                )
+            evento = FolhaService._obter_evento_padrao(folha)
         
         if not evento:
             raise ValidationError('Evento de pagamento não especificado')
@@ -464,22 +1141,221 @@ class FolhaService:
         if evento.status != 'R':
             raise ValidationError('Apenas eventos em rascunho podem ser editados')
         
-        item = ItemFolha.objects.create(
-            folha_pagamento=evento.folha_pagamento,
-            evento_pagamento=evento,
-            funcionario=funcionario,
-            provento_desconto=provento_desconto,
-            valor_lancado=valor,
-            justificativa=justificativa
-        )
+        # Item e totais armazenados mudam juntos ou não mudam
+        with operacao('adicionar_item_manual', evento=evento.pk), transaction.atomic():
+            with etapa('gravacao_item') as medicao:
+                item = ItemFolha.objects.create(
+                    folha_pagamento=evento.folha_pagamento,
+                    evento_pagamento=evento,
+                    funcionario=funcionario,
+                    provento_desconto=provento_desconto,
+                    valor_lancado=_decimal(valor),
+                    justificativa=justificativa
+                )
+                medicao.linhas = 1
+            
+            # Atualiza os totais do evento, da folha e o resumo do funcionário
+            with etapa('totais'):
+                proventos, descontos = FolhaService._variacao_item(item)
+                FolhaService._ajustar_totais(evento, proventos, descontos)
+                FolhaService._ajustar_resumo(evento.folha_pagamento, funcionario, proventos, descontos)
+        
+        return item
+    
+    @staticmethod
+    def _evento_padrao(folha: FolhaPagamento) -> EventoPagamento:
+        """
+        Evento de pagamento final (PF) padrão da folha, ou None se ainda não existir
+        
+        É o primeiro PF criado (o da geração), mesmo que outro PF da
+        competência tenha data anterior.
+        """
+        return folha.eventos.filter(tipo_evento='PF').order_by('pk').first()
+    
+    @staticmethod
+    def _obter_evento_padrao(folha: FolhaPagamento) -> EventoPagamento:
+        """Busca o evento de pagamento final (PF) da folha, criando-o se não existir"""
+        evento = FolhaService._evento_padrao(folha)
+        if not evento:
+            evento = EventoPagamento.objects.create(
+                folha_pagamento=folha,
+                tipo_evento='PF',
+                descricao=f'Pagamento Final {folha.mes:02d}/{folha.ano}',
+                data_evento=periodo_competencia(folha.mes, folha.ano)[1],
+                status='R'
+            )
+        return evento
+    
+    @staticmethod
+    def adicionar_itens_em_lote(provento_desconto: ProventoDesconto, lancamentos,
+                                evento: EventoPagamento = None, folha: FolhaPagamento = None,
+                                justificativa: str = '') -> int:
+        """
+        Adiciona um item por funcionário a um evento, em lote
         
-        # Atualiza o valor total do evento
-        evento.calcular_valor_total()
+        Equivale a chamar adicionar_item_manual para cada par, mas grava os
+        itens com bulk_create e atualiza os totais do evento/folha e os resumos
+        dos funcionários afetados uma única vez, ao final.
         
-        # Atualiza o resumo do funcionário
-        FolhaService._criar_resumo_funcionario(evento.folha_pagamento, funcionario)
+        Args:
+            provento_desconto: Provento ou desconto lançado
+            lancamentos: Pares (funcionario, valor)
+            evento: Evento de pagamento (preferencial)
+            folha: Folha de pagamento (usa/cria o evento padrão, como em adicionar_item_manual)
+            justificativa: Justificativa gravada em todos os itens
+            
+        Returns:
+            int: Quantidade de itens criados
+        """
+        with transaction.atomic():
+            if folha and not evento:
+                evento = FolhaService._obter_evento_padrao(folha)
+            
+            if not evento:
+                raise ValidationError('Evento de pagamento não especificado')
+            
+            if evento.status != 'R':
+                raise ValidationError('Apenas eventos em rascunho podem ser editados')
+            
+            itens = [
+                ItemFolha(
+                    folha_pagamento_id=evento.folha_pagamento_id,
+                    evento_pagamento=evento,
+                    funcionario=funcionario,
+                    provento_desconto=provento_desconto,
+                    valor_lancado=_decimal(valor).quantize(Decimal('0.01')),
+                    justificativa=justificativa
+                )
+                for funcionario, valor in lancamentos
+            ]
+            if not itens:
+                return 0
+            
+            ItemFolha.objects.bulk_create(itens, batch_size=FolhaService.BATCH_SIZE)
+            
+            total = sum((item.valor_lancado for item in itens), Decimal('0.00'))
+            if provento_desconto.tipo == 'P':
+                FolhaService._ajustar_totais(evento, total, Decimal('0.00'))
+            else:
+                FolhaService._ajustar_totais(evento, Decimal('0.00'), total)
+            FolhaService.recalcular_resumos(
+                evento.folha_pagamento, {item.funcionario_id for item in itens}
+            )
         
-        return item
+        return len(itens)
+    
+    @staticmethod
+    def gravar_itens_em_lote(evento: EventoPagamento, linhas: list) -> dict:
+        """
+        Inclui ou atualiza itens de um evento em lote (upsert)
+
+        Cada linha é identificada pelo par (funcionário, provento/desconto):
+        se o evento já tem um item com esse par, valor, base e justificativa
+        são atualizados; senão o item é criado. Linhas repetidas valem pela
+        última ocorrência. Itens gerados de lançamentos fixos ou adiantamentos
+        não são sobrescritos (a próxima sincronização os desfaria): a linha
+        que cairia em um deles recusa o lote inteiro. Os itens são gravados em lotes de BATCH_SIZE e os
+        totais do evento, da folha e dos resumos afetados são atualizados uma
+        única vez ao final.
+
+        Args:
+            evento: Evento de pagamento em rascunho
+            linhas: Dicts com 'funcionario_id', 'provento_desconto' (instância),
+                    'valor_lancado' e, opcionalmente, 'base_calculo' e 'justificativa'
+
+        Returns:
+            dict: Quantidade de itens 'criados' e 'atualizados'
+        """
+        if evento.status != 'R':
+            raise ValidationError('Apenas eventos em rascunho podem ser editados')
+
+        batch_size = FolhaService.BATCH_SIZE
+        por_chave = {
+            (linha['funcionario_id'], linha['provento_desconto'].pk): linha
+            for linha in linhas
+        }
+        funcionarios_ids = sorted({funcionario_id for funcionario_id, _ in por_chave})
+
+        with transaction.atomic():
+            existentes = {}
+            for inicio in range(0, len(funcionarios_ids), batch_size):
+                for item in ItemFolha.objects.filter(
+                    evento_pagamento=evento,
+                    funcionario_id__in=funcionarios_ids[inicio:inicio + batch_size],
+                ).only('pk', 'funcionario_id', 'provento_desconto_id', 'valor_lancado',
+                       'base_calculo', 'justificativa', *FolhaService._CAMPOS_ORIGEM).order_by('pk'):
+                    chave = (item.funcionario_id, item.provento_desconto_id)
+                    # Havendo item manual e gerado com o mesmo par, vale o manual
+                    atual = existentes.get(chave)
+                    if atual is None or (FolhaService._tem_origem(atual) and not FolhaService._tem_origem(item)):
+                        existentes[chave] = item
+
+            gerados = [
+                chave for chave in por_chave
+                if chave in existentes and FolhaService._tem_origem(existentes[chave])
+            ]
+            if gerados:
+                descricoes = ', '.join(
+                    f"funcionário {funcionario_id} / {por_chave[(funcionario_id, rubrica_id)]['provento_desconto'].codigo_referencia}"
+                    for funcionario_id, rubrica_id in gerados
+                )
+                raise ValidationError(
+                    'Itens gerados de lançamentos fixos ou adiantamentos só mudam pelo lançamento '
+                    f'de origem: {descricoes}'
+                )
+
+            agora = timezone.now()
+            novos, alterados = [], []
+            variacao = {'P': Decimal('0.00'), 'D': Decimal('0.00')}
+            for chave, linha in por_chave.items():
+                valor = _decimal(linha['valor_lancado']).quantize(Decimal('0.01'))
+                item = existentes.get(chave)
+                if item is None:
+                    item = ItemFolha(
+                        folha_pagamento_id=evento.folha_pagamento_id,
+                        evento_pagamento=evento,
+                        funcionario_id=linha['funcionario_id'],
+                        provento_desconto=linha['provento_desconto'],
+                    )
+                    novos.append(item)
+                    anterior = Decimal('0.00')
+                else:
+                    item.updated_at = agora
+                    alterados.append(item)
+                    anterior = item.valor_lancado
+                item.valor_lancado = valor
+                item.base_calculo = linha.get('base_calculo')
+                item.justificativa = linha.get('justificativa', '')
+                variacao[linha['provento_desconto'].tipo] += valor - anterior
+
+            ItemFolha.objects.bulk_create(novos, batch_size=batch_size)
+            ItemFolha.objects.bulk_update(
+                alterados,
+                ['valor_lancado', 'base_calculo', 'justificativa', 'updated_at'],
+                batch_size=batch_size,
+            )
+
+            FolhaService._ajustar_totais(evento, variacao['P'], variacao['D'])
+            if funcionarios_ids:
+                FolhaService.recalcular_resumos(evento.folha_pagamento, funcionarios_ids)
+
+        return {'criados': len(novos), 'atualizados': len(alterados)}
+
+    # Chaves estrangeiras que ligam um item gerado ao lançamento de origem
+    _CAMPOS_ORIGEM = ('lancamento_fixo_origem_id', 'lancamento_geral_origem_id', 'adiantamento_origem_id')
+
+    @staticmethod
+    def _tem_origem(item: ItemFolha) -> bool:
+        """Indica se o item foi gerado de um lançamento fixo ou adiantamento"""
+        return any(getattr(item, campo) for campo in FolhaService._CAMPOS_ORIGEM)
+
+    @staticmethod
+    def _variacao_item(item: ItemFolha):
+        """Retorna (proventos, descontos) com que o item contribui para os totais"""
+        valor = _decimal(item.valor_lancado).quantize(Decimal('0.01'))
+        if item.provento_desconto.tipo == 'P':
+            return valor, Decimal('0.00')
+        return Decimal('0.00'), valor
     
     @staticmethod
     def remover_item(item: ItemFolha):
@@ -491,13 +1367,13 @@ class FolhaService:
         if evento.status != 'R':
             raise ValidationError('Apenas eventos em rascunho podem ser editados')
         
-        item.delete()
-        
-        # Atualiza o valor total do evento
-        evento.calcular_valor_total()
-        
-        # Atualiza o resumo do funcionário
-        FolhaService._criar_resumo_funcionario(folha, funcionario)
+        proventos, descontos = FolhaService._variacao_item(item)
+        with transaction.atomic():
+            item.delete()
+            
+            # Atualiza os totais do evento, da folha e o resumo do funcionário
+            FolhaService._ajustar_totais(evento, -proventos, -descontos)
+            FolhaService._ajustar_resumo(folha, funcionario, -proventos, -descontos)
 
 
 class AdiantamentoService:
@@ -519,35 +1395,133 @@ class AdiantamentoService:
         Returns:
             int: Quantidade de adiantamentos criados
         """
-        if not valor and not percentual:
-            raise ValidationError('Informe um valor fixo ou percentual')
-        
         if not data_adiantamento:
             data_adiantamento = date.today()
         
-        # Busca funcionários com base nos filtros
-        funcionarios = Funcionario.objects.filter(**filtros)
+        return AdiantamentoService.lancar_em_lote(
+            Funcionario.objects.filter(**filtros),
+            data_adiantamento,
+            valor=valor,
+            percentual=percentual,
+            observacoes='Adiantamento lançado em massa'
+        )['quantidade']
+    
+    @staticmethod
+    def lancar_em_lote(funcionarios, data_adiantamento: date, valor: Decimal = None,
+                       percentual: Decimal = None, observacoes: str = '') -> dict:
+        """
+        Cria um adiantamento pendente para cada funcionário do QuerySet
+        
+        Os funcionários são lidos em uma consulta (só ID e salário), os valores
+        são calculados em memória e os adiantamentos gravados com bulk_create.
+        
+        Args:
+            funcionarios: QuerySet de funcionários já filtrado
+            data_adiantamento: Data dos adiantamentos
+            valor: Valor fixo por funcionário (se None, usa percentual)
+            percentual: Percentual do salário base (se None, usa valor)
+            observacoes: Observação gravada em todos os adiantamentos
+            
+        Returns:
+            dict: 'quantidade' de adiantamentos criados e 'valor_total' lançado
+        """
+        if not valor and not percentual:
+            raise ValidationError('Informe um valor fixo ou percentual')
+        valor, percentual = _decimal(valor), _decimal(percentual)
+        
+        adiantamentos = []
+        for funcionario_id, salario_base in funcionarios.values_list('pk', 'salario_base').order_by():
+            if valor:
+                valor_adiantamento = valor
+            else:
+                valor_adiantamento = (salario_base * percentual) / Decimal('100')
+            adiantamentos.append(Adiantamento(
+                funcionario_id=funcionario_id,
+                data_adiantamento=data_adiantamento,
+                valor=valor_adiantamento.quantize(Decimal('0.01')),
+                status='P',
+                observacoes=observacoes,
+            ))
         
-        count = 0
         with transaction.atomic():
-            for funcionario in funcionarios:
-                # Calcula o valor do adiantamento
-                if valor:
-                    valor_adiantamento = valor
-                else:
-                    valor_adiantamento = (funcionario.salario_base * percentual) / Decimal('100')
-                
-                Adiantamento.objects.create(
-                    funcionario=funcionario,
-                    data_adiantamento=data_adiantamento,
-                    valor=valor_adiantamento,
-                    status='P',
-                    observacoes='Adiantamento lançado em massa'
-                )
-                count += 1
+            Adiantamento.objects.bulk_create(adiantamentos, batch_size=FolhaService.BATCH_SIZE)
         
-        return count
+        return {
+            'quantidade': len(adiantamentos),
+            'valor_total': sum((a.valor for a in adiantamentos), Decimal('0.00')),
+        }
 
 
 # Import necessário para Q objects
 from django.db import models
+
+
+# ==================== GERAÇÃO EM PARALELO ====================
+
+# Campos de ItemFolha que o cálculo preenche, devolvidos pelos processos como
+# valores simples para não serializar as instâncias relacionadas
+_CAMPOS_ITEM_CALCULADO = (
+    'funcionario_id', 'provento_desconto_id', 'valor_lancado', 'base_calculo', 'justificativa',
+    'lancamento_geral_origem_id', 'lancamento_fixo_origem_id', 'adiantamento_origem_id',
+)
+
+
+def _calcular_lote(funcionarios: list, dados: dict) -> list:
+    """Calcula os itens de um lote de funcionários (executado nos processos do pool)"""
+    return [
+        {campo: getattr(item, campo) for campo in _CAMPOS_ITEM_CALCULADO}
+        for item in FolhaService._calcular_itens(funcionarios, dados)
+    ]
+
+
+def _calcular_lotes(lotes: list, processos: int) -> list:
+    """
+    Calcula os lotes em um pool de processos, refazendo os que o pool perdeu
+    
+    Um processo que morre (falta de memória, kill) quebra o pool inteiro: os
+    lotes ainda sem resultado são recalculados em um pool novo, até
+    TENTATIVAS_LOTE vezes. Um erro do próprio cálculo se repetiria em toda
+    tentativa e é propagado na hora.
+    
+    Args:
+        lotes: Pares (funcionários, dados do lote)
+        processos: Tamanho máximo do pool
+        
+    Returns:
+        list: Campos dos itens calculados de cada lote, na ordem dos lotes
+    """
+    resultados = [None] * len(lotes)
+    pendentes = list(range(len(lotes)))
+    
+    for tentativa in range(1, FolhaService.TENTATIVAS_LOTE + 1):
+        # Os processos filhos não usam o banco; fora de uma transação, as
+        # conexões são fechadas antes do fork para que nenhum deles herde (e
+        # encerre) o socket do pai
+        if not connection.in_atomic_block:
+            connections.close_all()
+        
+        falha = None
+        with ProcessPoolExecutor(max_workers=min(processos, len(pendentes)), initializer=django.setup) as pool:
+            futuros = {indice: pool.submit(_calcular_lote, *lotes[indice]) for indice in pendentes}
+            for indice, futuro in futuros.items():
+                try:
+                    resultados[indice] = futuro.result()
+                except BrokenProcessPool as e:
+                    falha = e
+                except BaseException:
+                    for outro in futuros.values():
+                        outro.cancel()
+                    raise
+        
+        pendentes = [indice for indice in pendentes if resultados[indice] is None]
+        if not pendentes:
+            return resultados
+        logger.warning(
+            'Geração em paralelo: %d de %d lote(s) perdidos na tentativa %d: %s',
+            len(pendentes), len(lotes), tentativa, falha,
+        )
+    
+    raise ValidationError(
+        f'{len(pendentes)} lote(s) da geração perdidos após {FolhaService.TENTATIVAS_LOTE} '
+        f'tentativa(s): {falha}'
+    )
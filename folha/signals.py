@@ -0,0 +1,25 @@
+"""
+Signals para o app Folha de Pagamento
+"""
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import LancamentoFixoGeral
+from funcionarios.models import LancamentoFixo
+from .services import FolhaService
+
+
+@receiver(post_save, sender=LancamentoFixoGeral)
+@receiver(post_save, sender=LancamentoFixo)
+def reaplicar_lancamento_fixo(sender, instance, raw=False, **kwargs):
+    """Reaplica às folhas em rascunho o lançamento fixo criado ou alterado"""
+    if raw:
+        return
+    FolhaService.sincronizar_lancamento_fixo(instance)
+
+
+@receiver(pre_delete, sender=LancamentoFixoGeral)
+@receiver(pre_delete, sender=LancamentoFixo)
+def remover_itens_lancamento_fixo(sender, instance, **kwargs):
+    """Retira das folhas em rascunho os itens do lançamento fixo excluído"""
+    FolhaService.sincronizar_lancamento_fixo(instance, removido=True)
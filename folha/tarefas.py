@@ -0,0 +1,289 @@
+"""
+Tarefas em segundo plano - fila apoiada no banco de dados
+
+As views apenas enfileiram uma TarefaFolha e retornam; o comando
+`python manage.py processar_tarefas` consome a fila, executa a operação e
+registra status, progresso e resultado, consultados pela tela de
+acompanhamento da tarefa.
+"""
+import tempfile
+from decimal import Decimal
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .instrumentacao import acompanhar_etapas
+from .models import FolhaPagamento, TarefaFolha
+from .services import FolhaService
+
+
+class TarefaService:
+    """Service para enfileiramento e execução de tarefas em segundo plano"""
+
+    @staticmethod
+    def enfileirar(tipo: str, parametros: dict = None, folha: FolhaPagamento = None,
+                   usuario=None) -> TarefaFolha:
+        """
+        Enfileira uma nova tarefa
+
+        Args:
+            tipo: Tipo da tarefa (GF, AD, 13, XP, XE, XH)
+            parametros: Parâmetros serializáveis em JSON (datas/decimais como texto)
+            folha: Folha de pagamento relacionada (quando houver)
+            usuario: Usuário que solicitou a tarefa
+
+        Returns:
+            TarefaFolha: Tarefa pendente criada
+        """
+        if tipo not in EXECUTORES:
+            raise ValidationError(f'Tipo de tarefa desconhecido: {tipo}')
+
+        return TarefaFolha.objects.create(
+            tipo=tipo,
+            parametros=parametros or {},
+            folha_pagamento=folha,
+            solicitado_por=usuario if usuario and usuario.is_authenticated else None,
+        )
+
+    @staticmethod
+    def visiveis(usuario):
+        """Tarefas que o usuário pode acompanhar: as que solicitou (a equipe vê todas)"""
+        tarefas = TarefaFolha.objects.all()
+        if not usuario.is_staff:
+            tarefas = tarefas.filter(solicitado_por=usuario)
+        return tarefas
+
+    @staticmethod
+    def encerrar_abandonadas() -> int:
+        """
+        Marca como falha as tarefas em execução sem sinal de vida há mais de FOLHA_TAREFA_TEMPO_LIMITE
+
+        Cada atualizar_progresso renova updated_at, que serve de pulsação:
+        uma tarefa longa que ainda informa progresso não é encerrada; a que
+        parou de pulsar teve o processo que a executava interrompido. Não é
+        recolocada na fila: a operação pode ter sido concluída em parte, e
+        quem a solicitou decide se a repete.
+
+        Returns:
+            int: Quantidade de tarefas encerradas
+        """
+        limite = getattr(settings, 'FOLHA_TAREFA_TEMPO_LIMITE', 0)
+        if not limite:
+            return 0
+
+        agora = timezone.now()
+        return TarefaFolha.objects.filter(
+            status='E',
+            updated_at__lt=agora - timedelta(seconds=limite),
+        ).update(
+            status='F',
+            erro=f'Sem sinal do processamento há mais de {limite}s; o processo foi interrompido',
+            mensagem='Falha no processamento',
+            concluido_em=agora,
+            updated_at=agora,
+        )
+
+    @staticmethod
+    def reservar_proxima() -> TarefaFolha:
+        """
+        Reserva a tarefa pendente mais antiga para execução
+
+        A reserva é um UPDATE condicional no status, de modo que dois
+        processos consumindo a fila nunca executam a mesma tarefa. Antes,
+        as tarefas abandonadas são encerradas (ver encerrar_abandonadas).
+
+        Returns:
+            TarefaFolha: Tarefa reservada ou None se a fila estiver vazia
+        """
+        TarefaService.encerrar_abandonadas()
+        pendentes = TarefaFolha.objects.filter(status='P').order_by('created_at', 'pk')
+
+        for tarefa_id in pendentes.values_list('pk', flat=True)[:10]:
+            reservada = TarefaFolha.objects.filter(pk=tarefa_id, status='P').update(
+                status='E',
+                iniciado_em=timezone.now(),
+                updated_at=timezone.now(),
+            )
+            if reservada:
+                return TarefaFolha.objects.get(pk=tarefa_id)
+
+        return None
+
+    @staticmethod
+    def executar(tarefa: TarefaFolha) -> TarefaFolha:
+        """Executa uma tarefa já reservada e registra o resultado ou a falha"""
+        try:
+            resultado = EXECUTORES[tarefa.tipo](tarefa) or {}
+        except Exception as e:
+            tarefa.status = 'F'
+            tarefa.erro = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+            tarefa.mensagem = 'Falha no processamento'
+        else:
+            tarefa.status = 'C'
+            tarefa.resultado = resultado
+            tarefa.progresso = 100
+            tarefa.mensagem = 'Concluída'
+
+        tarefa.concluido_em = timezone.now()
+        tarefa.save(update_fields=[
+            'status', 'erro', 'resultado', 'progresso', 'mensagem',
+            'folha_pagamento', 'arquivo', 'concluido_em', 'updated_at',
+        ])
+        return tarefa
+
+    @staticmethod
+    def processar_pendentes(limite: int = None) -> int:
+        """
+        Executa tarefas pendentes até esvaziar a fila (ou atingir o limite)
+
+        Returns:
+            int: Quantidade de tarefas executadas
+        """
+        executadas = 0
+        while limite is None or executadas < limite:
+            tarefa = TarefaService.reservar_proxima()
+            if tarefa is None:
+                break
+            TarefaService.executar(tarefa)
+            executadas += 1
+        return executadas
+
+
+# ==================== EXECUTORES ====================
+
+# Progresso da geração ao fim de cada etapa de FolhaService.gerar_folha
+PROGRESSO_GERACAO = {
+    'contratos': (15, 'Contratos carregados'),
+    'carga_competencia': (30, 'Lançamentos da competência carregados'),
+    'calculo_itens': (70, 'Itens calculados'),
+    'calculo_lotes': (70, 'Itens calculados'),
+    'publicacao': (95, 'Folha gravada'),
+}
+
+
+def _executar_gerar_folha(tarefa: TarefaFolha) -> dict:
+    """Gera a folha da competência informada"""
+    mes = int(tarefa.parametros['mes'])
+    ano = int(tarefa.parametros['ano'])
+
+    def acompanhar(operacao, etapa):
+        if operacao == 'gerar_folha' and etapa['nome'] in PROGRESSO_GERACAO:
+            progresso, mensagem = PROGRESSO_GERACAO[etapa['nome']]
+            tarefa.atualizar_progresso(progresso, f'{mensagem} ({mes:02d}/{ano})')
+
+    tarefa.atualizar_progresso(10, f'Gerando folha {mes:02d}/{ano}')
+    with acompanhar_etapas(acompanhar):
+        folha = FolhaService.gerar_folha(mes, ano)
+    tarefa.folha_pagamento = folha
+
+    return {
+        'folha_id': folha.pk,
+        'funcionarios': folha.resumos.count(),
+    }
+
+
+def _executar_evento_adiantamento(tarefa: TarefaFolha) -> dict:
+    """Cria o evento de adiantamento massivo"""
+    parametros = tarefa.parametros
+
+    tarefa.atualizar_progresso(10, 'Lançando adiantamentos')
+    evento = FolhaService.criar_evento_adiantamento_massivo(
+        folha=tarefa.folha_pagamento,
+        descricao=parametros['descricao'],
+        data_evento=date.fromisoformat(parametros['data_evento']),
+        filtros=parametros.get('filtros') or {},
+        valor=_decimal_ou_none(parametros.get('valor')),
+        percentual=_decimal_ou_none(parametros.get('percentual')),
+    )
+
+    return {
+        'evento_id': evento.pk,
+        'valor_total': str(evento.valor_total),
+    }
+
+
+def _executar_evento_decimo_terceiro(tarefa: TarefaFolha) -> dict:
+    """Cria o evento de 13º salário"""
+    parametros = tarefa.parametros
+
+    tarefa.atualizar_progresso(10, 'Lançando 13º salário')
+    evento = FolhaService.criar_evento_decimo_terceiro(
+        folha=tarefa.folha_pagamento,
+        descricao=parametros['descricao'],
+        data_evento=date.fromisoformat(parametros['data_evento']),
+        parcela=int(parametros['parcela']),
+    )
+
+    return {
+        'evento_id': evento.pk,
+        'valor_total': str(evento.valor_total),
+    }
+
+
+def _executar_exportacao(tarefa: TarefaFolha) -> dict:
+    """Gera o arquivo PDF ou Excel da folha e o anexa à tarefa"""
+    from .exports import FolhaPagamentoExporter
+
+    folha = tarefa.folha_pagamento
+    exporter = FolhaPagamentoExporter(folha)
+
+    tarefa.atualizar_progresso(10, 'Gerando arquivo')
+    if tarefa.tipo == 'XP':
+        filename = f'folha_pagamento_{folha.ano}_{folha.mes:02d}.pdf'
+        buffer = exporter.export_pdf()
+        tarefa.arquivo.save(filename, ContentFile(buffer.getvalue()), save=False)
+    else:
+        # A planilha é gravada em arquivo temporário e copiada em blocos
+        filename = f'folha_pagamento_{folha.ano}_{folha.mes:02d}.xlsx'
+        with tempfile.TemporaryFile() as arquivo:
+            exporter.export_excel(arquivo)
+            tarefa.arquivo.save(filename, File(arquivo), save=False)
+
+    return {'arquivo': filename}
+
+
+def _executar_exportacao_holerites(tarefa: TarefaFolha) -> dict:
+    """Gera todos os holerites da folha em um ZIP ou em um PDF único"""
+    from .exports import HoleritesLoteExporter
+
+    folha = tarefa.folha_pagamento
+    formato = tarefa.parametros.get('formato', 'zip')
+
+    def acompanhar(prontos, total):
+        # De 10% a 90%, gravando só a cada 5 pontos
+        progresso = 10 + 80 * prontos // total
+        if progresso - tarefa.progresso >= 5 or prontos == total:
+            tarefa.atualizar_progresso(progresso, f'Gerando holerites ({prontos}/{total})')
+
+    exporter = HoleritesLoteExporter(folha, progresso=acompanhar)
+
+    tarefa.atualizar_progresso(10, 'Gerando holerites')
+    filename = f'holerites_{folha.ano}_{folha.mes:02d}.{formato}'
+    with tempfile.TemporaryFile() as arquivo:
+        if formato == 'pdf':
+            exporter.export_pdf(arquivo)
+        else:
+            exporter.export_zip(arquivo)
+        tarefa.arquivo.save(filename, File(arquivo), save=False)
+
+    return {'arquivo': filename}
+
+
+def _decimal_ou_none(valor):
+    """Converte o texto serializado de volta para Decimal"""
+    if valor in (None, ''):
+        return None
+    return Decimal(valor)
+
+
+EXECUTORES = {
+    'GF': _executar_gerar_folha,
+    'AD': _executar_evento_adiantamento,
+    '13': _executar_evento_decimo_terceiro,
+    'XP': _executar_exportacao,
+    'XE': _executar_exportacao,
+    'XH': _executar_exportacao_holerites,
+}
@@ -1,15 +1,35 @@
 """
 Testes para o app Folha de Pagamento
 """
-from django.test import TestCase
+import importlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import StringIO
+from unittest import mock
+import openpyxl
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
-from datetime import date
+from django.db import connection, models
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, timedelta
 from decimal import Decimal
+from rest_framework.test import APIClient
+from validate_docbr import CPF
 
-from core.models import Setor, Funcao, TipoContrato, ProventoDesconto
+from core.models import Setor, Funcao, TipoContrato, ProventoDesconto, LancamentoFixoGeral
 from funcionarios.models import Funcionario, Contrato, LancamentoFixo, Adiantamento
-from folha.models import FolhaPagamento, ItemFolha, ResumoFolhaFuncionario
-from folha.services import FolhaService, AdiantamentoService
+from folha.instrumentacao import ColetorRelatorios, operacao, registrar_hook, remover_hook
+from folha.models import EventoPagamento, FolhaPagamento, ItemFolha, ResumoFolhaFuncionario, TarefaFolha, totalizar_itens
+from folha.services import FolhaService, AdiantamentoService, _calcular_lote
+from folha.tarefas import TarefaService
 
 
 class FolhaPagamentoModelTest(TestCase):
@@ -70,7 +90,7 @@ class FolhaServiceTest(TestCase):
         
         self.funcionario = Funcionario.objects.create(
             nome_completo='João Silva',
-            cpf='12345678901',
+            cpf='12345678909',
             data_admissao=date(2023, 1, 1),
             funcao=self.funcao,
             setor=self.setor,
@@ -183,7 +203,7 @@ class AdiantamentoServiceTest(TestCase):
         
         self.funcionario1 = Funcionario.objects.create(
             nome_completo='João Silva',
-            cpf='12345678901',
+            cpf='12345678909',
             data_admissao=date(2023, 1, 1),
             funcao=funcao,
             setor=setor,
@@ -228,3 +248,1289 @@ class AdiantamentoServiceTest(TestCase):
         
         adiantamento2 = Adiantamento.objects.get(funcionario=self.funcionario2)
         self.assertEqual(adiantamento2.valor, Decimal('800.00'))  # 20% de 4000
+
+
+class DadosFolhaMixin:
+    """Cadastros comuns aos testes de geração em lote"""
+
+    def setUp(self):
+        self.setor = Setor.objects.create(nome='TI')
+        self.funcao = Funcao.objects.create(nome='Desenvolvedor')
+        self.tipo_contrato = TipoContrato.objects.create(nome='CLT')
+        ProventoDesconto.objects.create(
+            nome='Salário Base',
+            codigo_referencia='SALARIO',
+            tipo='P',
+            impacto='F'
+        )
+        ProventoDesconto.objects.create(
+            nome='Adiantamento Salarial',
+            codigo_referencia='ADIANTAMENTO',
+            tipo='D',
+            impacto='F'
+        )
+        self.plano_saude = ProventoDesconto.objects.create(
+            nome='Plano de Saúde',
+            codigo_referencia='PLANO',
+            tipo='D',
+            impacto='P'
+        )
+        LancamentoFixoGeral.objects.create(
+            provento_desconto=self.plano_saude,
+            percentual=Decimal('10.00'),
+            data_inicio=date(2023, 1, 1)
+        )
+
+    def _criar_funcionarios(self, quantidade, inicio=0):
+        cpf = CPF()
+        funcionarios = []
+        for i in range(inicio, inicio + quantidade):
+            funcionario = Funcionario.objects.create(
+                nome_completo=f'Funcionário {i:03d}',
+                cpf=cpf.generate(),
+                data_admissao=date(2023, 1, 1),
+                funcao=self.funcao,
+                setor=self.setor,
+                salario_base=Decimal('1000.00') * (i + 1)
+            )
+            Contrato.objects.create(
+                funcionario=funcionario,
+                tipo_contrato=self.tipo_contrato,
+                data_inicio=date(2023, 1, 1),
+                carga_horaria=40
+            )
+            Adiantamento.objects.create(
+                funcionario=funcionario,
+                data_adiantamento=date(2024, 1, 15),
+                valor=Decimal('100.00')
+            )
+            funcionarios.append(funcionario)
+        return funcionarios
+
+
+class GerarFolhaEmLoteTest(DadosFolhaMixin, TestCase):
+    """Testes da geração em lote da folha (consultas constantes)"""
+
+    def test_gerar_folha_calcula_itens_e_resumos(self):
+        """Testa os itens, resumos e total do evento gerados em lote"""
+        funcionarios = self._criar_funcionarios(3)
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+        self.assertEqual(folha.itens.count(), 9)
+        self.assertFalse(Adiantamento.objects.filter(status='P').exists())
+
+        resumo = folha.resumos.get(funcionario=funcionarios[1])
+        self.assertEqual(resumo.total_proventos, Decimal('2000.00'))
+        self.assertEqual(resumo.total_descontos, Decimal('300.00'))
+        self.assertEqual(resumo.valor_liquido, Decimal('1700.00'))
+
+        evento = folha.eventos.get(tipo_evento='PF')
+        self.assertEqual(evento.valor_total, Decimal('5100.00'))
+        self.assertEqual(evento.valor_total, evento.total_liquido)
+
+    def test_gerar_folha_consultas_constantes(self):
+        """O número de consultas não depende da quantidade de funcionários"""
+        self._criar_funcionarios(2)
+        with CaptureQueriesContext(connection) as poucos:
+            FolhaService.gerar_folha(mes=1, ano=2024)
+
+        self._criar_funcionarios(8, inicio=2)
+        with CaptureQueriesContext(connection) as muitos:
+            FolhaService.gerar_folha(mes=2, ano=2024)
+
+        self.assertEqual(len(poucos), len(muitos))
+
+    def test_evento_adiantamento_massivo_em_lote(self):
+        """Testa o evento de adiantamento com os adiantamentos gravados em lote"""
+        self._criar_funcionarios(2)
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+        with CaptureQueriesContext(connection) as poucos:
+            FolhaService.criar_evento_adiantamento_massivo(
+                folha, 'Quinzena 1', date(2024, 1, 15), filtros={'status': 'A'}, percentual=Decimal('40')
+            )
+
+        self._criar_funcionarios(8, inicio=2)
+        folha = FolhaService.gerar_folha(mes=2, ano=2024)
+        with CaptureQueriesContext(connection) as muitos:
+            evento = FolhaService.criar_evento_adiantamento_massivo(
+                folha, 'Quinzena 2', date(2024, 2, 15), filtros={'status': 'A'}, percentual=Decimal('40')
+            )
+
+        self.assertEqual(len(poucos), len(muitos))
+        # 40% de 1000 + 2000 + ... + 10000
+        self.assertEqual(evento.valor_total, Decimal('22000.00'))
+        self.assertEqual(Adiantamento.objects.filter(data_adiantamento=date(2024, 2, 15)).count(), 10)
+
+        resumo = AdiantamentoService.lancar_em_lote(
+            Funcionario.objects.filter(pk__in=[f.pk for f in Funcionario.objects.all()[:3]]),
+            date(2024, 2, 20),
+            valor=Decimal('99.999')
+        )
+        self.assertEqual(resumo, {'quantidade': 3, 'valor_total': Decimal('300.00')})
+
+    def test_valores_float_convertidos_pelo_texto(self):
+        """Testa que valor e percentual em float não carregam o erro binário"""
+        self._criar_funcionarios(2)
+        funcionarios = Funcionario.objects.order_by('pk')
+
+        # Decimal(2.675) == 2.67499999..., que arredondaria para 2.67
+        resumo = AdiantamentoService.lancar_em_lote(funcionarios, date(2024, 1, 15), valor=2.675)
+        self.assertEqual(resumo['valor_total'], Decimal('5.36'))
+
+        resumo = AdiantamentoService.lancar_em_lote(funcionarios, date(2024, 1, 20), percentual=12.5)
+        # 12,5% de 1000 + 2000
+        self.assertEqual(resumo['valor_total'], Decimal('375.00'))
+
+    def test_fechar_evento_desconta_adiantamentos_em_lote(self):
+        """Testa o desconto dos adiantamentos pendentes ao fechar o evento PF"""
+        def lancar_e_fechar(mes):
+            folha = FolhaService.gerar_folha(mes=mes, ano=2024)
+            AdiantamentoService.lancar_adiantamento_massivo(
+                {'status': 'A'}, valor=Decimal('50.00'), data_adiantamento=date(2024, mes, 20)
+            )
+            evento = folha.eventos.get(tipo_evento='PF')
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(reverse('folha:evento_fechar', args=[evento.pk]))
+            self.assertRedirects(response, reverse('folha:detail', args=[folha.pk]))
+            return folha, len(consultas)
+
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        self._criar_funcionarios(2)
+        _, poucos = lancar_e_fechar(1)
+        funcionarios = self._criar_funcionarios(6, inicio=2)
+        folha, muitos = lancar_e_fechar(2)
+
+        self.assertEqual(poucos, muitos)
+        self.assertFalse(Adiantamento.objects.filter(status='P').exists())
+        resumo = folha.resumos.get(funcionario=funcionarios[0])
+        # Salário 3000, plano 10% e adiantamentos de 100 (dia 15) e 50 (dia 20)
+        self.assertEqual(resumo.total_descontos, Decimal('450.00'))
+        folha.refresh_from_db()
+        self.assertEqual(folha.eventos.get().status, 'F')
+        self.assertEqual(folha.total_descontos, totalizar_itens(folha.itens.all())['total_descontos'])
+
+
+class TarefaServiceTest(TestCase):
+    """Testes da fila de tarefas em segundo plano"""
+
+    def setUp(self):
+        setor = Setor.objects.create(nome='TI')
+        funcao = Funcao.objects.create(nome='Desenvolvedor')
+        tipo_contrato = TipoContrato.objects.create(nome='CLT')
+        funcionario = Funcionario.objects.create(
+            nome_completo='João Silva',
+            cpf='12345678909',
+            data_admissao=date(2023, 1, 1),
+            funcao=funcao,
+            setor=setor,
+            salario_base=Decimal('5000.00')
+        )
+        Contrato.objects.create(
+            funcionario=funcionario,
+            tipo_contrato=tipo_contrato,
+            data_inicio=date(2023, 1, 1),
+            carga_horaria=40
+        )
+        self.user = User.objects.create_user('rh', password='senha')
+
+    def test_gerar_folha_em_segundo_plano(self):
+        """Testa a geração da folha pela fila"""
+        tarefa = TarefaService.enfileirar('GF', {'mes': 1, 'ano': 2024})
+        self.assertEqual(tarefa.status, 'P')
+
+        self.assertEqual(TarefaService.processar_pendentes(), 1)
+
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'C')
+        self.assertEqual(tarefa.progresso, 100)
+        self.assertEqual(tarefa.folha_pagamento.periodo_referencia, '01/2024')
+        self.assertEqual(tarefa.resultado['funcionarios'], 1)
+
+    def test_tarefa_com_erro_registra_falha(self):
+        """Testa que erros de validação ficam registrados na tarefa"""
+        FolhaPagamento.objects.create(mes=1, ano=2024)
+        tarefa = TarefaService.enfileirar('GF', {'mes': 1, 'ano': 2024})
+
+        TarefaService.processar_pendentes()
+
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'F')
+        self.assertIn('Já existe', tarefa.erro)
+
+    def test_tarefa_reservada_uma_unica_vez(self):
+        """Testa que uma tarefa em execução não é reservada novamente"""
+        TarefaService.enfileirar('GF', {'mes': 1, 'ano': 2024})
+        self.assertIsNotNone(TarefaService.reservar_proxima())
+        self.assertIsNone(TarefaService.reservar_proxima())
+
+    def _progressos(self, tipo, parametros, folha=None):
+        """Executa a tarefa registrando os valores de progresso gravados"""
+        progressos = []
+        original = TarefaFolha.atualizar_progresso
+
+        def registrar(tarefa, progresso, mensagem=''):
+            progressos.append(progresso)
+            original(tarefa, progresso, mensagem)
+
+        tarefa = TarefaService.enfileirar(tipo, parametros, folha=folha)
+        with mock.patch.object(TarefaFolha, 'atualizar_progresso', registrar):
+            TarefaService.processar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'C')
+        return progressos
+
+    def test_progresso_acompanha_etapas_da_geracao(self):
+        """Testa que o progresso da geração avança a cada etapa"""
+        self.assertEqual(self._progressos('GF', {'mes': 1, 'ano': 2024}), [10, 15, 30, 70, 95])
+
+    @override_settings(FOLHA_HOLERITE_PROCESSOS=1)
+    def test_progresso_acompanha_holerites(self):
+        """Testa que a exportação de holerites informa o progresso por holerite"""
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            self.assertEqual(self._progressos('XH', {'formato': 'zip'}, folha=folha), [10, 90])
+
+    def test_tarefa_abandonada_e_encerrada(self):
+        """Testa que só a tarefa em execução sem pulsação recente é marcada como falha"""
+        abandonada = TarefaService.enfileirar('GF', {'mes': 1, 'ano': 2024})
+        longa = TarefaService.enfileirar('GF', {'mes': 2, 'ano': 2024})
+        duas_horas = timezone.now() - timedelta(hours=2)
+        TarefaFolha.objects.filter(pk__in=[abandonada.pk, longa.pk]).update(
+            status='E', iniciado_em=duas_horas, updated_at=duas_horas,
+        )
+        # A tarefa longa continua informando progresso
+        longa.atualizar_progresso(60, 'Calculando')
+
+        self.assertIsNone(TarefaService.reservar_proxima())
+
+        abandonada.refresh_from_db()
+        longa.refresh_from_db()
+        self.assertEqual(abandonada.status, 'F')
+        self.assertIn('Sem sinal', abandonada.erro)
+        self.assertIsNotNone(abandonada.concluido_em)
+        self.assertEqual(longa.status, 'E')
+
+    @override_settings(FOLHA_TAREFA_TEMPO_LIMITE=0)
+    def test_tempo_limite_desativado(self):
+        """Testa que, com o tempo limite zerado, nenhuma tarefa é encerrada"""
+        tarefa = TarefaService.enfileirar('GF', {'mes': 1, 'ano': 2024})
+        dois_dias = timezone.now() - timedelta(days=2)
+        TarefaFolha.objects.filter(pk=tarefa.pk).update(status='E', iniciado_em=dois_dias, updated_at=dois_dias)
+
+        self.assertEqual(TarefaService.encerrar_abandonadas(), 0)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'E')
+
+    def test_tarefa_visivel_so_para_quem_solicitou(self):
+        """Testa que outro usuário não vê nem baixa a tarefa; a equipe vê"""
+        tarefa = TarefaService.enfileirar('XE', folha=FolhaPagamento.objects.create(mes=1, ano=2024), usuario=self.user)
+        TarefaFolha.objects.filter(pk=tarefa.pk).update(status='C', arquivo='tarefas/folha.xlsx')
+        urls = [reverse(f'folha:tarefa_{nome}', args=[tarefa.pk]) for nome in ('detail', 'status', 'download')]
+
+        self.client.force_login(User.objects.create_user('outro', password='senha'))
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(urls[1]).status_code, 200)
+        self.client.force_login(User.objects.create_user('gestor', password='senha', is_staff=True))
+        self.assertEqual(self.client.get(urls[0]).status_code, 200)
+
+    def test_view_gerar_enfileira_e_status(self):
+        """Testa que a view retorna imediatamente e o status é consultável"""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('folha:gerar'), {'mes': 1, 'ano': 2024})
+
+        tarefa = TarefaFolha.objects.get()
+        self.assertRedirects(response, reverse('folha:tarefa_detail', args=[tarefa.pk]))
+        self.assertFalse(FolhaPagamento.objects.exists())
+
+        TarefaService.processar_pendentes()
+        status = self.client.get(reverse('folha:tarefa_status', args=[tarefa.pk])).json()
+        self.assertTrue(status['finalizada'])
+        self.assertEqual(status['status'], 'C')
+        self.assertEqual(status['url_resultado'], reverse('folha:detail', args=[status['resultado']['folha_id']]))
+
+
+class TotaisArmazenadosTest(TestCase):
+    """Testes dos totais desnormalizados de folha e evento"""
+
+    def setUp(self):
+        setor = Setor.objects.create(nome='TI')
+        funcao = Funcao.objects.create(nome='Desenvolvedor')
+        tipo_contrato = TipoContrato.objects.create(nome='CLT')
+        self.funcionario = Funcionario.objects.create(
+            nome_completo='João Silva',
+            cpf='12345678909',
+            data_admissao=date(2023, 1, 1),
+            funcao=funcao,
+            setor=setor,
+            salario_base=Decimal('5000.00')
+        )
+        Contrato.objects.create(
+            funcionario=self.funcionario,
+            tipo_contrato=tipo_contrato,
+            data_inicio=date(2023, 1, 1),
+            carga_horaria=40
+        )
+        self.desconto = ProventoDesconto.objects.create(
+            nome='Falta',
+            codigo_referencia='FALTA',
+            tipo='D',
+            impacto='F'
+        )
+        self.folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+    def test_totais_apos_geracao(self):
+        """Testa os totais gravados na geração"""
+        self.folha.refresh_from_db()
+        self.assertEqual(self.folha.total_proventos, Decimal('5000.00'))
+        self.assertEqual(self.folha.total_descontos, Decimal('0.00'))
+        self.assertEqual(self.folha.total_liquido, Decimal('5000.00'))
+
+        evento = self.folha.eventos.get()
+        self.assertEqual(evento.total_proventos, Decimal('5000.00'))
+        self.assertEqual(evento.valor_total, Decimal('5000.00'))
+
+    def test_totais_incrementais_ao_adicionar_e_remover(self):
+        """Testa que adicionar/remover itens ajusta os totais sem reagregar"""
+        item = FolhaService.adicionar_item_manual(
+            folha=self.folha,
+            funcionario=self.funcionario,
+            provento_desconto=self.desconto,
+            valor=Decimal('250.00'),
+        )
+        self.folha.refresh_from_db()
+        self.assertEqual(self.folha.total_descontos, Decimal('250.00'))
+        self.assertEqual(self.folha.total_liquido, Decimal('4750.00'))
+        self.assertEqual(self.folha.eventos.get().valor_total, Decimal('4750.00'))
+
+        FolhaService.remover_item(item)
+        self.folha.refresh_from_db()
+        self.assertEqual(self.folha.total_descontos, Decimal('0.00'))
+        self.assertEqual(self.folha.total_liquido, Decimal('5000.00'))
+
+    def test_falha_nos_totais_desfaz_o_item(self):
+        """Testa que, se o ajuste do resumo falha, nem o item nem os totais ficam gravados"""
+        evento = self.folha.eventos.get()
+        item = FolhaService.adicionar_item_manual(
+            evento=evento,
+            funcionario=self.funcionario,
+            provento_desconto=self.desconto,
+            valor=Decimal('250.00'),
+        )
+        itens, item_pk = ItemFolha.objects.count(), item.pk
+
+        with mock.patch.object(FolhaService, '_ajustar_resumo', side_effect=RuntimeError('falha')):
+            with self.assertRaises(RuntimeError):
+                FolhaService.adicionar_item_manual(
+                    evento=evento,
+                    funcionario=self.funcionario,
+                    provento_desconto=self.desconto,
+                    valor=Decimal('100.00'),
+                )
+            with self.assertRaises(RuntimeError):
+                FolhaService.remover_item(item)
+
+        self.assertEqual(ItemFolha.objects.count(), itens)
+        self.assertTrue(ItemFolha.objects.filter(pk=item_pk).exists())
+        self.folha.refresh_from_db()
+        evento.refresh_from_db()
+        resumo = self.folha.resumos.get(funcionario=self.funcionario)
+        self.assertEqual(self.folha.total_descontos, Decimal('250.00'))
+        self.assertEqual(evento.total_descontos, Decimal('250.00'))
+        self.assertEqual(resumo.total_descontos, Decimal('250.00'))
+
+    def test_comando_verificar_totais_corrige(self):
+        """Testa que o comando detecta e reconstrói totais divergentes"""
+        FolhaPagamento.objects.filter(pk=self.folha.pk).update(total_proventos=Decimal('1.00'))
+
+        saida = StringIO()
+        call_command('verificar_totais', stdout=saida)
+        self.assertIn('divergente', saida.getvalue())
+
+        call_command('verificar_totais', '--corrigir', stdout=StringIO())
+        self.folha.refresh_from_db()
+        self.assertEqual(self.folha.total_proventos, Decimal('5000.00'))
+
+    def test_comando_verificar_totais_confere_valor_total_do_evento(self):
+        """Testa que um valor_total de evento desatualizado é acusado e reconstruído"""
+        evento = self.folha.eventos.get()
+        EventoPagamento.objects.filter(pk=evento.pk).update(valor_total=Decimal('1.00'))
+
+        saida = StringIO()
+        call_command('verificar_totais', stdout=saida)
+        self.assertIn('divergente', saida.getvalue())
+
+        call_command('verificar_totais', '--corrigir', stdout=StringIO())
+        evento.refresh_from_db()
+        self.assertEqual(evento.valor_total, Decimal('5000.00'))
+
+    def test_admin_nao_altera_itens(self):
+        """Testa que os itens não são gravados pelo admin, por fora dos totais"""
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        item = self.folha.itens.get()
+
+        response = self.client.post(
+            reverse('admin:folha_itemfolha_change', args=[item.pk]), {'valor_lancado': '1.00'}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:folha_itemfolha_add')).status_code, 403)
+        item.refresh_from_db()
+        self.assertEqual(item.valor_lancado, Decimal('5000.00'))
+
+        # O evento continua editável, com os itens apenas exibidos
+        response = self.client.get(reverse('admin:folha_eventopagamento_change', args=[item.evento_pagamento_id]))
+        self.assertContains(response, 'João Silva')
+
+
+class ResumoFuncionarioTest(DadosFolhaMixin, TestCase):
+    """Testes da reconstrução e do ajuste incremental dos resumos"""
+
+    def setUp(self):
+        super().setUp()
+        self._criar_funcionarios(4)
+        self.folha = FolhaService.gerar_folha(mes=3, ano=2024)
+        self.desconto = ProventoDesconto.objects.create(
+            nome='Falta',
+            codigo_referencia='FALTA',
+            tipo='D',
+            impacto='F'
+        )
+
+    def _totais_resumos(self):
+        return {
+            r.funcionario_id: (r.total_proventos, r.total_descontos, r.valor_liquido)
+            for r in self.folha.resumos.all()
+        }
+
+    def test_recalcular_resumos_reconstroi_divergencias(self):
+        """Testa que a reconstrução corrige, zera e recria resumos"""
+        esperado = self._totais_resumos()
+        resumos = list(self.folha.resumos.order_by('pk'))
+        resumos[0].delete()
+        ResumoFolhaFuncionario.objects.filter(pk=resumos[1].pk).update(valor_liquido=Decimal('1.00'))
+        funcionario_sem_itens = resumos[2].funcionario_id
+        ItemFolha.objects.filter(folha_pagamento=self.folha, funcionario_id=funcionario_sem_itens).delete()
+        esperado[funcionario_sem_itens] = (Decimal('0.00'), Decimal('0.00'), Decimal('0.00'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            FolhaService.recalcular_resumos(self.folha)
+
+        self.assertLessEqual(len(consultas), 5)
+        self.assertEqual(self._totais_resumos(), esperado)
+
+    def test_ajuste_incremental_afeta_apenas_o_funcionario(self):
+        """Testa que adicionar/remover item altera somente o resumo do funcionário"""
+        antes = self._totais_resumos()
+        resumo = self.folha.resumos.select_related('funcionario').first()
+
+        item = FolhaService.adicionar_item_manual(
+            folha=self.folha,
+            funcionario=resumo.funcionario,
+            provento_desconto=self.desconto,
+            valor=Decimal('100.00'),
+        )
+        depois = self._totais_resumos()
+        proventos, descontos, liquido = antes[resumo.funcionario_id]
+        self.assertEqual(
+            depois[resumo.funcionario_id],
+            (proventos, descontos + Decimal('100.00'), liquido - Decimal('100.00'))
+        )
+        for funcionario_id, totais in antes.items():
+            if funcionario_id != resumo.funcionario_id:
+                self.assertEqual(depois[funcionario_id], totais)
+
+        FolhaService.remover_item(item)
+        self.assertEqual(self._totais_resumos(), antes)
+
+    def test_adicionar_itens_em_lote(self):
+        """Testa o lançamento em lote com totais e resumos atualizados uma vez"""
+        antes = self._totais_resumos()
+        evento = self.folha.eventos.get()
+        total_antes = evento.total_descontos
+        funcionarios = list(Funcionario.objects.all())
+
+        with CaptureQueriesContext(connection) as consultas:
+            criados = FolhaService.adicionar_itens_em_lote(
+                self.desconto, [(f, Decimal('33.333')) for f in funcionarios], folha=self.folha
+            )
+
+        self.assertEqual(criados, 4)
+        self.assertLessEqual(len(consultas), 12)
+        evento.refresh_from_db()
+        self.assertEqual(evento.total_descontos, total_antes + Decimal('133.32'))
+        for funcionario_id, (proventos, descontos, liquido) in antes.items():
+            self.assertEqual(
+                self._totais_resumos()[funcionario_id],
+                (proventos, descontos + Decimal('33.33'), liquido - Decimal('33.33'))
+            )
+
+    def test_view_lancamento_massivo(self):
+        """Testa que a view de lançamento massivo grava um item por funcionário"""
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        response = self.client.post(reverse('funcionarios:adiantamento_massivo'), {
+            'folha_pagamento': self.folha.pk,
+            'provento_desconto': self.desconto.pk,
+            'status': 'A',
+            'tipo_valor': 'P',
+            'percentual': '10',
+        })
+
+        self.assertRedirects(response, reverse('folha:detail', args=[self.folha.pk]))
+        itens = ItemFolha.objects.filter(provento_desconto=self.desconto).select_related('funcionario')
+        self.assertEqual(itens.count(), 4)
+        for item in itens:
+            self.assertEqual(item.valor_lancado, item.funcionario.salario_base / 10)
+
+
+class ExportacaoExcelTest(DadosFolhaMixin, TestCase):
+    """Testes da exportação da folha para Excel"""
+
+    def test_export_excel_linhas_e_totais_em_uma_consulta(self):
+        """Testa o conteúdo da planilha e que os resumos são lidos uma única vez"""
+        from folha.exports import FolhaPagamentoExporter
+
+        self._criar_funcionarios(5)
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+        exporter = FolhaPagamentoExporter(folha)
+
+        with CaptureQueriesContext(connection) as consultas:
+            buffer = exporter.export_excel()
+        self.assertEqual(len(consultas), 1)
+
+        ws = openpyxl.load_workbook(buffer).active
+        linhas = list(ws.iter_rows(min_row=4, values_only=True))
+        self.assertEqual(len(linhas), 6)
+        self.assertEqual(linhas[0][:2], ('Funcionário 000', 'Desenvolvedor'))
+        self.assertEqual(linhas[-1][0], 'TOTAL')
+        self.assertAlmostEqual(linhas[-1][4], float(folha.resumos.aggregate(
+            total=models.Sum('valor_liquido'))['total']))
+
+    def test_tarefa_exportacao_excel_grava_arquivo(self):
+        """Testa a exportação em segundo plano gravada a partir de arquivo temporário"""
+        self._criar_funcionarios(2)
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            tarefa = TarefaService.enfileirar('XE', folha=folha)
+            TarefaService.processar_pendentes()
+            tarefa.refresh_from_db()
+
+            self.assertEqual(tarefa.status, 'C')
+            self.assertEqual(tarefa.resultado['arquivo'], 'folha_pagamento_2024_01.xlsx')
+            with tarefa.arquivo.open('rb') as arquivo:
+                ws = openpyxl.load_workbook(arquivo).active
+                self.assertEqual(ws.max_row, 6)
+
+
+class HoleritesLoteTest(DadosFolhaMixin, TestCase):
+    """Testes da exportação de holerites da folha inteira"""
+
+    def setUp(self):
+        super().setUp()
+        self._criar_funcionarios(3)
+        self.folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+    def test_export_zip_um_pdf_por_funcionario(self):
+        """Testa o ZIP com um holerite por funcionário, carregado em duas consultas"""
+        import zipfile
+        from folha.exports import HoleritesLoteExporter
+
+        exporter = HoleritesLoteExporter(self.folha, processos=1)
+        with CaptureQueriesContext(connection) as consultas:
+            buffer = exporter.export_zip()
+        self.assertEqual(len(consultas), 2)
+
+        with zipfile.ZipFile(buffer) as arquivo_zip:
+            nomes = arquivo_zip.namelist()
+            self.assertEqual(nomes[0], 'holerite_Funcionário_000_2024_01.pdf')
+            self.assertEqual(len(nomes), 3)
+            self.assertTrue(arquivo_zip.read(nomes[0]).startswith(b'%PDF'))
+
+    def test_export_pdf_unico(self):
+        """Testa o PDF único com uma página por holerite"""
+        from folha.exports import HoleritesLoteExporter
+
+        buffer = HoleritesLoteExporter(self.folha, processos=1).export_pdf()
+        conteudo = buffer.getvalue()
+        self.assertTrue(conteudo.startswith(b'%PDF'))
+        self.assertEqual(conteudo.count(b'/Type /Page\n'), 3)
+
+    def test_exportacao_com_processos(self):
+        """Testa o ZIP e o PDF único renderizados com 2 processos, dentro da transação do teste"""
+        import zipfile
+        from folha.exports import HoleritesLoteExporter
+
+        funcionarios = list(Funcionario.objects.order_by('nome_completo'))
+        exporter = HoleritesLoteExporter(self.folha, processos=2)
+
+        with zipfile.ZipFile(exporter.export_zip()) as arquivo_zip:
+            self.assertEqual(
+                arquivo_zip.namelist(),
+                [f'holerite_{f.nome_completo.replace(" ", "_")}_2024_01.pdf' for f in funcionarios],
+            )
+            for nome in arquivo_zip.namelist():
+                self.assertTrue(arquivo_zip.read(nome).startswith(b'%PDF'))
+
+        conteudo = exporter.export_pdf().getvalue()
+        self.assertEqual(conteudo.count(b'/Type /Page\n'), len(funcionarios))
+
+        # A conexão (e a transação) de quem chamou continua utilizável
+        self.assertTrue(connection.in_atomic_block)
+        self.assertEqual(self.folha.resumos.count(), len(funcionarios))
+
+    def test_view_enfileira_exportacao_holerites(self):
+        """Testa que a view enfileira a tarefa no formato pedido"""
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        response = self.client.get(
+            reverse('folha:export_holerites', args=[self.folha.pk]), {'formato': 'pdf'}
+        )
+        tarefa = TarefaFolha.objects.get(tipo='XH')
+        self.assertRedirects(response, reverse('folha:tarefa_detail', args=[tarefa.pk]))
+        self.assertEqual(tarefa.parametros, {'formato': 'pdf'})
+
+
+class ListagemFolhasTest(TestCase):
+    """Testes da listagem de folhas paginada por cursor"""
+
+    def setUp(self):
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        for ano in (2022, 2023, 2024):
+            for mes in range(1, 13):
+                FolhaPagamento.objects.create(mes=mes, ano=ano)
+
+    def test_paginas_com_consultas_constantes(self):
+        """Testa a paginação por competência com o mesmo número de consultas por página"""
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('folha:list'))
+        pagina = response.context['pagina']
+        self.assertEqual(len(pagina), 24)
+        self.assertEqual(pagina.itens[0].periodo_referencia, '12/2024')
+        self.assertEqual(pagina.itens[0].qtd_funcionarios, 0)
+
+        with self.assertNumQueries(len(consultas)):
+            response = self.client.get(reverse('folha:list') + pagina.url_proxima)
+        pagina = response.context['pagina']
+        self.assertEqual(len(pagina), 12)
+        self.assertEqual(pagina.itens[0].periodo_referencia, '12/2022')
+        self.assertIsNone(pagina.proxima)
+        self.assertIsNotNone(pagina.anterior)
+
+
+class APIFolhaTest(DadosFolhaMixin, TestCase):
+    """Testes da API v1 (gravação em lote, leituras paginadas e geração assíncrona)"""
+
+    def setUp(self):
+        super().setUp()
+        self.funcionarios = self._criar_funcionarios(3)
+        self.folha = FolhaService.gerar_folha(mes=3, ano=2024)
+        self.evento = self.folha.eventos.get()
+        self.bonus = ProventoDesconto.objects.create(
+            nome='Bônus', codigo_referencia='BONUS', tipo='P', impacto='F'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('integracao', password='senha'))
+
+    def _url_itens(self):
+        return reverse('api-v1:evento_itens', args=[self.evento.pk])
+
+    def _assert_totais_coerentes(self):
+        evento = EventoPagamento.objects.get(pk=self.evento.pk)
+        totais = totalizar_itens(evento.itens.all())
+        self.assertEqual(evento.total_proventos, totais['total_proventos'])
+        self.assertEqual(evento.total_descontos, totais['total_descontos'])
+        for resumo in self.folha.resumos.all():
+            resumo_esperado = totalizar_itens(self.folha.itens.filter(funcionario=resumo.funcionario_id))
+            self.assertEqual(resumo.total_proventos, resumo_esperado['total_proventos'])
+            self.assertEqual(resumo.total_descontos, resumo_esperado['total_descontos'])
+
+    def test_gravacao_em_lote_inclui_e_atualiza(self):
+        """Testa o upsert por (funcionário, provento/desconto) e os totais resultantes"""
+        linhas = [
+            {'funcionario': f.pk, 'provento_desconto': 'BONUS', 'valor_lancado': '50.00'}
+            for f in self.funcionarios
+        ]
+        # Já existe item de salário: a linha atualiza em vez de duplicar
+        linhas.append({'funcionario': self.funcionarios[0].pk, 'provento_desconto': 'SALARIO', 'valor_lancado': '1500.00'})
+
+        response = self.client.post(self._url_itens(), linhas, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data['criados'], response.data['atualizados']), (3, 1))
+        self.assertEqual(
+            ItemFolha.objects.get(evento_pagamento=self.evento, funcionario=self.funcionarios[0],
+                                  provento_desconto__codigo_referencia='SALARIO').valor_lancado,
+            Decimal('1500.00')
+        )
+        self._assert_totais_coerentes()
+
+        response = self.client.post(self._url_itens(), linhas[:1], format='json')
+        self.assertEqual((response.data['criados'], response.data['atualizados']), (0, 1))
+        self.assertEqual(self.evento.itens.filter(provento_desconto=self.bonus).count(), 3)
+
+    def test_gravacao_em_lote_com_consultas_constantes(self):
+        """Testa que a quantidade de consultas não depende da quantidade de linhas"""
+        def gravar(valor):
+            linhas = [
+                {'funcionario': f.pk, 'provento_desconto': 'BONUS', 'valor_lancado': valor}
+                for f in funcionarios
+            ]
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.post(self._url_itens(), linhas, format='json')
+            return len(consultas)
+
+        funcionarios = self.funcionarios[:1]
+        poucas = gravar('10.00')
+        funcionarios = self.funcionarios + self._criar_funcionarios(20, inicio=3)
+        ItemFolha.objects.filter(provento_desconto=self.bonus).delete()
+        self.assertEqual(gravar('10.00'), poucas)
+
+    def test_linhas_invalidas_nao_gravam_nada(self):
+        """Testa que erros são apontados por linha e nada é gravado"""
+        response = self.client.post(self._url_itens(), [
+            {'funcionario': self.funcionarios[0].pk, 'provento_desconto': 'BONUS', 'valor_lancado': '10.00'},
+            {'funcionario': 999999, 'provento_desconto': 'INEXISTENTE', 'valor_lancado': '10.00'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('funcionario', response.data[1])
+        self.assertIn('provento_desconto', response.data[1])
+        self.assertFalse(self.evento.itens.filter(provento_desconto=self.bonus).exists())
+
+    def test_itens_gerados_nao_sao_sobrescritos(self):
+        """Testa que o upsert recusa linhas que cairiam em itens gerados de lançamentos fixos"""
+        plano = self.evento.itens.get(funcionario=self.funcionarios[0], provento_desconto=self.plano_saude)
+        self.assertIsNotNone(plano.lancamento_geral_origem_id)
+
+        response = self.client.post(self._url_itens(), [
+            {'funcionario': self.funcionarios[1].pk, 'provento_desconto': 'BONUS', 'valor_lancado': '10.00'},
+            {'funcionario': self.funcionarios[0].pk, 'provento_desconto': 'PLANO', 'valor_lancado': '1.00'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('lançamento de origem', str(response.data))
+        plano.refresh_from_db()
+        self.assertEqual(plano.valor_lancado, Decimal('100.00'))
+        self.assertFalse(self.evento.itens.filter(provento_desconto=self.bonus).exists())
+        self._assert_totais_coerentes()
+
+    def test_leituras_de_evento_ou_folha_inexistente(self):
+        """Testa que evento ou folha inexistente responde 404, e não uma lista vazia"""
+        for nome in ('evento_itens', 'folha_itens', 'folha_resumos'):
+            response = self.client.get(reverse(f'api-v1:{nome}', args=[999999]))
+            self.assertEqual(response.status_code, 404, nome)
+
+    def test_tarefa_de_outro_usuario(self):
+        """Testa que a tarefa só é visível para quem a solicitou"""
+        tarefa = TarefaService.enfileirar('GF', {'mes': 4, 'ano': 2024}, usuario=User.objects.create_user('rh'))
+        response = self.client.get(reverse('api-v1:tarefa', args=[tarefa.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_evento_fechado_recusa_gravacao(self):
+        """Testa que só eventos em rascunho aceitam itens"""
+        EventoPagamento.objects.filter(pk=self.evento.pk).update(status='F')
+        response = self.client.post(self._url_itens(), [
+            {'funcionario': self.funcionarios[0].pk, 'provento_desconto': 'BONUS', 'valor_lancado': '10.00'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_leitura_paginada_com_campos(self):
+        """Testa a paginação por cursor e o sparse fieldset das leituras"""
+        url = reverse('api-v1:folha_resumos', args=[self.folha.pk])
+        response = self.client.get(url, {'campos': 'funcionario,valor_liquido', 'tamanho': 2})
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(set(response.data['results'][0]), {'funcionario', 'valor_liquido'})
+        proxima = self.client.get(response.data['next'])
+        self.assertEqual(len(proxima.data['results']), 1)
+        self.assertIsNone(proxima.data['next'])
+
+        response = self.client.get(reverse('api-v1:folha_itens', args=[self.folha.pk]), {'campos': 'tipo'})
+        self.assertEqual(len(response.data['results']), self.folha.itens.count())
+        self.assertEqual(set(response.data['results'][0]), {'tipo'})
+
+    def test_gerar_folha_enfileira_tarefa(self):
+        """Testa que a geração responde 202 com a tarefa e recusa competência existente"""
+        response = self.client.post(reverse('api-v1:folha_gerar'), {'mes': 4, 'ano': 2024}, format='json')
+        self.assertEqual(response.status_code, 202)
+        tarefa = TarefaFolha.objects.get(pk=response.data['id'])
+        self.assertEqual((tarefa.tipo, tarefa.status), ('GF', 'P'))
+        self.assertEqual(response['Location'], reverse('api-v1:tarefa', args=[tarefa.pk]))
+
+        TarefaService.processar_pendentes()
+        status = self.client.get(response['Location']).data
+        self.assertEqual(status['status'], 'C')
+        self.assertIsNotNone(status['folha'])
+
+        response = self.client.post(reverse('api-v1:folha_gerar'), {'mes': 3, 'ano': 2024}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+
+class LancamentoFixoIncrementalTest(DadosFolhaMixin, TestCase):
+    """Testes da reaplicação de lançamentos fixos às folhas em rascunho"""
+
+    def setUp(self):
+        super().setUp()
+        self.funcionarios = self._criar_funcionarios(3)
+        self.folha = FolhaService.gerar_folha(mes=3, ano=2024)
+        self.lancamento_geral = LancamentoFixoGeral.objects.get()
+
+    def _assert_totais_coerentes(self):
+        folha = FolhaPagamento.objects.get(pk=self.folha.pk)
+        totais = totalizar_itens(folha.itens.all())
+        self.assertEqual(folha.total_proventos, totais['total_proventos'])
+        self.assertEqual(folha.total_descontos, totais['total_descontos'])
+        for resumo in folha.resumos.all():
+            esperado = totalizar_itens(folha.itens.filter(funcionario=resumo.funcionario_id))
+            self.assertEqual(resumo.total_descontos, esperado['total_descontos'])
+
+    def test_itens_gerados_guardam_origem(self):
+        """Testa que a geração liga os itens ao lançamento de origem"""
+        self.assertEqual(self.lancamento_geral.itens_folha.count(), 3)
+
+    def test_alterar_lancamento_geral_recalcula_itens(self):
+        """Testa que mudar o percentual recalcula só os itens do lançamento"""
+        itens_antes = set(self.folha.itens.values_list('pk', flat=True))
+        self.lancamento_geral.percentual = Decimal('20.00')
+        self.lancamento_geral.save()
+
+        self.assertEqual(set(self.folha.itens.values_list('pk', flat=True)), itens_antes)
+        item = self.lancamento_geral.itens_folha.get(funcionario=self.funcionarios[1])
+        self.assertEqual(item.valor_lancado, Decimal('400.00'))
+        self._assert_totais_coerentes()
+
+        self.lancamento_geral.ativo = False
+        self.lancamento_geral.save()
+        self.assertFalse(self.lancamento_geral.itens_folha.exists())
+        self._assert_totais_coerentes()
+
+    def test_itens_sem_origem_nao_sao_duplicados(self):
+        """Testa que itens gerados antes do rastreamento não recebem uma segunda cópia"""
+        self.folha.itens.update(lancamento_geral_origem=None)
+        quantidade = self.folha.itens.count()
+
+        self.lancamento_geral.percentual = Decimal('20.00')
+        with self.assertLogs('folha.services', 'WARNING'):
+            self.lancamento_geral.save()
+
+        self.assertEqual(self.folha.itens.count(), quantidade)
+        self._assert_totais_coerentes()
+
+    def test_migracao_vincula_itens_sem_origem(self):
+        """Testa que a migração do rastreamento liga os itens já gerados ao lançamento"""
+        migracao = importlib.import_module('folha.migrations.0007_adiciona_origem_lancamentos_fixos')
+        self.folha.itens.update(lancamento_geral_origem=None)
+
+        migracao.vincular_itens_existentes(django_apps, None)
+
+        self.assertEqual(self.lancamento_geral.itens_folha.count(), 3)
+
+    def test_lancamento_do_funcionario_criado_e_excluido(self):
+        """Testa a inclusão e a remoção do item de um lançamento fixo individual"""
+        lancamento = LancamentoFixo.objects.create(
+            funcionario=self.funcionarios[0],
+            provento_desconto=ProventoDesconto.objects.get(codigo_referencia='SALARIO'),
+            valor=Decimal('250.00'),
+            data_inicio=date(2024, 1, 1)
+        )
+        item = lancamento.itens_folha.get()
+        self.assertEqual((item.folha_pagamento, item.valor_lancado), (self.folha, Decimal('250.00')))
+        self._assert_totais_coerentes()
+
+        lancamento.delete()
+        self.assertFalse(ItemFolha.objects.filter(pk=item.pk).exists())
+        self._assert_totais_coerentes()
+
+    def test_lancamento_aplicado_so_no_evento_padrao(self):
+        """Testa que, com dois eventos PF na folha, o lançamento entra uma única vez, no evento padrão"""
+        padrao = self.folha.eventos.get(tipo_evento='PF')
+        segundo = FolhaService.criar_evento_pagamento(
+            self.folha, 'PF', 'Pagamento complementar', date(2024, 3, 15), processar_funcionarios=False
+        )
+
+        lancamento = LancamentoFixo.objects.create(
+            funcionario=self.funcionarios[0],
+            provento_desconto=ProventoDesconto.objects.get(codigo_referencia='SALARIO'),
+            valor=Decimal('250.00'),
+            data_inicio=date(2024, 1, 1)
+        )
+
+        self.assertEqual(lancamento.itens_folha.get().evento_pagamento, padrao)
+        self.assertFalse(segundo.itens.exists())
+        self._assert_totais_coerentes()
+
+    def test_folha_fechada_nao_muda(self):
+        """Testa que folhas fechadas não são alteradas"""
+        self.folha.eventos.update(status='F')
+        FolhaPagamento.objects.filter(pk=self.folha.pk).update(status='F')
+        total = FolhaPagamento.objects.get(pk=self.folha.pk).total_descontos
+
+        self.lancamento_geral.percentual = Decimal('50.00')
+        self.lancamento_geral.save()
+
+        self.assertEqual(FolhaPagamento.objects.get(pk=self.folha.pk).total_descontos, total)
+
+
+class PreviaCompetenciaTest(DadosFolhaMixin, TestCase):
+    """Testes do cálculo da competência em memória e da comparação com a folha"""
+
+    def setUp(self):
+        super().setUp()
+        self.funcionarios = self._criar_funcionarios(3)
+
+    def test_previa_igual_a_geracao_sem_gravar(self):
+        """Testa que a prévia não grava nada e bate com a folha gerada depois"""
+        with CaptureQueriesContext(connection) as consultas:
+            previa = FolhaService.calcular_competencia(3, 2024)
+
+        self.assertTrue(all(q['sql'].lstrip().upper().startswith('SELECT') for q in consultas))
+        self.assertFalse(FolhaPagamento.objects.exists())
+        self.assertEqual(Adiantamento.objects.filter(status='P').count(), 3)
+
+        self.assertEqual(len(previa['linhas']), 9)
+        resumo = next(r for r in previa['resumos'] if r['funcionario'] == self.funcionarios[1].pk)
+        self.assertEqual(resumo['valor_liquido'], Decimal('1700.00'))
+
+        folha = FolhaService.gerar_folha(mes=3, ano=2024)
+        self.assertEqual(previa['totais']['total_proventos'], folha.total_proventos)
+        self.assertEqual(previa['totais']['total_descontos'], folha.total_descontos)
+        self.assertEqual(previa['totais']['total_liquido'], folha.total_liquido)
+
+    def test_previa_nao_cria_rubricas(self):
+        """Testa que rubricas do sistema ausentes não são criadas pela prévia"""
+        ProventoDesconto.objects.filter(codigo_referencia='SALARIO').delete()
+
+        previa = FolhaService.calcular_competencia(3, 2024)
+
+        self.assertFalse(ProventoDesconto.objects.filter(codigo_referencia='SALARIO').exists())
+        salarios = [l for l in previa['linhas'] if l['codigo'] == 'SALARIO']
+        self.assertEqual(len(salarios), 3)
+        self.assertIsNone(salarios[0]['provento_desconto'])
+
+    def test_comparar_folha_gerada(self):
+        """Testa que a folha recém-gerada confere e que as mudanças aparecem"""
+        folha = FolhaService.gerar_folha(mes=3, ano=2024)
+        self.assertTrue(FolhaService.comparar_competencia(folha)['confere'])
+
+        Funcionario.objects.filter(pk=self.funcionarios[0].pk).update(salario_base=Decimal('1500.00'))
+        FolhaService.adicionar_item_manual(
+            folha=folha,
+            funcionario=self.funcionarios[2],
+            provento_desconto=ProventoDesconto.objects.create(
+                nome='Bônus', codigo_referencia='BONUS', tipo='P', impacto='F'
+            ),
+            valor=Decimal('50.00'),
+        )
+        self._criar_funcionarios(1, inicio=3)
+
+        diferencas = FolhaService.comparar_competencia(folha)
+
+        self.assertFalse(diferencas['confere'])
+        self.assertEqual(
+            {(l['codigo'], l['valor_lancado'], l['valor_gravado']) for l in diferencas['divergentes']},
+            {('SALARIO', Decimal('1500.00'), Decimal('1000.00')), ('PLANO', Decimal('150.00'), Decimal('100.00'))},
+        )
+        self.assertEqual([l['codigo'] for l in diferencas['somente_na_folha']], ['BONUS'])
+        self.assertEqual(len(diferencas['somente_na_previa']), 3)
+
+    def test_api_e_comando(self):
+        """Testa os endpoints de prévia/diferenças e o comando previa_folha"""
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('integracao', password='senha'))
+
+        resposta = client.get(reverse('api-v1:competencia_previa', args=[2024, 3]))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['totais']['itens'], 9)
+        self.assertEqual(client.get(reverse('api-v1:competencia_previa', args=[2024, 13])).status_code, 400)
+
+        saida = StringIO()
+        call_command('previa_folha', '3', '2024', stdout=saida)
+        self.assertIn('3 funcionário(s)', saida.getvalue())
+
+        folha = FolhaService.gerar_folha(mes=3, ano=2024)
+        resposta = client.get(reverse('api-v1:folha_diferencas', args=[folha.pk]))
+        self.assertTrue(resposta.data['confere'])
+
+        saida = StringIO()
+        call_command('previa_folha', '3', '2024', stdout=saida)
+        self.assertIn('confere', saida.getvalue())
+
+
+class BenchmarkFolhaTest(TestCase):
+    """Testes do benchmark com empresa sintética"""
+
+    def _executar(self, *args):
+        saida = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        saida.close()
+        self.addCleanup(os.remove, saida.name)
+        call_command(
+            'benchmark_folha', '--banco-atual', '--funcionarios', '12', '--setores', '2',
+            '--profundidade', '3', '--sem-exportacoes', '--saida', saida.name, *args,
+            stdout=StringIO(),
+        )
+        with open(saida.name, encoding='utf-8') as arquivo:
+            return saida.name, json.load(arquivo)
+
+    def test_resultado_em_json_sem_deixar_dados(self):
+        """Testa as etapas medidas e que os dados sintéticos são desfeitos"""
+        _, resultado = self._executar()
+
+        self.assertEqual(resultado['cadastro']['funcionarios'], 12)
+        self.assertEqual(resultado['cadastro']['niveis'], 3)
+        etapas = {etapa['etapa']: etapa for etapa in resultado['etapas']}
+        self.assertIn('gerar_folha', etapas)
+        self.assertIn('view_organograma', etapas)
+        self.assertGreater(etapas['gerar_folha']['consultas'], 0)
+
+        self.assertFalse(Funcionario.objects.exists())
+        self.assertFalse(FolhaPagamento.objects.exists())
+
+    def test_comparacao_acusa_regressao(self):
+        """Testa que consultas a mais que a referência encerram com erro"""
+        caminho, resultado = self._executar()
+        for etapa in resultado['etapas']:
+            etapa['consultas'] = 0
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo)
+
+        with self.assertRaises(CommandError):
+            self._executar('--comparar', caminho)
+
+
+class ValidacaoAoSalvarTest(DadosFolhaMixin, TestCase):
+    """Testes da política de validação do save()"""
+
+    def setUp(self):
+        super().setUp()
+        self._criar_funcionarios(2)
+        self.folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+    def test_recalculo_de_totais_sem_validacao_completa(self):
+        """Testa que recalcular os totais custa só as agregações e os UPDATEs"""
+        evento = EventoPagamento.objects.select_related('folha_pagamento').get()
+        with self.assertNumQueries(4):
+            evento.calcular_valor_total()
+        self.assertEqual(evento.folha_pagamento.total_liquido, evento.valor_total)
+
+    def test_gravacao_parcial_valida_campos_gravados(self):
+        """Testa que update_fields ainda valida os campos gravados"""
+        self.folha.mes = 0
+        with self.assertRaises(ValidationError):
+            self.folha.save(update_fields=['mes'])
+
+    def test_gravacao_completa_valida_regras_do_modelo(self):
+        """Testa que save() sem update_fields (ou com validar=True) executa full_clean"""
+        outra = FolhaPagamento.objects.create(mes=2, ano=2024)
+        outra.mes = 1
+        with self.assertRaises(ValidationError):
+            outra.save()
+        with self.assertRaises(ValidationError):
+            outra.save(update_fields=['mes'], validar=True)
+
+
+class InstrumentacaoFolhaTest(DadosFolhaMixin, TestCase):
+    """Testes do relatório de etapas das operações do FolhaService"""
+
+    def setUp(self):
+        super().setUp()
+        self._criar_funcionarios(3)
+
+    def test_relatorio_da_geracao_gravado_na_folha(self):
+        """Testa as etapas da geração, as linhas gravadas e o relatório salvo na folha"""
+        with ColetorRelatorios() as coletor:
+            folha = FolhaService.gerar_folha(mes=1, ano=2024)
+
+        relatorio = coletor.ultimo
+        self.assertEqual(relatorio['operacao'], 'gerar_folha')
+        self.assertTrue(relatorio['sucesso'])
+        self.assertEqual(relatorio['contexto'], {'mes': 1, 'ano': 2024, 'folha': folha.pk})
+
+        etapas = coletor.etapas('gerar_folha')
+        self.assertEqual([etapa['nome'] for etapa in relatorio['etapas']],
+                         ['contratos', 'carga_competencia', 'calculo_itens', 'publicacao'])
+        self.assertEqual(
+            [etapa['nome'] for etapa in etapas['calculo_itens']['etapas']],
+            ['salario_base', 'lancamentos_gerais', 'lancamentos_fixos', 'adiantamentos'],
+        )
+        self.assertEqual(
+            [etapa['nome'] for etapa in etapas['publicacao']['etapas']],
+            ['gravacao_itens', 'baixa_adiantamentos', 'resumos', 'totais'],
+        )
+
+        # Registros lidos ou calculados em memória
+        self.assertEqual(etapas['contratos']['registros'], 3)
+        self.assertEqual(etapas['carga_competencia/adiantamentos']['registros'], 3)
+        self.assertEqual(etapas['calculo_itens/salario_base']['registros'], 3)
+        self.assertEqual(etapas['calculo_itens/lancamentos_gerais']['registros'], 3)
+        self.assertEqual(etapas['calculo_itens']['registros'], folha.itens.count())
+        self.assertEqual(etapas['calculo_itens']['consultas'], 0)
+
+        # Linhas gravadas: as etapas internas somam na externa, e nada conta duas vezes
+        self.assertEqual(etapas['calculo_itens']['linhas'], 0)
+        self.assertEqual(etapas['publicacao/gravacao_itens']['linhas'], folha.itens.count())
+        self.assertEqual(etapas['publicacao/baixa_adiantamentos']['linhas'], 3)
+        self.assertEqual(etapas['publicacao/resumos']['linhas'], 3)
+        # folha + 3 contratos + evento + itens + adiantamentos + resumos
+        gravadas = 5 + folha.itens.count() + 3 + 3
+        self.assertEqual(etapas['publicacao']['linhas'], gravadas)
+        self.assertEqual(relatorio['linhas'], gravadas)
+        self.assertGreaterEqual(relatorio['consultas'], sum(e['consultas'] for e in relatorio['etapas']))
+
+        folha.refresh_from_db()
+        self.assertEqual(folha.relatorio_geracao, relatorio)
+
+    def test_decimo_terceiro_gravado_em_lote(self):
+        """Testa que os itens do 13º são gravados em uma consulta, qualquer que seja o número de contratos"""
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+        with ColetorRelatorios() as coletor:
+            evento = FolhaService.criar_evento_decimo_terceiro(folha, '13º', date(2024, 1, 20))
+
+        etapas = coletor.etapas('criar_evento_decimo_terceiro')
+        self.assertEqual(etapas['gravacao_itens']['linhas'], 3)
+        self.assertEqual(etapas['gravacao_itens']['consultas'], 1)
+        self.assertEqual(etapas['calculo_itens']['consultas'], 1)
+        self.assertEqual(evento.itens.count(), 3)
+        self.assertEqual(evento.valor_total, Decimal('3000.00'))
+
+    def test_operacao_interna_vira_etapa(self):
+        """Testa que uma operação dentro de outra tem relatório próprio e aparece como etapa"""
+        folha = FolhaService.gerar_folha(mes=1, ano=2024)
+        funcionario = Funcionario.objects.first()
+        with ColetorRelatorios() as coletor:
+            with operacao('lote_manual'):
+                FolhaService.adicionar_item_manual(
+                    folha=folha, funcionario=funcionario,
+                    provento_desconto=self.plano_saude, valor=Decimal('10.00'),
+                )
+
+        self.assertEqual([r['operacao'] for r in coletor.relatorios], ['adicionar_item_manual', 'lote_manual'])
+        self.assertEqual(coletor.etapas('adicionar_item_manual')['gravacao_item']['linhas'], 1)
+        self.assertEqual(coletor.etapas('lote_manual')['adicionar_item_manual']['linhas'], 1)
+
+    def test_falha_registrada_e_hook_com_erro_ignorado(self):
+        """Testa que a falha da operação é relatada e que um hook com erro não a mascara"""
+        def hook_com_erro(relatorio):
+            raise RuntimeError('exportador indisponível')
+
+        FolhaService.gerar_folha(mes=1, ano=2024)
+        registrar_hook(hook_com_erro)
+        self.addCleanup(remover_hook, hook_com_erro)
+        with ColetorRelatorios() as coletor, self.assertLogs('folha.instrumentacao', 'ERROR'):
+            with self.assertRaises(ValidationError):
+                FolhaService.gerar_folha(mes=1, ano=2024)
+
+        self.assertFalse(coletor.ultimo['sucesso'])
+        self.assertEqual(FolhaPagamento.objects.count(), 1)
+
+    @override_settings(FOLHA_INSTRUMENTACAO_HOOKS=['folha.instrumentacao.registrar_no_log'])
+    def test_hook_configurado_registra_no_log(self):
+        """Testa o hook padrão, carregado do setting"""
+        with self.assertLogs('folha.instrumentacao', 'INFO') as logs:
+            FolhaService.gerar_folha(mes=1, ano=2024)
+        self.assertIn('gerar_folha', logs.output[0])
+        self.assertIn('gravacao_itens=', logs.output[0])
+
+
+class GeracaoParalelaTest(DadosFolhaMixin, TestCase):
+    """Testes da geração da folha com o cálculo dividido em lotes"""
+
+    def setUp(self):
+        super().setUp()
+        self._criar_funcionarios(5)
+
+    def test_lotes_produzem_a_mesma_folha(self):
+        """Testa que a geração em processos confere com o cálculo serial da competência"""
+        folha = FolhaService.gerar_folha(mes=1, ano=2024, processos=2)
+
+        self.assertTrue(FolhaService.comparar_competencia(folha)['confere'])
+        self.assertEqual(folha.resumos.count(), 5)
+        self.assertFalse(Adiantamento.objects.filter(status='P').exists())
+        self.assertEqual(folha.total_liquido, sum(r.valor_liquido for r in folha.resumos.all()))
+
+        relatorio = folha.relatorio_geracao
+        self.assertEqual(relatorio['contexto']['processos'], 2)
+        etapas = {etapa['nome']: etapa for etapa in relatorio['etapas']}
+        # Itens calculados são registros; linhas só as gravadas (na publicação)
+        self.assertEqual(etapas['calculo_lotes']['registros'], folha.itens.count())
+        self.assertEqual(etapas['calculo_lotes']['linhas'], 0)
+        self.assertEqual(etapas['calculo_lotes']['consultas'], 0)
+        self.assertEqual(relatorio['linhas'], etapas['publicacao']['linhas'])
+
+    def test_lote_recebe_apenas_os_proprios_dados(self):
+        """Testa que cada lote leva só os lançamentos e adiantamentos dos seus funcionários"""
+        recebidos = []
+
+        def calcular_registrando(funcionarios, dados):
+            recebidos.append(({f.pk for f in funcionarios}, dados))
+            return _calcular_lote(funcionarios, dados)
+
+        with mock.patch('folha.services.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('folha.services._calcular_lote', calcular_registrando):
+            FolhaService.gerar_folha(mes=1, ano=2024, processos=2)
+
+        self.assertEqual(len(recebidos), 5)
+        for pks, dados in recebidos:
+            self.assertTrue(set(dados['adiantamentos']) <= pks)
+            self.assertTrue(set(dados['lancamentos_fixos']) <= pks)
+            self.assertEqual(len(dados['adiantamentos']), 1)
+
+    def test_lote_com_falha_e_refeito(self):
+        """Testa que só o lote perdido com o processo é recalculado"""
+        calculados = []
+
+        def calcular_com_falha(funcionarios, dados):
+            if not calculados:
+                calculados.append(None)
+                raise BrokenProcessPool('processo encerrado')
+            calculados.append(len(funcionarios))
+            return _calcular_lote(funcionarios, dados)
+
+        with mock.patch('folha.services.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('folha.services._calcular_lote', calcular_com_falha), \
+                self.assertLogs('folha.services', 'WARNING'):
+            folha = FolhaService.gerar_folha(mes=1, ano=2024, processos=2)
+
+        # 5 funcionários em lotes de 1: cinco lotes e uma repetição
+        self.assertEqual(len(calculados), 6)
+        self.assertEqual(folha.resumos.count(), 5)
+        self.assertTrue(FolhaService.comparar_competencia(folha)['confere'])
+
+    def test_falha_persistente_nao_grava_nada(self):
+        """Testa que, esgotadas as tentativas, nenhuma folha é gravada"""
+        def calcular_sempre_com_falha(funcionarios, dados):
+            raise BrokenProcessPool('processo encerrado')
+
+        with mock.patch('folha.services.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('folha.services._calcular_lote', calcular_sempre_com_falha), \
+                self.assertLogs('folha.services', 'WARNING'):
+            with self.assertRaises(ValidationError):
+                FolhaService.gerar_folha(mes=1, ano=2024, processos=2)
+
+        self.assertFalse(FolhaPagamento.objects.exists())
+        self.assertEqual(Adiantamento.objects.filter(status='P').count(), 5)
+
+    def test_erro_de_calculo_nao_e_repetido(self):
+        """Testa que um erro do cálculo (e não do processo) é propagado sem nova tentativa"""
+        chamadas = []
+
+        def calcular_com_erro(funcionarios, dados):
+            chamadas.append(None)
+            raise ZeroDivisionError('erro no cálculo')
+
+        with mock.patch('folha.services.ProcessPoolExecutor', lambda **kwargs: ThreadPoolExecutor(max_workers=1)), \
+                mock.patch('folha.services._calcular_lote', calcular_com_erro):
+            with self.assertRaises(ZeroDivisionError):
+                FolhaService.gerar_folha(mes=1, ano=2024, processos=2)
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertFalse(FolhaPagamento.objects.exists())
@@ -25,5 +25,11 @@ urlpatterns = [
     # Exportação
     path('<int:pk>/export/pdf/', views.folha_export_pdf, name='export_pdf'),
     path('<int:pk>/export/excel/', views.folha_export_excel, name='export_excel'),
+    path('<int:pk>/export/holerites/', views.folha_export_holerites, name='export_holerites'),
     path('<int:folha_pk>/holerite/<int:funcionario_pk>/', views.holerite_pdf, name='holerite_pdf'),
+    
+    # Tarefas em segundo plano
+    path('tarefa/<int:pk>/', views.tarefa_detail, name='tarefa_detail'),
+    path('tarefa/<int:pk>/status/', views.tarefa_status, name='tarefa_status'),
+    path('tarefa/<int:pk>/download/', views.tarefa_download, name='tarefa_download'),
 ]
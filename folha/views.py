@@ -5,19 +5,29 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count
+from django.http import FileResponse, Http404, JsonResponse
+from django.urls import reverse
 
+from core.paginacao import paginar_por_cursor
 from .models import FolhaPagamento, ItemFolha, ResumoFolhaFuncionario
 from .forms import GerarFolhaForm, ItemFolhaForm, EventoAdiantamentoForm, EventoDecimoTerceiroForm
 from .services import FolhaService
+from .tarefas import TarefaService
 
 
 @login_required
 def folha_list(request):
-    """Lista de folhas de pagamento"""
-    folhas = FolhaPagamento.objects.all().order_by('-ano', '-mes')
+    """Lista de folhas de pagamento (paginada por cursor)"""
+    # Os totais já ficam gravados na folha; só a quantidade de funcionários
+    # vem de anotação, calculada na mesma consulta da página
+    folhas = FolhaPagamento.objects.annotate(qtd_funcionarios=Count('resumos'))
+    pagina = paginar_por_cursor(folhas, ['-ano', '-mes', '-pk'], request.GET, tamanho=24)
     
     context = {
-        'folhas': folhas,
+        'folhas': pagina,
+        'pagina': pagina,
     }
     return render(request, 'folha/folha_list.html', context)
 
@@ -58,17 +68,14 @@ def folha_gerar(request):
             mes = int(form.cleaned_data['mes'])
             ano = form.cleaned_data['ano']
             
-            try:
-                folha = FolhaService.gerar_folha(mes, ano)
-                messages.success(
-                    request, 
-                    f'Folha de {folha.periodo_referencia} gerada com sucesso!'
+            if FolhaPagamento.objects.filter(mes=mes, ano=ano).exists():
+                messages.error(request, 'Erro ao gerar folha: Já existe uma folha de pagamento para este período')
+            else:
+                tarefa = TarefaService.enfileirar(
+                    'GF', {'mes': mes, 'ano': ano}, usuario=request.user
                 )
-                return redirect('folha:detail', pk=folha.pk)
-            except ValidationError as e:
-                messages.error(request, f'Erro ao gerar folha: {str(e)}')
-            except Exception as e:
-                messages.error(request, f'Erro inesperado: {str(e)}')
+                messages.info(request, f'Geração da folha {mes:02d}/{ano} enfileirada.')
+                return redirect('folha:tarefa_detail', pk=tarefa.pk)
     else:
         form = GerarFolhaForm()
     
@@ -195,19 +202,15 @@ def evento_criar_adiantamento(request, folha_pk):
             if form.cleaned_data.get('status'):
                 filtros['status'] = form.cleaned_data['status']
 
-            try:
-                evento = FolhaService.criar_evento_adiantamento_massivo(
-                    folha=folha,
-                    descricao=f"Adiantamento Quinzenal {data_evento.strftime('%d/%m')}",
-                    data_evento=data_evento,
-                    filtros=filtros,
-                    valor=valor,
-                    percentual=percentual,
-                )
-                messages.success(request, f'Evento criado: {evento.descricao} (Total R$ {evento.valor_total})')
-                return redirect('folha:detail', pk=folha.pk)
-            except ValidationError as e:
-                messages.error(request, str(e))
+            tarefa = TarefaService.enfileirar('AD', {
+                'descricao': f"Adiantamento Quinzenal {data_evento.strftime('%d/%m')}",
+                'data_evento': data_evento.isoformat(),
+                'filtros': filtros,
+                'valor': str(valor) if valor else None,
+                'percentual': str(percentual) if percentual else None,
+            }, folha=folha, usuario=request.user)
+            messages.info(request, 'Evento de adiantamento enfileirado.')
+            return redirect('folha:tarefa_detail', pk=tarefa.pk)
     else:
         form = EventoAdiantamentoForm()
 
@@ -226,17 +229,13 @@ def evento_criar_decimo_terceiro(request, folha_pk):
         if form.is_valid():
             data_evento = form.cleaned_data['data_evento']
             parcela = int(form.cleaned_data['parcela'])
-            try:
-                evento = FolhaService.criar_evento_decimo_terceiro(
-                    folha=folha,
-                    descricao=f"13º Salário - {parcela}ª Parcela",
-                    data_evento=data_evento,
-                    parcela=parcela,
-                )
-                messages.success(request, f'Evento criado: {evento.descricao} (Total R$ {evento.valor_total})')
-                return redirect('folha:detail', pk=folha.pk)
-            except ValidationError as e:
-                messages.error(request, str(e))
+            tarefa = TarefaService.enfileirar('13', {
+                'descricao': f"13º Salário - {parcela}ª Parcela",
+                'data_evento': data_evento.isoformat(),
+                'parcela': parcela,
+            }, folha=folha, usuario=request.user)
+            messages.info(request, 'Evento de 13º salário enfileirado.')
+            return redirect('folha:tarefa_detail', pk=tarefa.pk)
     else:
         form = EventoDecimoTerceiroForm()
 
@@ -248,11 +247,10 @@ def evento_fechar(request, pk):
     from .models import EventoPagamento
     evento = get_object_or_404(EventoPagamento, pk=pk)
     try:
-        if evento.tipo_evento == 'PF':
-            folha = evento.folha_pagamento
-            for contrato in folha.contratos_ativos.all():
-                FolhaService._lancar_adiantamentos(folha, evento, contrato.funcionario)
-        evento.fechar_evento()
+        with transaction.atomic():
+            if evento.tipo_evento == 'PF':
+                FolhaService.descontar_adiantamentos(evento)
+            evento.fechar_evento()
         messages.success(request, 'Evento fechado com sucesso!')
     except ValidationError as e:
         messages.error(request, str(e))
@@ -287,18 +285,27 @@ def evento_marcar_pago(request, pk):
 
 @login_required
 def folha_export_pdf(request, pk):
-    """Exportar folha para PDF"""
-    from .exports import export_folha_pdf
+    """Exportar folha para PDF (processada em segundo plano)"""
     folha = get_object_or_404(FolhaPagamento, pk=pk)
-    return export_folha_pdf(folha)
+    tarefa = TarefaService.enfileirar('XP', folha=folha, usuario=request.user)
+    return redirect('folha:tarefa_detail', pk=tarefa.pk)
 
 
 @login_required
 def folha_export_excel(request, pk):
-    """Exportar folha para Excel"""
-    from .exports import export_folha_excel
+    """Exportar folha para Excel (processada em segundo plano)"""
+    folha = get_object_or_404(FolhaPagamento, pk=pk)
+    tarefa = TarefaService.enfileirar('XE', folha=folha, usuario=request.user)
+    return redirect('folha:tarefa_detail', pk=tarefa.pk)
+
+
+@login_required
+def folha_export_holerites(request, pk):
+    """Exportar todos os holerites da folha (ZIP ou PDF único, em segundo plano)"""
     folha = get_object_or_404(FolhaPagamento, pk=pk)
-    return export_folha_excel(folha)
+    formato = 'pdf' if request.GET.get('formato') == 'pdf' else 'zip'
+    tarefa = TarefaService.enfileirar('XH', {'formato': formato}, folha=folha, usuario=request.user)
+    return redirect('folha:tarefa_detail', pk=tarefa.pk)
 
 
 @login_required
@@ -311,3 +318,63 @@ def holerite_pdf(request, folha_pk, funcionario_pk):
     funcionario = get_object_or_404(Funcionario, pk=funcionario_pk)
     
     return export_holerite_pdf(folha, funcionario)
+
+
+# ==================== TAREFAS ====================
+
+def _url_resultado(tarefa):
+    """URL para onde o usuário segue quando a tarefa termina com sucesso"""
+    if tarefa.status != 'C':
+        return None
+    if tarefa.arquivo:
+        return reverse('folha:tarefa_download', args=[tarefa.pk])
+    if tarefa.folha_pagamento_id:
+        return reverse('folha:detail', args=[tarefa.folha_pagamento_id])
+    return None
+
+
+@login_required
+def tarefa_detail(request, pk):
+    """Acompanhamento de uma tarefa em segundo plano"""
+    tarefa = get_object_or_404(TarefaService.visiveis(request.user), pk=pk)
+    
+    context = {
+        'tarefa': tarefa,
+        'url_resultado': _url_resultado(tarefa),
+        'title': str(tarefa),
+    }
+    return render(request, 'folha/tarefa_detail.html', context)
+
+
+@login_required
+def tarefa_status(request, pk):
+    """Status da tarefa em JSON (consultado periodicamente pela tela)"""
+    tarefa = get_object_or_404(TarefaService.visiveis(request.user), pk=pk)
+    
+    return JsonResponse({
+        'id': tarefa.pk,
+        'tipo': tarefa.tipo,
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'progresso': tarefa.progresso,
+        'mensagem': tarefa.mensagem,
+        'erro': tarefa.erro,
+        'finalizada': tarefa.finalizada,
+        'resultado': tarefa.resultado,
+        'url_resultado': _url_resultado(tarefa),
+    })
+
+
+@login_required
+def tarefa_download(request, pk):
+    """Download do arquivo gerado por uma tarefa de exportação"""
+    tarefa = get_object_or_404(TarefaService.visiveis(request.user), pk=pk)
+    
+    if tarefa.status != 'C' or not tarefa.arquivo:
+        raise Http404('Arquivo não disponível')
+    
+    return FileResponse(
+        tarefa.arquivo.open('rb'),
+        as_attachment=True,
+        filename=tarefa.resultado.get('arquivo') or tarefa.arquivo.name.rsplit('/', 1)[-1],
+    )
@@ -0,0 +1,77 @@
+"""
+Busca de funcionários por nome ou CPF
+
+O funcionário guarda, além do nome e do CPF mascarado, as colunas
+normalizadas `nome_busca` (minúsculas, sem acentos e com espaços únicos) e
+`cpf_numeros` (só os dígitos), preenchidas no save(). A busca compara o termo
+normalizado da mesma forma com essas colunas, sempre por trecho em qualquer
+posição (sobrenome, final do CPF), em todos os bancos:
+
+- CPF (com ou sem máscara): trecho dos dígitos; o CPF completo vira uma
+  igualdade, que usa o índice de cpf_numeros;
+- nome: trecho do nome; no PostgreSQL, apoiado no índice de trigramas
+  (pg_trgm) criado pela migração.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+
+# Termo formado só por dígitos e caracteres de máscara de CPF
+_TERMO_CPF = re.compile(r'^[\d.\-\s]+$')
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos e com espaços simples"""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.lower().split())
+
+
+def somente_digitos(texto):
+    """Mantém apenas os dígitos (ex.: CPF sem máscara)"""
+    return re.sub(r'\D', '', texto or '')
+
+
+def filtro_prefixo(campo, prefixo):
+    """
+    Filtro dos registros cujo `campo` começa com `prefixo`
+
+    No SQLite o LIKE não usa índice (e ignora maiúsculas), então o prefixo
+    vira um intervalo [prefixo, prefixo com o último caractere incrementado).
+    Nos demais bancos, o LIKE 'prefixo%' usa o índice varchar_pattern_ops que
+    o Django cria para campos indexados.
+    """
+    if connection.vendor == 'sqlite':
+        return Q(**{
+            f'{campo}__gte': prefixo,
+            f'{campo}__lt': prefixo[:-1] + chr(ord(prefixo[-1]) + 1),
+        })
+    return Q(**{f'{campo}__startswith': prefixo})
+
+
+def filtro_busca(termo):
+    """
+    Filtro da busca de funcionários por nome ou CPF
+
+    Args:
+        termo: Texto digitado (nome, CPF mascarado ou só dígitos)
+
+    Returns:
+        Q: Condição sobre as colunas normalizadas (vazia se o termo for vazio)
+    """
+    termo = (termo or '').strip()
+    if _TERMO_CPF.match(termo):
+        digitos = somente_digitos(termo)
+        if not digitos:
+            return Q()
+        if len(digitos) == 11:
+            return Q(cpf_numeros=digitos)
+        return Q(cpf_numeros__contains=digitos)
+
+    nome = normalizar_texto(termo)
+    if not nome:
+        return Q()
+    return Q(nome_busca__contains=nome)
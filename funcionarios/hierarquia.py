@@ -0,0 +1,275 @@
+"""
+Hierarquia de funcionários: caminho materializado, índice em memória e cache
+do organograma
+
+Cada funcionário guarda em `caminho_hierarquia` os IDs da raiz até ele
+("/1/5/12/") e em `nivel_hierarquico` a sua profundidade. Subordinados em
+qualquer nível são um intervalo de caminhos (uma consulta indexada) e mover
+subárvores inteiras é um único UPDATE.
+
+Para o organograma, todos os funcionários são carregados em uma única
+consulta e a árvore é montada em memória. O HTML renderizado a partir do
+índice fica em cache até que um funcionário, setor ou função seja alterado
+(ver funcionarios/signals.py).
+"""
+from collections import defaultdict, deque
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, CharField, F, IntegerField, Q, Value, When
+from django.db.models.functions import Concat, Substr
+from django.template.loader import render_to_string
+
+from .busca import filtro_prefixo
+from .models import Funcionario
+
+
+CHAVE_CACHE_ORGANOGRAMA = 'funcionarios:organograma'
+
+
+# ==================== CAMINHO MATERIALIZADO ====================
+
+def filtro_subarvore(caminho, incluir_raiz=True):
+    """Filtro dos funcionários cujo caminho começa com `caminho`"""
+    filtro = filtro_prefixo('caminho_hierarquia', caminho)
+    if not incluir_raiz:
+        filtro &= ~Q(caminho_hierarquia=caminho)
+    return filtro
+
+
+def _posicao_superior(superior_id):
+    """Caminho e nível de quem recebe subordinados (raiz: '/' e -1)"""
+    if superior_id is None:
+        return '/', -1
+    return Funcionario.objects.filter(pk=superior_id).values_list(
+        'caminho_hierarquia', 'nivel_hierarquico'
+    ).get()
+
+
+def _mover_subarvores(movimentos, novo_superior_id=None, raizes=()):
+    """
+    Reescreve caminho e nível de várias subárvores em um único UPDATE
+
+    Args:
+        movimentos: Lista de (caminho_antigo, caminho_novo, variacao_nivel)
+        novo_superior_id: Superior gravado nas raízes movidas
+        raizes: IDs das raízes cujo `superior` também muda
+    """
+    # A subárvore mais profunda vem primeiro: se uma raiz movida estiver
+    # dentro de outra, vale o movimento dela
+    movimentos = sorted(movimentos, key=lambda movimento: len(movimento[0]), reverse=True)
+    filtro = Q()
+    casos_caminho = []
+    casos_nivel = []
+    for antigo, novo, variacao in movimentos:
+        subarvore = filtro_subarvore(antigo)
+        filtro |= subarvore
+        casos_caminho.append(When(subarvore, then=Concat(
+            Value(novo), Substr('caminho_hierarquia', len(antigo) + 1), output_field=CharField()
+        )))
+        casos_nivel.append(When(subarvore, then=F('nivel_hierarquico') + variacao))
+
+    alteracoes = {
+        'caminho_hierarquia': Case(*casos_caminho, default=F('caminho_hierarquia'), output_field=CharField()),
+        'nivel_hierarquico': Case(*casos_nivel, default=F('nivel_hierarquico'), output_field=IntegerField()),
+    }
+    if raizes:
+        alteracoes['superior_id'] = Case(
+            When(pk__in=list(raizes), then=Value(novo_superior_id)),
+            default=F('superior_id'),
+            output_field=IntegerField(),
+        )
+
+    Funcionario.objects.filter(filtro).update(**alteracoes)
+    invalidar_organograma()
+
+
+def atualizar_caminho(funcionario):
+    """
+    Recalcula o caminho do funcionário a partir do superior gravado e, se ele
+    mudou de lugar, move toda a subárvore junto (um único UPDATE)
+    """
+    caminho_superior, nivel_superior = _posicao_superior(funcionario.superior_id)
+    novo = f'{caminho_superior}{funcionario.pk}/'
+    antigo = funcionario.caminho_hierarquia
+    if novo == antigo:
+        return
+
+    if antigo and novo.startswith(antigo):
+        raise ValidationError({'superior': 'O superior não pode ser um subordinado do próprio funcionário.'})
+
+    nivel = nivel_superior + 1
+    if antigo:
+        _mover_subarvores([(antigo, novo, nivel - funcionario.nivel_hierarquico)])
+    else:
+        Funcionario.objects.filter(pk=funcionario.pk).update(caminho_hierarquia=novo, nivel_hierarquico=nivel)
+
+    funcionario.caminho_hierarquia = novo
+    funcionario.nivel_hierarquico = nivel
+
+
+def mover_subordinados(funcionarios, superior):
+    """
+    Coloca os funcionários (com as respectivas subárvores) sob um novo superior
+
+    Todos os caminhos, níveis e o campo `superior` das raízes movidas são
+    reescritos em um único UPDATE.
+
+    Args:
+        funcionarios: QuerySet ou lista de funcionários a mover
+        superior: Novo superior (None = topo da hierarquia)
+
+    Returns:
+        int: Quantidade de funcionários movidos (sem contar os subordinados)
+    """
+    if isinstance(funcionarios, (list, tuple, set)):
+        funcionarios = Funcionario.objects.filter(pk__in=[f.pk for f in funcionarios])
+    raizes = list(funcionarios.values_list('pk', 'caminho_hierarquia', 'nivel_hierarquico'))
+    if not raizes:
+        return 0
+
+    superior_id = superior.pk if superior else None
+    caminho_superior, nivel_superior = _posicao_superior(superior_id)
+    movimentos = []
+    for pk, caminho, nivel in raizes:
+        if caminho_superior.startswith(caminho):
+            raise ValidationError('O novo superior não pode ser subordinado de um dos funcionários movidos.')
+        movimentos.append((caminho, f'{caminho_superior}{pk}/', nivel_superior + 1 - nivel))
+
+    _mover_subarvores(movimentos, superior_id, [pk for pk, _, _ in raizes])
+    return len(raizes)
+
+
+class HierarquiaIndex:
+    """Árvore de subordinação montada em memória a partir de uma consulta"""
+
+    def __init__(self, funcionarios):
+        """
+        Args:
+            funcionarios: Funcionários (todos, de qualquer status) já carregados
+        """
+        self.funcionarios = {funcionario.pk: funcionario for funcionario in funcionarios}
+        # Assim como get_subordinados_diretos, só considera subordinados ativos
+        self.filhos = defaultdict(list)
+        for funcionario in self.funcionarios.values():
+            if funcionario.superior_id and funcionario.status == 'A':
+                self.filhos[funcionario.superior_id].append(funcionario)
+
+    @classmethod
+    def carregar(cls):
+        """Carrega todos os funcionários em uma única consulta"""
+        return cls(
+            Funcionario.objects.select_related('funcao', 'setor', 'setor_chefiado').order_by('nome_completo')
+        )
+
+    def raizes(self):
+        """Funcionários ativos no topo da hierarquia (sem superior)"""
+        return [
+            funcionario for funcionario in self.funcionarios.values()
+            if funcionario.superior_id is None and funcionario.status == 'A'
+        ]
+
+    def subordinados_diretos(self, funcionario_id):
+        """Subordinados diretos ativos"""
+        return self.filhos.get(funcionario_id, [])
+
+    def todos_subordinados(self, funcionario_id):
+        """Todos os subordinados ativos, nível a nível"""
+        subordinados = []
+        fila = deque([funcionario_id])
+        visitados = {funcionario_id}
+        while fila:
+            for subordinado in self.subordinados_diretos(fila.popleft()):
+                # Protege contra ciclos cadastrados por engano
+                if subordinado.pk in visitados:
+                    continue
+                visitados.add(subordinado.pk)
+                subordinados.append(subordinado)
+                fila.append(subordinado.pk)
+        return subordinados
+
+    def cadeia_superior(self, funcionario_id):
+        """Cadeia hierárquica acima do funcionário, do superior direto até o topo"""
+        cadeia = []
+        visitados = {funcionario_id}
+        atual = self.funcionarios[funcionario_id].superior_id
+        while atual and atual not in visitados:
+            visitados.add(atual)
+            cadeia.append(self.funcionarios[atual])
+            atual = self.funcionarios[atual].superior_id
+        return cadeia
+
+    def nivel(self, funcionario_id):
+        """Nível hierárquico (0 = topo, sem superior)"""
+        return len(self.cadeia_superior(funcionario_id))
+
+    def arvore(self):
+        """
+        Árvore pronta para o template do organograma
+
+        Returns:
+            list: Nós {'funcionario', 'nivel', 'subordinados'} a partir das raízes
+        """
+        def montar(funcionario, nivel, caminho):
+            return {
+                'funcionario': funcionario,
+                'nivel': nivel,
+                'subordinados': [
+                    montar(subordinado, nivel + 1, caminho | {subordinado.pk})
+                    for subordinado in self.subordinados_diretos(funcionario.pk)
+                    if subordinado.pk not in caminho
+                ],
+            }
+
+        return [montar(raiz, 0, {raiz.pk}) for raiz in self.raizes()]
+
+    def setores(self, setores):
+        """
+        Equipe ativa de cada setor com a quantidade de subordinados diretos
+
+        Returns:
+            list: Itens {'setor', 'equipe': [(funcionario, qtd_subordinados)]}
+        """
+        por_setor = defaultdict(list)
+        for funcionario in self.funcionarios.values():
+            if funcionario.status == 'A':
+                por_setor[funcionario.setor_id].append(
+                    (funcionario, len(self.subordinados_diretos(funcionario.pk)))
+                )
+        return [{'setor': setor, 'equipe': por_setor[setor.pk]} for setor in setores]
+
+
+def renderizar_organograma():
+    """
+    HTML do organograma (visões hierárquica e por setores)
+
+    Reaproveita o cache enquanto a hierarquia não mudar.
+    """
+    html = cache.get(CHAVE_CACHE_ORGANOGRAMA)
+    if html is None:
+        from core.models import Setor
+
+        indice = HierarquiaIndex.carregar()
+        html = render_to_string('funcionarios/_organograma_conteudo.html', {
+            'arvore': indice.arvore(),
+            'setores': indice.setores(
+                Setor.objects.filter(ativo=True).select_related('chefe__funcao')
+            ),
+            'total_funcionarios': sum(
+                1 for funcionario in indice.funcionarios.values() if funcionario.status == 'A'
+            ),
+        })
+        cache.set(CHAVE_CACHE_ORGANOGRAMA, html, None)
+    return html
+
+
+def invalidar_organograma():
+    """
+    Descarta o organograma em cache
+
+    O descarte é repetido após o commit da transação corrente, para que uma
+    requisição concorrente não volte a guardar a árvore anterior à alteração.
+    """
+    cache.delete(CHAVE_CACHE_ORGANOGRAMA)
+    transaction.on_commit(lambda: cache.delete(CHAVE_CACHE_ORGANOGRAMA))
@@ -4,6 +4,7 @@ baseada nos chefes de setor
 """
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from funcionarios.hierarquia import mover_subordinados
 from funcionarios.models import Funcionario
 from core.models import Setor
 
@@ -43,14 +44,17 @@ class Command(BaseCommand):
                     superior__isnull=True
                 ).exclude(pk=setor.chefe.pk)
             
+            # Quem está acima do chefe não pode passar a ser subordinado dele
+            funcionarios = funcionarios.exclude(pk__in=setor.chefe.get_ids_hierarquia_superior())
+            
             count = funcionarios.count()
             
             if count == 0:
                 self.stdout.write(self.style.WARNING(f'  Nenhum funcionário para atualizar'))
                 continue
             
-            # Atualizar superior
-            funcionarios.update(superior=setor.chefe)
+            # Atualizar superior (e o caminho hierárquico das subárvores) em um único UPDATE
+            mover_subordinados(funcionarios, setor.chefe)
             total_atualizados += count
             
             self.stdout.write(self.style.SUCCESS(f'  ✓ {count} funcionário(s) atualizado(s)'))
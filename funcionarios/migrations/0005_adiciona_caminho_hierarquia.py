@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:37
+
+from collections import defaultdict, deque
+
+from django.db import migrations, models
+
+
+def preencher_caminhos(apps, schema_editor):
+    """Calcula o caminho hierárquico e o nível dos funcionários existentes"""
+    Funcionario = apps.get_model('funcionarios', 'Funcionario')
+    
+    funcionarios = {f.pk: f for f in Funcionario.objects.only('pk', 'superior_id')}
+    filhos = defaultdict(list)
+    for funcionario in funcionarios.values():
+        if funcionario.superior_id in funcionarios:
+            filhos[funcionario.superior_id].append(funcionario)
+    
+    # Percorre a árvore a partir das raízes; funcionários presos em ciclos
+    # (nunca alcançados) ficam como raízes de si mesmos
+    raizes = [f for f in funcionarios.values() if f.superior_id not in funcionarios]
+    for funcionario in raizes:
+        funcionario.caminho_hierarquia, funcionario.nivel_hierarquico = f'/{funcionario.pk}/', 0
+    fila = deque(raizes)
+    while fila:
+        atual = fila.popleft()
+        for filho in filhos[atual.pk]:
+            filho.caminho_hierarquia = f'{atual.caminho_hierarquia}{filho.pk}/'
+            filho.nivel_hierarquico = atual.nivel_hierarquico + 1
+            fila.append(filho)
+    
+    for funcionario in funcionarios.values():
+        if not funcionario.caminho_hierarquia:
+            funcionario.caminho_hierarquia, funcionario.nivel_hierarquico = f'/{funcionario.pk}/', 0
+    
+    Funcionario.objects.bulk_update(
+        funcionarios.values(), ['caminho_hierarquia', 'nivel_hierarquico'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funcionarios', '0004_adiciona_participa_folha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcionario',
+            name='caminho_hierarquia',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=500, verbose_name='Caminho Hierárquico'),
+        ),
+        migrations.AddField(
+            model_name='funcionario',
+            name='nivel_hierarquico',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Nível Hierárquico'),
+        ),
+        migrations.RunPython(preencher_caminhos, migrations.RunPython.noop),
+    ]
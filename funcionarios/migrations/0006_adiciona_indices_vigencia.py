@@ -0,0 +1,82 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+def contratos_sobrepostos(Contrato) -> list:
+    """
+    Pares (funcionário, contrato, contrato) com vigências sobrepostas
+
+    A validação antiga do Contrato deixava passar sobreposições; a restrição
+    do banco não pode ser criada enquanto elas existirem.
+    """
+    pares = []
+    anteriores = []
+    contratos = Contrato.objects.order_by('funcionario_id', 'data_inicio', 'pk').values_list(
+        'pk', 'funcionario_id', 'data_inicio', 'data_fim'
+    )
+    for pk, funcionario_id, inicio, fim in contratos:
+        anteriores = [c for c in anteriores if c[1] == funcionario_id]
+        for outro_pk, _, _, outro_fim in anteriores:
+            if outro_fim is None or outro_fim >= inicio:
+                pares.append((funcionario_id, outro_pk, pk))
+        anteriores.append((pk, funcionario_id, inicio, fim))
+    return pares
+
+
+def criar_exclusao_contratos(apps, schema_editor):
+    """
+    No PostgreSQL, impede no banco contratos sobrepostos do mesmo funcionário
+    (GiST sobre daterange; fim vazio = vigência em aberto)
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    sobrepostos = contratos_sobrepostos(apps.get_model('funcionarios', 'Contrato'))
+    if sobrepostos:
+        lista = '; '.join(
+            f'funcionário {funcionario_id}: contratos {a} e {b}' for funcionario_id, a, b in sobrepostos
+        )
+        raise RuntimeError(
+            f'Há {len(sobrepostos)} par(es) de contratos com vigências sobrepostas ({lista}). '
+            'Ajuste a data de fim (ou exclua) um dos contratos de cada par e rode a migração novamente.'
+        )
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        'ALTER TABLE funcionarios_contrato ADD CONSTRAINT contrato_sem_sobreposicao '
+        "EXCLUDE USING gist (funcionario_id WITH =, daterange(data_inicio, data_fim, '[]') WITH &&)"
+    )
+
+
+def remover_exclusao_contratos(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE funcionarios_contrato DROP CONSTRAINT IF EXISTS contrato_sem_sobreposicao')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funcionarios', '0005_adiciona_caminho_hierarquia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['funcionario', 'data_inicio', 'data_fim'], name='contrato_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contrato',
+            index=models.Index(fields=['data_inicio', 'data_fim'], name='contrato_periodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentofixo',
+            index=models.Index(fields=['funcionario', 'data_inicio', 'data_fim'], name='lancfixo_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamentofixo',
+            index=models.Index(fields=['data_inicio', 'data_fim'], name='lancfixo_periodo_idx'),
+        ),
+        migrations.RunPython(criar_exclusao_contratos, remover_exclusao_contratos),
+    ]
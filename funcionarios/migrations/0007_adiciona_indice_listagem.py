@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funcionarios', '0006_adiciona_indices_vigencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='funcionario',
+            index=models.Index(fields=['status', 'nome_completo', 'id'], name='func_listagem_idx'),
+        ),
+    ]
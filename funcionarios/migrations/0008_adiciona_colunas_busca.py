@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:44
+
+from django.db import migrations, models
+
+from funcionarios.busca import normalizar_texto, somente_digitos
+
+
+def preencher_colunas_busca(apps, schema_editor):
+    Funcionario = apps.get_model('funcionarios', 'Funcionario')
+    funcionarios = list(Funcionario.objects.only('pk', 'nome_completo', 'cpf'))
+    for funcionario in funcionarios:
+        funcionario.nome_busca = normalizar_texto(funcionario.nome_completo)
+        funcionario.cpf_numeros = somente_digitos(funcionario.cpf)
+    Funcionario.objects.bulk_update(funcionarios, ['nome_busca', 'cpf_numeros'], batch_size=500)
+
+
+def criar_indice_trigramas(apps, schema_editor):
+    """No PostgreSQL, índice de trigramas para a busca por trecho do nome"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS func_nome_busca_trgm '
+        'ON funcionarios_funcionario USING gin (nome_busca gin_trgm_ops)'
+    )
+
+
+def remover_indice_trigramas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS func_nome_busca_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funcionarios', '0007_adiciona_indice_listagem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='funcionario',
+            name='cpf_numeros',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=11, verbose_name='CPF (somente dígitos)'),
+        ),
+        migrations.AddField(
+            model_name='funcionario',
+            name='nome_busca',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, verbose_name='Nome para Busca'),
+        ),
+        migrations.RunPython(preencher_colunas_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_trigramas, remover_indice_trigramas),
+    ]
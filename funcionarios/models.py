@@ -1,7 +1,7 @@
 """
 Modelos relacionados a Funcionários, Contratos, Lançamentos Fixos, Adiantamentos e Férias
 """
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -9,12 +9,16 @@ from validate_docbr import CPF
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 
-from core.models import TimeStampedModel, Setor, Funcao, TipoContrato, ProventoDesconto
+from core.models import RastreioAlteracoesMixin, TimeStampedModel, ValidacaoAoSalvarMixin, Setor, Funcao, TipoContrato, ProventoDesconto
+from core.vigencia import VigenciaQuerySet, indices_vigencia
 
 
-class Funcionario(TimeStampedModel):
+class Funcionario(RastreioAlteracoesMixin, ValidacaoAoSalvarMixin, TimeStampedModel):
     """Cadastro de funcionários"""
     
+    # Alterações que mexem na hierarquia (ver funcionarios/signals.py)
+    campos_rastreados = ('setor_id', 'superior_id')
+    
     STATUS_CHOICES = [
         ('A', 'Ativo'),
         ('I', 'Inativo'),
@@ -67,6 +71,24 @@ class Funcionario(TimeStampedModel):
         related_name='subordinados',
         help_text='Funcionário responsável direto por este colaborador'
     )
+    # Caminho materializado (IDs da raiz até o funcionário) e profundidade,
+    # mantidos no save() - ver funcionarios/hierarquia.py
+    caminho_hierarquia = models.CharField(
+        'Caminho Hierárquico',
+        max_length=500,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
+    nivel_hierarquico = models.PositiveSmallIntegerField(
+        'Nível Hierárquico',
+        default=0,
+        editable=False
+    )
+    
+    # Colunas normalizadas para a busca, mantidas no save() - ver funcionarios/busca.py
+    nome_busca = models.CharField('Nome para Busca', max_length=200, blank=True, db_index=True, editable=False)
+    cpf_numeros = models.CharField('CPF (somente dígitos)', max_length=11, blank=True, db_index=True, editable=False)
     
     observacoes = models.TextField('Observações', blank=True)
 
@@ -74,6 +96,10 @@ class Funcionario(TimeStampedModel):
         verbose_name = 'Funcionário'
         verbose_name_plural = 'Funcionários'
         ordering = ['nome_completo']
+        indexes = [
+            # Listagem paginada por cursor: filtro de status + ordem por nome
+            models.Index(fields=['status', 'nome_completo', 'id'], name='func_listagem_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome_completo} - {self.cpf}"
@@ -88,10 +114,48 @@ class Funcionario(TimeStampedModel):
         
         # Formata o CPF
         self.cpf = cpf_validator.mask(cpf_limpo)
+        
+        # O superior não pode estar abaixo do funcionário na hierarquia
+        if self.superior_id and self.caminho_hierarquia:
+            if self.superior_id == self.pk or self.superior.caminho_hierarquia.startswith(self.caminho_hierarquia):
+                raise ValidationError({'superior': 'O superior não pode ser um subordinado do próprio funcionário.'})
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        from .busca import normalizar_texto, somente_digitos
+        from .hierarquia import atualizar_caminho
+        
+        update_fields = kwargs.get('update_fields')
+        hierarquia_alterada = update_fields is None or 'superior' in update_fields
+        
+        self.nome_busca = normalizar_texto(self.nome_completo)
+        self.cpf_numeros = somente_digitos(self.cpf)
+        if update_fields is not None:
+            campos = set(update_fields)
+            if 'nome_completo' in campos:
+                campos.add('nome_busca')
+            if 'cpf' in campos:
+                campos.add('cpf_numeros')
+            kwargs['update_fields'] = campos
+        
+        with transaction.atomic():
+            if self.pk and update_fields is None:
+                # O caminho em memória pode estar desatualizado (subárvore movida
+                # depois do carregamento); grava sempre o do banco
+                atual = Funcionario.objects.filter(pk=self.pk).values_list(
+                    'caminho_hierarquia', 'nivel_hierarquico'
+                ).first()
+                if atual:
+                    self.caminho_hierarquia, self.nivel_hierarquico = atual
+            
+            superior_anterior = self.valor_gravado('superior_id')
+            super().save(*args, **kwargs)
+            
+            # O superior pode ter mudado no pre_save (superior automático);
+            # sem mudança, o caminho gravado continua valendo
+            if hierarquia_alterada and (
+                not self.caminho_hierarquia or self.superior_id != superior_anterior
+            ):
+                atualizar_caminho(self)
 
     @property
     def contrato_ativo(self):
@@ -116,20 +180,28 @@ class Funcionario(TimeStampedModel):
         return self.subordinados.filter(status='A')
     
     def get_todos_subordinados(self):
-        """Retorna todos os subordinados (recursivo) deste funcionário"""
-        subordinados = list(self.subordinados.filter(status='A'))
-        for subordinado in list(subordinados):
-            subordinados.extend(subordinado.get_todos_subordinados())
-        return subordinados
+        """Retorna todos os subordinados ativos, em qualquer nível (uma consulta pelo caminho)"""
+        if not self.caminho_hierarquia:
+            return []
+        
+        from .hierarquia import filtro_subarvore
+        return list(Funcionario.objects.filter(
+            filtro_subarvore(self.caminho_hierarquia, incluir_raiz=False),
+            status='A'
+        ).order_by('nivel_hierarquico', 'nome_completo'))
+    
+    def get_ids_hierarquia_superior(self):
+        """IDs da cadeia superior, lidos do caminho hierárquico (sem consulta)"""
+        ids = [int(pk) for pk in self.caminho_hierarquia.strip('/').split('/') if pk]
+        return [pk for pk in ids if pk != self.pk]
     
     def get_hierarquia_superior(self):
-        """Retorna a cadeia hierárquica superior (até o topo)"""
-        hierarquia = []
-        atual = self.superior
-        while atual:
-            hierarquia.append(atual)
-            atual = atual.superior
-        return hierarquia
+        """Retorna a cadeia hierárquica superior, do superior direto até o topo (uma consulta)"""
+        ids = self.get_ids_hierarquia_superior()
+        if not ids:
+            return []
+        
+        return list(Funcionario.objects.filter(pk__in=ids).select_related('funcao').order_by('-nivel_hierarquico'))
     
     def is_chefe(self):
         """Verifica se o funcionário é chefe de algum setor"""
@@ -137,15 +209,10 @@ class Funcionario(TimeStampedModel):
     
     def get_nivel_hierarquico(self):
         """Retorna o nível hierárquico (0 = topo, sem superior)"""
-        nivel = 0
-        atual = self.superior
-        while atual:
-            nivel += 1
-            atual = atual.superior
-        return nivel
+        return self.nivel_hierarquico
 
 
-class Contrato(TimeStampedModel):
+class Contrato(ValidacaoAoSalvarMixin, TimeStampedModel):
     """Contratos de trabalho dos funcionários"""
     funcionario = models.ForeignKey(
         Funcionario,
@@ -167,10 +234,13 @@ class Contrato(TimeStampedModel):
     
     observacoes = models.TextField('Observações', blank=True)
 
+    objects = VigenciaQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Contrato'
         verbose_name_plural = 'Contratos'
         ordering = ['-data_inicio']
+        indexes = indices_vigencia('contrato', 'funcionario')
 
     def __str__(self):
         if hasattr(self, 'funcionario') and self.funcionario:
@@ -186,29 +256,15 @@ class Contrato(TimeStampedModel):
         if not hasattr(self, 'funcionario') or self.funcionario is None:
             return
         
-        # Verifica sobreposição de contratos
+        # Verifica sobreposição de contratos (consulta pelo índice de vigência)
         contratos_sobrepostos = Contrato.objects.filter(
             funcionario=self.funcionario
-        ).exclude(pk=self.pk)
+        ).exclude(pk=self.pk).sobrepostos(self.data_inicio, self.data_fim)
         
-        for contrato in contratos_sobrepostos:
-            # Contrato sem data fim (ativo indefinidamente)
-            if not contrato.data_fim:
-                if not self.data_fim or self.data_fim >= contrato.data_inicio:
-                    if self.data_inicio <= contrato.data_inicio or not self.data_fim:
-                        raise ValidationError(
-                            'Já existe um contrato ativo para este funcionário neste período'
-                        )
-            # Verifica sobreposição de datas
-            elif (self.data_inicio <= contrato.data_fim and 
-                  (not self.data_fim or self.data_fim >= contrato.data_inicio)):
-                raise ValidationError(
-                    'Já existe um contrato ativo para este funcionário neste período'
-                )
-
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        if contratos_sobrepostos.exists():
+            raise ValidationError(
+                'Já existe um contrato ativo para este funcionário neste período'
+            )
 
     @property
     def esta_ativo(self):
@@ -219,7 +275,7 @@ class Contrato(TimeStampedModel):
         return self.data_inicio <= hoje
 
 
-class LancamentoFixo(TimeStampedModel):
+class LancamentoFixo(ValidacaoAoSalvarMixin, TimeStampedModel):
     """Lançamentos fixos recorrentes na folha de pagamento"""
     
     funcionario = models.ForeignKey(
@@ -260,10 +316,13 @@ class LancamentoFixo(TimeStampedModel):
     )
     observacoes = models.TextField('Observações', blank=True)
 
+    objects = VigenciaQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Lançamento Fixo'
         verbose_name_plural = 'Lançamentos Fixos'
         ordering = ['-data_inicio']
+        indexes = indices_vigencia('lancfixo', 'funcionario')
 
     def __str__(self):
         return f"{self.funcionario.nome_completo} - {self.provento_desconto.nome}"
@@ -280,10 +339,6 @@ class LancamentoFixo(TimeStampedModel):
         if self.valor and self.percentual:
             raise ValidationError('Informe apenas valor fixo OU percentual, não ambos')
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
     @property
     def esta_ativo(self):
         """Verifica se o lançamento está ativo"""
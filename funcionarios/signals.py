@@ -1,13 +1,37 @@
 """
 Signals para o app Funcionários
 """
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+
+from core.models import Funcao, Setor
+from .hierarquia import invalidar_organograma, mover_subordinados
 from .models import Funcionario
 
 
+def _grava_hierarquia(update_fields):
+    """Se a gravação inclui setor ou superior (toda gravação sem update_fields inclui)"""
+    return update_fields is None or bool({'setor', 'superior'} & set(update_fields))
+
+
+def _adotar_funcionarios_sem_superior(chefe, setor_id):
+    """
+    Coloca sob o chefe os funcionários do setor que estão sem superior
+
+    Quem está acima do chefe na hierarquia não pode passar a ser subordinado
+    dele. Um único UPDATE (sem signals, evitando recursão), que também
+    reescreve o caminho hierárquico das subárvores movidas.
+    """
+    funcionarios_sem_superior = Funcionario.objects.filter(
+        setor_id=setor_id,
+        superior__isnull=True
+    ).exclude(pk=chefe.pk).exclude(pk__in=chefe.get_ids_hierarquia_superior())
+    
+    mover_subordinados(funcionarios_sem_superior, chefe)
+
+
 @receiver(pre_save, sender=Funcionario)
-def atribuir_superior_automatico(sender, instance, **kwargs):
+def atribuir_superior_automatico(sender, instance, update_fields=None, **kwargs):
     """
     Automaticamente define o chefe do setor como superior do funcionário,
     SOMENTE se o superior não foi definido manualmente.
@@ -16,46 +40,76 @@ def atribuir_superior_automatico(sender, instance, **kwargs):
     - Se superior está preenchido → usa o superior definido manualmente
     - Se superior está vazio → usa o chefe do setor automaticamente
     - Chefe do setor nunca será seu próprio superior
+    
+    Só age quando o funcionário é novo ou teve setor/superior alterados; nas
+    demais gravações não consulta nada.
     """
     # Se já tem superior definido manualmente, respeita a escolha
-    if instance.superior:
+    if instance.superior_id or not instance.setor_id:
         return
     
-    # Se não tem setor, não pode definir superior automático
-    if not instance.setor:
+    if update_fields is not None and 'superior' not in update_fields:
         return
     
-    # Se o setor não tem chefe, não pode definir superior automático
-    if not instance.setor.chefe:
+    if not instance.campos_alterados():
         return
     
-    # Não pode ser seu próprio superior (caso seja o chefe do setor)
-    if instance.pk and instance.setor.chefe.pk == instance.pk:
-        return
+    chefe_id = Setor.objects.filter(pk=instance.setor_id).values_list('chefe_id', flat=True).first()
     
-    # Define o chefe do setor como superior automaticamente
-    instance.superior = instance.setor.chefe
+    # Não pode ser seu próprio superior (caso seja o chefe do setor)
+    if chefe_id and chefe_id != instance.pk:
+        instance.superior_id = chefe_id
 
 
 @receiver(post_save, sender=Funcionario)
-def atualizar_subordinados_ao_definir_chefe_setor(sender, instance, created, **kwargs):
+def atualizar_subordinados_ao_definir_chefe_setor(sender, instance, created, update_fields=None,
+                                                  raw=False, **kwargs):
     """
-    Quando um funcionário é definido como chefe de um setor,
-    atualiza automaticamente todos os funcionários daquele setor
-    para terem ele como superior (exceto se já tiverem superior definido).
+    Quando o chefe de um setor muda de lugar na hierarquia, os funcionários
+    do setor sem superior passam a tê-lo como superior.
+    
+    Funcionários novos ainda não chefiam setor; gravações que não mexem em
+    setor/superior não fazem nenhuma consulta.
     """
-    # Verifica se é chefe de algum setor
-    if not instance.is_chefe():
+    if raw or created or not _grava_hierarquia(update_fields) or not instance.campos_alterados():
         return
     
-    setor = instance.setor_chefiado
-    
-    # Atualiza funcionários do setor que não têm superior ou têm o chefe antigo
-    funcionarios_sem_superior = setor.funcionarios.filter(
-        superior__isnull=True
-    ).exclude(pk=instance.pk)
+    setor_id = Setor.objects.filter(chefe=instance).values_list('pk', flat=True).first()
+    if setor_id is not None:
+        _adotar_funcionarios_sem_superior(instance, setor_id)
+
+
+@receiver(post_save, sender=Setor)
+def atualizar_subordinados_ao_trocar_chefe(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Ao definir (ou trocar) o chefe do setor, os funcionários sem superior passam a tê-lo como superior"""
+    if raw or not instance.chefe_id:
+        return
+    if update_fields is not None and 'chefe' not in update_fields:
+        return
+    if 'chefe_id' not in instance.campos_alterados():
+        return
     
-    for funcionario in funcionarios_sem_superior:
-        funcionario.superior = instance
-        # Usa update() para evitar recursão infinita
-        Funcionario.objects.filter(pk=funcionario.pk).update(superior=instance)
+    _adotar_funcionarios_sem_superior(instance.chefe, instance.pk)
+
+
+@receiver(pre_delete, sender=Funcionario)
+def promover_subordinados_ao_excluir(sender, instance, **kwargs):
+    """
+    Antes de excluir um funcionário, seus subordinados diretos sobem para o
+    topo da hierarquia (o SET_NULL do banco não atualizaria o caminho).
+    """
+    mover_subordinados(instance.subordinados.all(), None)
+
+
+@receiver(post_save, sender=Funcionario)
+@receiver(post_delete, sender=Funcionario)
+@receiver(post_save, sender=Setor)
+@receiver(post_delete, sender=Setor)
+@receiver(post_save, sender=Funcao)
+@receiver(post_delete, sender=Funcao)
+def invalidar_cache_organograma(sender, **kwargs):
+    """
+    Descarta o organograma em cache quando muda algo exibido nele:
+    hierarquia, dados do funcionário, chefia/nome do setor ou nome da função.
+    """
+    invalidar_organograma()
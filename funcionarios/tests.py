@@ -1,12 +1,22 @@
 """
 Testes para o app Funcionários
 """
+import importlib
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.urls import reverse
 from datetime import date, timedelta
 from decimal import Decimal
+from validate_docbr import CPF
 
 from core.models import Setor, Funcao, TipoContrato, ProventoDesconto
+from core.paginacao import paginar_por_cursor
+from funcionarios.busca import filtro_busca, normalizar_texto
+from funcionarios.hierarquia import HierarquiaIndex, mover_subordinados, renderizar_organograma
 from funcionarios.models import Funcionario, Contrato, LancamentoFixo, Adiantamento
 
 
@@ -19,7 +29,7 @@ class FuncionarioModelTest(TestCase):
         
         self.funcionario = Funcionario.objects.create(
             nome_completo='João Silva',
-            cpf='12345678901',
+            cpf='12345678909',
             data_admissao=date(2023, 1, 1),
             funcao=self.funcao,
             setor=self.setor,
@@ -61,13 +71,31 @@ class ContratoModelTest(TestCase):
         
         self.funcionario = Funcionario.objects.create(
             nome_completo='João Silva',
-            cpf='12345678901',
+            cpf='12345678909',
             data_admissao=date(2023, 1, 1),
             funcao=funcao,
             setor=setor,
             salario_base=5000.00
         )
 
+    def test_migracao_acusa_contratos_sobrepostos(self):
+        """Testa que a migração da restrição no banco lista os contratos sobrepostos já gravados"""
+        migracao = importlib.import_module('funcionarios.migrations.0006_adiciona_indices_vigencia')
+        # bulk_create não passa pela validação, como os dados gravados antes dela
+        primeiro, segundo, terceiro = Contrato.objects.bulk_create([
+            Contrato(funcionario=self.funcionario, tipo_contrato=self.tipo_contrato,
+                     data_inicio=date(2023, 1, 1), data_fim=date(2023, 6, 30), carga_horaria=40),
+            Contrato(funcionario=self.funcionario, tipo_contrato=self.tipo_contrato,
+                     data_inicio=date(2023, 7, 1), carga_horaria=40),
+            Contrato(funcionario=self.funcionario, tipo_contrato=self.tipo_contrato,
+                     data_inicio=date(2024, 1, 1), carga_horaria=40),
+        ])
+
+        self.assertEqual(
+            migracao.contratos_sobrepostos(Contrato),
+            [(self.funcionario.pk, segundo.pk, terceiro.pk)],
+        )
+
     def test_contrato_creation(self):
         """Testa criação de contrato"""
         contrato = Contrato.objects.create(
@@ -91,6 +119,56 @@ class ContratoModelTest(TestCase):
         with self.assertRaises(ValidationError):
             contrato.save()
 
+    def _contrato(self, inicio, fim=None):
+        return Contrato.objects.create(
+            funcionario=self.funcionario,
+            tipo_contrato=self.tipo_contrato,
+            data_inicio=inicio,
+            data_fim=fim,
+            carga_horaria=40
+        )
+
+    def test_contrato_sobreposto(self):
+        """Testa que contratos sobrepostos são recusados com uma única consulta"""
+        self._contrato(date(2023, 1, 1), date(2023, 12, 31))
+        self._contrato(date(2024, 3, 1))
+
+        for inicio, fim in [(date(2023, 6, 1), None), (date(2023, 12, 31), date(2024, 1, 31)),
+                            (date(2024, 5, 1), date(2024, 6, 30))]:
+            contrato = Contrato(
+                funcionario=self.funcionario,
+                tipo_contrato=self.tipo_contrato,
+                data_inicio=inicio,
+                data_fim=fim,
+                carga_horaria=40
+            )
+            with self.assertRaises(ValidationError):
+                contrato.clean()
+
+        # Entre os dois contratos existentes ainda há espaço
+        contrato = Contrato(
+            funcionario=self.funcionario,
+            tipo_contrato=self.tipo_contrato,
+            data_inicio=date(2024, 1, 1),
+            data_fim=date(2024, 2, 29),
+            carga_horaria=40
+        )
+        with self.assertNumQueries(1):
+            contrato.clean()
+
+    def test_vigentes_em(self):
+        """Testa a consulta de contratos vigentes no período"""
+        encerrado = self._contrato(date(2023, 1, 1), date(2024, 1, 15))
+        atual = self._contrato(date(2024, 2, 1))
+
+        self.assertEqual(list(Contrato.objects.vigentes_em(date(2024, 1, 15))), [encerrado])
+        self.assertEqual(list(Contrato.objects.vigentes_em(date(2024, 1, 16))), [])
+        self.assertEqual(list(Contrato.objects.vigentes_na_competencia(1, 2024)), [encerrado])
+        self.assertEqual(list(Contrato.objects.vigentes_na_competencia(2, 2030)), [atual])
+        self.assertEqual(
+            set(Contrato.objects.vigentes_em(date(2024, 1, 1), date(2024, 2, 1))), {encerrado, atual}
+        )
+
 
 class LancamentoFixoModelTest(TestCase):
     """Testes para o modelo LancamentoFixo"""
@@ -101,7 +179,7 @@ class LancamentoFixoModelTest(TestCase):
         
         self.funcionario = Funcionario.objects.create(
             nome_completo='João Silva',
-            cpf='12345678901',
+            cpf='12345678909',
             data_admissao=date(2023, 1, 1),
             funcao=funcao,
             setor=setor,
@@ -152,7 +230,7 @@ class AdiantamentoModelTest(TestCase):
         
         self.funcionario = Funcionario.objects.create(
             nome_completo='João Silva',
-            cpf='12345678901',
+            cpf='12345678909',
             data_admissao=date(2023, 1, 1),
             funcao=funcao,
             setor=setor,
@@ -178,3 +256,315 @@ class AdiantamentoModelTest(TestCase):
         )
         self.assertIn('João Silva', str(adiantamento))
         self.assertIn('500', str(adiantamento))
+
+
+class OrganogramaTest(TestCase):
+    """Testes do índice da hierarquia e do organograma em cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.setor = Setor.objects.create(nome='TI')
+        self.funcao = Funcao.objects.create(nome='Desenvolvedor')
+        self.diretor = self._criar('Diretor')
+        self.gerente = self._criar('Gerente', superior=self.diretor)
+        self.analista = self._criar('Analista', superior=self.gerente)
+        self.estagiario = self._criar('Estagiário', superior=self.gerente)
+
+    def _criar(self, nome, superior=None):
+        return Funcionario.objects.create(
+            nome_completo=nome,
+            cpf=CPF().generate(),
+            data_admissao=date(2023, 1, 1),
+            funcao=self.funcao,
+            setor=self.setor,
+            salario_base=Decimal('3000.00'),
+            superior=superior
+        )
+
+    def test_indice_hierarquia(self):
+        """Testa subordinados, cadeia superior e nível a partir do índice"""
+        with self.assertNumQueries(1):
+            indice = HierarquiaIndex.carregar()
+
+        self.assertEqual(indice.raizes(), [self.diretor])
+        self.assertEqual(indice.subordinados_diretos(self.gerente.pk), [self.analista, self.estagiario])
+        self.assertEqual(
+            set(indice.todos_subordinados(self.diretor.pk)),
+            {self.gerente, self.analista, self.estagiario}
+        )
+        self.assertEqual(indice.cadeia_superior(self.analista.pk), [self.gerente, self.diretor])
+        self.assertEqual(indice.nivel(self.estagiario.pk), 2)
+
+    def test_metodos_do_modelo_usam_caminho(self):
+        """Testa subordinados, cadeia e nível pelo caminho materializado"""
+        self.assertEqual(self.analista.caminho_hierarquia, f'/{self.diretor.pk}/{self.gerente.pk}/{self.analista.pk}/')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.diretor.get_todos_subordinados()), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.analista.get_hierarquia_superior(), [self.gerente, self.diretor])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.analista.get_nivel_hierarquico(), 2)
+
+    def test_mudar_superior_move_subarvore(self):
+        """Testa que trocar o superior reescreve o caminho de toda a subárvore"""
+        novo_diretor = self._criar('Novo Diretor')
+        self.gerente.superior = novo_diretor
+        self.gerente.save()
+
+        self.analista.refresh_from_db()
+        self.assertEqual(
+            self.analista.caminho_hierarquia,
+            f'/{novo_diretor.pk}/{self.gerente.pk}/{self.analista.pk}/'
+        )
+        self.assertEqual(self.analista.nivel_hierarquico, 2)
+        self.assertEqual(self.diretor.get_todos_subordinados(), [])
+
+    def test_mover_subordinados_em_um_update(self):
+        """Testa a movimentação em lote de várias subárvores"""
+        coordenador = self._criar('Coordenador', superior=self.diretor)
+
+        with self.assertNumQueries(3):
+            movidos = mover_subordinados(
+                Funcionario.objects.filter(pk__in=[self.analista.pk, self.estagiario.pk]), coordenador
+            )
+
+        self.assertEqual(movidos, 2)
+        self.estagiario.refresh_from_db()
+        self.assertEqual(self.estagiario.superior, coordenador)
+        self.assertEqual(self.estagiario.nivel_hierarquico, 2)
+        self.assertEqual(self.gerente.get_todos_subordinados(), [])
+
+    def test_superior_nao_pode_ser_subordinado(self):
+        """Testa que a hierarquia não aceita ciclos"""
+        self.diretor.superior = self.analista
+        with self.assertRaises(ValidationError):
+            self.diretor.save()
+
+    def test_excluir_promove_subordinados(self):
+        """Testa que os subordinados de um funcionário excluído sobem para o topo"""
+        self.gerente.delete()
+
+        self.analista.refresh_from_db()
+        self.assertIsNone(self.analista.superior)
+        self.assertEqual(self.analista.caminho_hierarquia, f'/{self.analista.pk}/')
+        self.assertEqual(self.analista.nivel_hierarquico, 0)
+
+    def test_organograma_em_cache_e_invalidado(self):
+        """Testa que o organograma é reaproveitado e descartado ao alterar a hierarquia"""
+        renderizar_organograma()
+        with self.assertNumQueries(0):
+            html = renderizar_organograma()
+        self.assertIn('Estagiário', html)
+
+        self.estagiario.status = 'I'
+        self.estagiario.save()
+        self.assertNotIn('Estagiário', renderizar_organograma())
+
+    def test_consultas_constantes(self):
+        """O número de consultas não depende do tamanho da árvore"""
+        with CaptureQueriesContext(connection) as consultas:
+            renderizar_organograma()
+        cache.clear()
+
+        anterior = self.analista
+        for i in range(5):
+            anterior = self._criar(f'Subordinado {i}', superior=anterior)
+
+        with self.assertNumQueries(len(consultas)):
+            renderizar_organograma()
+
+
+class SignalsHierarquiaTest(TestCase):
+    """Testes dos signals de hierarquia (só agem quando setor/superior/chefe mudam)"""
+
+    def setUp(self):
+        self.funcao = Funcao.objects.create(nome='Analista')
+        self.ti = Setor.objects.create(nome='TI')
+        self.rh = Setor.objects.create(nome='RH')
+        self.chefe = self._criar('Chefe RH', self.rh)
+        self.rh.chefe = self.chefe
+        self.rh.save()
+
+    def _criar(self, nome, setor, **kwargs):
+        return Funcionario.objects.create(
+            nome_completo=nome,
+            cpf=CPF().generate(),
+            data_admissao=date(2023, 1, 1),
+            funcao=self.funcao,
+            setor=setor,
+            salario_base=Decimal('3000.00'),
+            **kwargs
+        )
+
+    def test_novo_funcionario_recebe_chefe_do_setor(self):
+        """Testa o superior automático na criação"""
+        analista = self._criar('Analista RH', self.rh)
+        self.assertEqual(analista.superior, self.chefe)
+        self.assertEqual(analista.caminho_hierarquia, f'/{self.chefe.pk}/{analista.pk}/')
+
+    def test_trocar_de_setor_recebe_chefe_do_novo_setor(self):
+        """Testa o superior automático quando o setor muda"""
+        analista = Funcionario.objects.get(pk=self._criar('Analista TI', self.ti).pk)
+        self.assertIsNone(analista.superior)
+
+        analista.setor = self.rh
+        analista.save()
+
+        self.assertEqual(analista.superior, self.chefe)
+        self.assertEqual(analista.nivel_hierarquico, 1)
+
+    def test_definir_chefe_adota_sem_superior_em_um_update(self):
+        """Testa que definir o chefe do setor move os funcionários sem superior"""
+        primeiro = self._criar('Primeiro TI', self.ti)
+        segundo = self._criar('Segundo TI', self.ti)
+
+        self.ti.chefe = primeiro
+        self.ti.save()
+
+        segundo.refresh_from_db()
+        self.assertEqual(segundo.superior, primeiro)
+        self.assertEqual(segundo.caminho_hierarquia, f'/{primeiro.pk}/{segundo.pk}/')
+        primeiro.refresh_from_db()
+        self.assertIsNone(primeiro.superior)
+
+    def test_gravacao_sem_mudanca_de_hierarquia_nao_consulta(self):
+        """Testa que gravar outros campos não dispara consultas de hierarquia"""
+        analista = Funcionario.objects.get(pk=self._criar('Analista RH', self.rh).pk)
+        analista.salario_base = Decimal('3500.00')
+
+        with CaptureQueriesContext(connection) as consultas:
+            analista.save(update_fields=['salario_base'])
+
+        sqls = [q['sql'] for q in consultas]
+        self.assertEqual(len([sql for sql in sqls if sql.startswith('UPDATE')]), 1)
+        self.assertFalse([sql for sql in sqls if 'core_setor' in sql or sql.startswith('SELECT')])
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.rh.save(update_fields=['descricao'])
+        self.assertFalse([q for q in consultas if 'funcionarios_funcionario' in q['sql']])
+
+
+class ListagemFuncionariosTest(TestCase):
+    """Testes da listagem de funcionários paginada por cursor"""
+
+    def setUp(self):
+        setor = Setor.objects.create(nome='TI')
+        funcao = Funcao.objects.create(nome='Desenvolvedor')
+        # Nomes repetidos: o desempate da ordenação fica com o ID
+        for nome in ['Carla', 'Ana', 'Bruno', 'Ana', 'Daniel', 'Bruno', 'Eva']:
+            Funcionario.objects.create(
+                nome_completo=nome,
+                cpf=CPF().generate(),
+                data_admissao=date(2023, 1, 1),
+                funcao=funcao,
+                setor=setor,
+                salario_base=Decimal('3000.00')
+            )
+        self.ordem = list(Funcionario.objects.order_by('nome_completo', 'pk'))
+
+    def _paginar(self, params):
+        return paginar_por_cursor(Funcionario.objects.all(), ['nome_completo', 'pk'], params, tamanho=3)
+
+    def test_percorre_paginas_nos_dois_sentidos(self):
+        """Testa que as páginas cobrem todos os registros, sem repetição, nos dois sentidos"""
+        paginas = [self._paginar({})]
+        while paginas[-1].proxima:
+            paginas.append(self._paginar({'depois': paginas[-1].proxima}))
+
+        self.assertEqual([len(pagina) for pagina in paginas], [3, 3, 1])
+        self.assertEqual([f for pagina in paginas for f in pagina], self.ordem)
+        self.assertIsNone(paginas[0].anterior)
+
+        voltando = self._paginar({'antes': paginas[-1].anterior})
+        self.assertEqual(voltando.itens, paginas[1].itens)
+        voltando = self._paginar({'antes': voltando.anterior})
+        self.assertEqual(voltando.itens, paginas[0].itens)
+        self.assertIsNone(voltando.anterior)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        """Testa que um cursor adulterado é ignorado"""
+        self.assertEqual(self._paginar({'depois': 'lixo!'}).itens, self.ordem[:3])
+
+    def test_view_com_consultas_constantes(self):
+        """Testa que a página da listagem não depende do total de funcionários"""
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('funcionarios:list'))
+        self.assertEqual(len(response.context['funcionarios']), 7)
+        self.assertIsNone(response.context['pagina'].proxima)
+
+        funcionario = self.ordem[0]
+        for i in range(60):
+            funcionario.pk = None
+            funcionario.cpf = CPF().generate()
+            funcionario.caminho_hierarquia = ''
+            funcionario.save()
+
+        with self.assertNumQueries(len(consultas)):
+            response = self.client.get(reverse('funcionarios:list'), {'status': 'A'})
+        pagina = response.context['pagina']
+        self.assertEqual(len(pagina), 50)
+        self.assertIn('status=A', pagina.url_proxima)
+
+
+class BuscaFuncionarioTest(TestCase):
+    """Testes da busca por nome e CPF nas colunas normalizadas"""
+
+    def setUp(self):
+        self.funcionario = Funcionario.objects.create(
+            nome_completo='João  Ávila da Silva',
+            cpf='52998224725',
+            data_admissao=date(2023, 1, 1),
+            funcao=Funcao.objects.create(nome='Analista'),
+            setor=Setor.objects.create(nome='RH'),
+            salario_base=Decimal('3000.00')
+        )
+
+    def _buscar(self, termo):
+        return list(Funcionario.objects.filter(filtro_busca(termo)))
+
+    def test_colunas_normalizadas_no_save(self):
+        """Testa o preenchimento das colunas de busca"""
+        self.assertEqual(self.funcionario.cpf, '529.982.247-25')
+        self.assertEqual(self.funcionario.nome_busca, 'joao avila da silva')
+        self.assertEqual(self.funcionario.cpf_numeros, '52998224725')
+        self.assertEqual(normalizar_texto('  ÉRICA   Conceição '), 'erica conceicao')
+
+        self.funcionario.nome_completo = 'Joana Ávila'
+        self.funcionario.save(update_fields=['nome_completo'])
+        self.funcionario.refresh_from_db()
+        self.assertEqual(self.funcionario.nome_busca, 'joana avila')
+
+    def test_busca_por_nome_sem_acentos(self):
+        """Testa a busca pelo nome, ignorando acentos e maiúsculas"""
+        self.assertEqual(self._buscar('JOÃO ávila'), [self.funcionario])
+        self.assertEqual(self._buscar('joao'), [self.funcionario])
+        self.assertEqual(self._buscar('maria'), [])
+
+    def test_busca_por_sobrenome(self):
+        """Testa que um trecho do meio ou do fim do nome também encontra o funcionário"""
+        self.assertEqual(self._buscar('Silva'), [self.funcionario])
+        self.assertEqual(self._buscar('avila da'), [self.funcionario])
+
+    def test_busca_por_cpf_com_e_sem_mascara(self):
+        """Testa a busca pelo CPF mascarado ou só com dígitos"""
+        self.assertEqual(self._buscar('529.982.247-25'), [self.funcionario])
+        self.assertEqual(self._buscar('52998224725'), [self.funcionario])
+        self.assertEqual(self._buscar('529.98'), [self.funcionario])
+        self.assertEqual(self._buscar('111'), [])
+
+    def test_busca_pelo_final_do_cpf(self):
+        """Testa que o final do CPF (com ou sem máscara) encontra o funcionário"""
+        self.assertEqual(self._buscar('247-25'), [self.funcionario])
+        self.assertEqual(self._buscar('24725'), [self.funcionario])
+        self.assertEqual(self._buscar('982.247'), [self.funcionario])
+
+    def test_view_lista_busca(self):
+        """Testa a busca na listagem de funcionários"""
+        User.objects.create_user(username='admin', password='admin')
+        self.client.login(username='admin', password='admin')
+
+        response = self.client.get(reverse('funcionarios:list'), {'q': '5299822'})
+        self.assertEqual(list(response.context['funcionarios']), [self.funcionario])
@@ -4,9 +4,10 @@ Views do app Funcionários
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
 from django.core.exceptions import ValidationError
 
+from core.paginacao import paginar_por_cursor
+from .busca import filtro_busca
 from .models import Funcionario, Contrato, LancamentoFixo, Adiantamento, Ferias
 from .forms import (FuncionarioForm, ContratoForm, LancamentoFixoForm, AdiantamentoForm, 
                    AdiantamentoMassivoForm, FeriasForm)
@@ -15,26 +16,25 @@ from folha.services import AdiantamentoService
 
 @login_required
 def funcionario_list(request):
-    """Lista de funcionários"""
+    """Lista de funcionários (paginada por cursor)"""
     query = request.GET.get('q', '')
     status = request.GET.get('status', '')
     
     funcionarios = Funcionario.objects.select_related('funcao', 'setor')
     
     if query:
-        funcionarios = funcionarios.filter(
-            Q(nome_completo__icontains=query) | Q(cpf__icontains=query)
-        )
+        funcionarios = funcionarios.filter(filtro_busca(query))
     
     if status:
         funcionarios = funcionarios.filter(status=status)
     else:
         funcionarios = funcionarios.filter(status='A')  # Default: apenas ativos
     
-    funcionarios = funcionarios.order_by('nome_completo')
+    pagina = paginar_por_cursor(funcionarios, ['nome_completo', 'pk'], request.GET)
     
     context = {
-        'funcionarios': funcionarios,
+        'funcionarios': pagina,
+        'pagina': pagina,
         'query': query,
         'status': status,
     }
@@ -131,34 +131,32 @@ def adiantamento_massivo(request):
                 filtros['status'] = 'A'  # Default: apenas ativos
             
             # Busca funcionários
-            funcionarios = Funcionario.objects.filter(**filtros)
+            funcionarios = Funcionario.objects.filter(**filtros).only('pk', 'salario_base')
             
             # Determina valor
             tipo_valor = form.cleaned_data['tipo_valor']
-            count = 0
+            if tipo_valor == 'F':
+                valor_fixo = form.cleaned_data['valor_fixo']
+                lancamentos = [(funcionario, valor_fixo) for funcionario in funcionarios]
+            else:  # Percentual
+                percentual = form.cleaned_data['percentual']
+                lancamentos = [
+                    (funcionario, (funcionario.salario_base * percentual) / Decimal('100'))
+                    for funcionario in funcionarios
+                ]
+            
+            justificativa = f'Lançamento massivo'
+            if form.cleaned_data.get('data_adiantamento'):
+                justificativa += f' - {form.cleaned_data["data_adiantamento"].strftime("%d/%m/%Y")}'
             
             try:
-                for funcionario in funcionarios:
-                    # Calcula o valor
-                    if tipo_valor == 'F':
-                        valor = form.cleaned_data['valor_fixo']
-                    else:  # Percentual
-                        percentual = form.cleaned_data['percentual']
-                        valor = (funcionario.salario_base * percentual) / Decimal('100')
-                    
-                    # Adiciona item na folha
-                    justificativa = f'Lançamento massivo'
-                    if form.cleaned_data.get('data_adiantamento'):
-                        justificativa += f' - {form.cleaned_data["data_adiantamento"].strftime("%d/%m/%Y")}'
-                    
-                    FolhaService.adicionar_item_manual(
-                        folha=folha,
-                        funcionario=funcionario,
-                        provento_desconto=provento_desconto,
-                        valor=valor,
-                        justificativa=justificativa
-                    )
-                    count += 1
+                # Todos os itens em uma transação; totais e resumos atualizados uma vez
+                count = FolhaService.adicionar_itens_em_lote(
+                    provento_desconto,
+                    lancamentos,
+                    folha=folha,
+                    justificativa=justificativa
+                )
                 
                 messages.success(
                     request, 
@@ -396,22 +394,12 @@ def ferias_delete(request, pk):
 
 @login_required
 def organograma(request):
-    """Visualização do organograma da empresa"""
-    from core.models import Setor
-    
-    # Buscar funcionários sem superior (topo da hierarquia)
-    funcionarios_topo = Funcionario.objects.filter(
-        superior__isnull=True, 
-        status='A'
-    ).select_related('funcao', 'setor').prefetch_related('subordinados')
-    
-    # Buscar setores com seus chefes
-    setores = Setor.objects.filter(ativo=True).select_related('chefe')
+    """Visualização do organograma da empresa (renderizado a partir do índice da hierarquia, em cache)"""
+    from django.utils.safestring import mark_safe
+    from .hierarquia import renderizar_organograma
     
     context = {
-        'funcionarios_topo': funcionarios_topo,
-        'setores': setores,
-        'total_funcionarios': Funcionario.objects.filter(status='A').count(),
+        'organograma': mark_safe(renderizar_organograma()),
     }
     
     return render(request, 'funcionarios/organograma.html', context)